@@ -0,0 +1,21 @@
+import threading
+
+
+class BackgroundThread:
+    """Base for components whose work loop is run() in one daemon thread
+
+    start() launches run() and keeps the thread in self.thread so that
+    subclasses with a stop() or close() can join it. Calling run() directly
+    works too, e.g. to keep the main thread busy in headless mode.
+    """
+
+    thread = None
+
+    def run(self):
+        raise NotImplementedError
+
+    def start(self):
+        """Launch run() in a named daemon thread and return the thread"""
+        self.thread = threading.Thread(target=self.run, name=type(self).__name__, daemon=True)
+        self.thread.start()
+        return self.thread
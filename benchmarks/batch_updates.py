@@ -0,0 +1,57 @@
+"""Benchmark: lock acquisitions and device updates/sec by batch size
+
+Usage: python benchmarks/batch_updates.py [updates] [writer_threads]
+
+Drives RSSIServer.process_message directly (no sockets) so the numbers
+reflect parsing plus the critical sections only. Batch size 1 uses the plain
+'login|device|rssi' message; larger sizes use 'batch|login|...'. A batch takes
+each registry shard lock it touches once, so big batches top out at one
+acquisition per shard.
+"""
+import sys
+import threading
+import time
+
+from bench_util import count_registry_locks
+from protocol import format_batch
+from rssi_monitor import RSSIServer
+
+
+def bench(server, batch_size, updates, writers):
+    locks = count_registry_locks(server.registry)
+    addr = ('127.0.0.1', 0)
+    per_writer = updates // writers // batch_size
+
+    def writer(index):
+        readings = [(f"dev-{index}-{i}", -40 - i % 50) for i in range(batch_size)]
+        if batch_size == 1:
+            message = f"login|{readings[0][0]}|{readings[0][1]}"
+        else:
+            message = format_batch(readings).decode()
+        for _ in range(per_writer):
+            server.process_message(message, addr)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    applied = per_writer * batch_size * writers
+    return sum(lock.acquisitions for lock in locks), applied / elapsed
+
+
+def main():
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    server = RSSIServer(host='127.0.0.1', port=0, verbose=False)
+    print(f"{updates} updates across {writers} writer threads")
+    print(f"{'batch':>6} {'lock acquisitions':>18} {'updates/sec':>12}")
+    for batch_size in (1, 10, 100, 1000):
+        acquisitions, rate = bench(server, batch_size, updates, writers)
+        print(f"{batch_size:>6} {acquisitions:>18} {rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Helpers shared by the benchmark scripts"""
+import os
+import sys
+import threading
+
+# Let the scripts import the top-level modules when run as python benchmarks/<name>.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class CountingLock:
+    """threading.Lock stand-in that counts acquisitions and how many had to wait"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+
+    def __enter__(self):
+        if not self._lock.acquire(blocking=False):
+            self._lock.acquire()
+            self.contended += 1  # Only ever incremented while held
+        self.acquisitions += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+def count_registry_locks(registry):
+    """Swap every shard lock of a DeviceRegistry for a CountingLock"""
+    for shard in registry.shards:
+        shard.lock = CountingLock()
+    return [shard.lock for shard in registry.shards]
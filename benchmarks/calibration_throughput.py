@@ -0,0 +1,79 @@
+"""Benchmark: RSSI -> distance and quality for a whole fleet in one call
+
+Usage: python benchmarks/calibration_throughput.py [readings] [repeat]
+
+Classifies readings random RSSI values three ways: the original per-reading
+if/elif ladders called once per device, Calibration's bisect fallback, and
+Calibration with numpy (only when numpy is installed). Both distance models
+are timed. Reported: milliseconds per fleet and readings per second.
+"""
+import random
+import sys
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+import calibration
+
+
+def ladder_distance(rssi):
+    if rssi >= -30:
+        return 0.5
+    elif rssi >= -50:
+        return 1.0
+    elif rssi >= -60:
+        return 2.0
+    elif rssi >= -70:
+        return 3.0
+    elif rssi >= -80:
+        return 4.0
+    else:
+        return 5.0
+
+
+def ladder_quality(rssi):
+    if rssi >= -50:
+        return "Excellent"
+    elif rssi >= -60:
+        return "Good"
+    elif rssi >= -70:
+        return "Fair"
+    elif rssi >= -80:
+        return "Poor"
+    else:
+        return "Very Poor"
+
+
+def timed(repeat, convert, readings):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        convert(readings)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    readings = [random.randint(-100, -20) for _ in range(count)]
+    buckets = calibration.Calibration()
+    log = calibration.Calibration(distance_model="log")
+    cases = [
+        ("ladder", "distance", lambda values: [ladder_distance(rssi) for rssi in values]),
+        ("ladder", "quality", lambda values: [ladder_quality(rssi) for rssi in values]),
+    ]
+    numpy = calibration.load_numpy()
+    for label in ["bisect"] + (["numpy"] if numpy else []):
+        cases += [
+            (label, "distance", buckets.distances),
+            (label, "log dist", log.distances),
+            (label, "quality", buckets.qualities),
+        ]
+    print(f"{count} readings per call, numpy {'available' if numpy else 'not installed'}")
+    print(f"{'method':>8} {'output':>9} {'ms/fleet':>9} {'readings/s':>12}")
+    for label, output, convert in cases:
+        calibration._numpy = numpy if label == "numpy" else False
+        seconds = timed(repeat, convert, readings)
+        print(f"{label:>8} {output:>9} {seconds * 1000:>9.2f} {count / seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark: points drawn and render time per history chart frame, raw vs what the chart draws
+
+Usage: python benchmarks/chart_decimation.py [devices] [chart_width]
+
+Feeds an RSSIServer (no socket) one reading per second per device for
+windows of 5 min, 1 h and 24 h, then builds the chart's line coordinates
+from every sample of the window, as the chart did before, and from
+RSSIServer.chart_points, as it does now: min/max per column of the raw
+samples while they cover the window (up to 15 min), rollup buckets past
+that. With a display the lines are drawn on a real Tk canvas (three
+smoothed glow lines per device, like the chart); without one only the
+coordinate pipeline is timed.
+"""
+import math
+import random
+import sys
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+from rssi_monitor import RSSIServer
+from signal_history import RingBuffer
+
+
+def make_canvas(width):
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+        root.withdraw()
+        return tk.Canvas(root, width=width, height=300), "Tk canvas"
+    except Exception:
+        return None, "coordinates only"
+
+
+def fill(server, device, window, now):
+    buffer = RingBuffer(window)  # Every sample, as the chart used to keep them
+    phase = random.random() * 10
+    for i in range(window):
+        rssi = int(-60 + 20 * math.sin(i / 60 + phase))
+        buffer.append(now - window + i, rssi)
+        server.history.record(device, now - window + i, rssi)
+        server.rollups.record(device, now - window + i, rssi)
+    return device, buffer
+
+
+def render(canvas, server, buffers, window, now, width, mode):
+    height = 220
+    oldest = now - window
+    drawn = 0
+    start = time.perf_counter()
+    for device, buffer in buffers:
+        if mode == "chart":
+            samples = server.chart_points(device, oldest, now, max(1, width // 2))
+        else:
+            samples = [point for times, values in buffer.view(since=oldest) for point in zip(times, values)]
+        points = []
+        for timestamp, rssi in samples:
+            points.extend([(timestamp - oldest) / window * width, (-30 - rssi) / 60.0 * height])
+        drawn += len(samples)
+        if canvas is not None:
+            for offset in [2, 1, 0]:
+                canvas.create_line(points, width=3 - offset, smooth=True)
+    if canvas is not None:
+        canvas.update_idletasks()
+        canvas.delete("all")
+    return drawn / len(buffers), (time.perf_counter() - start) * 1000
+
+
+def main():
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 320
+    canvas, backend = make_canvas(width)
+    now = time.time()
+    print(f"{devices} devices, {width}px chart, 1 sample/s ({backend})")
+    print(f"{'window':>7} {'raw pts/dev':>12} {'raw ms':>8} {'chart pts/dev':>14} {'chart ms':>9} {'source':>8}")
+    for window, label in ((300, "5 min"), (3600, "1 h"), (86400, "24 h")):
+        server = RSSIServer(port=None, verbose=False, history_window=window)
+        buffers = [fill(server, f"device-{i}", window, now) for i in range(devices)]
+        raw_points, raw_ms = render(canvas, server, buffers, window, now, width, "raw")
+        chart_points, chart_ms = render(canvas, server, buffers, window, now, width, "chart")
+        source = "raw" if window <= server.history.window else "rollups"
+        print(f"{label:>7} {raw_points:>12.0f} {raw_ms:>8.1f} {chart_points:>14.0f} {chart_ms:>9.1f} {source:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark: cost of expiring silent devices, and registry size under guest churn
+
+Usage: python benchmarks/device_expiry.py [max_devices] [days]
+
+First, for fleets of growing size whose last reports are spread over the
+last hour, times the steady once-a-second DeviceRegistry.expire() sweep
+(offline after 30 s, inactive after 300 s, evicted after 3600 s) against a
+scan of every device checking its last_seen, the cost of finding silent
+devices without timers. Then simulates days of churn: every hour 1000 new guest
+devices report once a minute for 10 minutes and are never seen again,
+with a sweep per simulated minute, and reports how big the registry and
+its tombstones get.
+"""
+import sys
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+from device_registry import DeviceRegistry
+from signal_filter import SignalFilter
+
+INACTIVE_AFTER = 300.0
+EVICT_AFTER = 3600.0
+TICKS = 10
+
+
+def make_registry():
+    return DeviceRegistry(16, SignalFilter(offline_after=30.0), INACTIVE_AFTER, EVICT_AFTER)
+
+
+def sweep_cost(devices, now):
+    registry = make_registry()
+    for i in range(devices):
+        registry.update(f"device-{i}", -60, "10.0.0.1", now - EVICT_AFTER * i / devices)
+    registry.expire(now)  # Deadlines already passed while the fleet was being written
+    expired = 0
+    start = time.perf_counter()
+    for tick in range(1, TICKS + 1):
+        offline, inactive, evicted = registry.expire(now + tick)
+        expired += offline + inactive + len(evicted)
+    sweep = (time.perf_counter() - start) / TICKS
+    start = time.perf_counter()
+    cutoff = now - 30.0
+    sum(1 for _, record in registry.items() if record.last_seen < cutoff)
+    scan = time.perf_counter() - start
+    return expired / TICKS, sweep, scan
+
+
+def churn(days, now):
+    registry = make_registry()
+    peak = 0
+    for minute in range(int(days * 24 * 60)):
+        t = now + minute * 60
+        hour = minute // 60
+        if minute % 60 < 10:
+            registry.update_many([(f"guest-{hour}-{i}", -70) for i in range(1000)], "10.0.0.2", t)
+        registry.expire(t)
+        peak = max(peak, len(registry))
+    tombstones = sum(len(shard.removed) for shard in registry.shards)
+    timers = sum(len(shard.timers) for shard in registry.shards)
+    return hour + 1, peak, len(registry), tombstones, timers
+
+
+def main():
+    max_devices = int(sys.argv[1]) if len(sys.argv) > 1 else 640000
+    days = float(sys.argv[2]) if len(sys.argv) > 2 else 7
+    now = time.time()
+    print(f"{'devices':>8} {'expired/s':>10} {'sweep ms':>9} {'full scan ms':>13}")
+    devices = 10000
+    while devices <= max_devices:
+        expired, sweep, scan = sweep_cost(devices, now)
+        print(f"{devices:>8} {expired:>10.0f} {sweep * 1000:>9.2f} {scan * 1000:>13.2f}")
+        devices *= 4
+    start = time.perf_counter()
+    guests, peak, final, tombstones, timers = churn(days, now)
+    elapsed = time.perf_counter() - start
+    print(f"{days:g} days of churn, {guests * 1000} guests: peak {peak} devices, {final} at the end, "
+          f"{tombstones} tombstones, {timers} timers ({elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
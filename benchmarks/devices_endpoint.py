@@ -0,0 +1,82 @@
+"""Benchmark: one fleet dashboard refresh via /status per device vs /devices
+
+Usage: python benchmarks/devices_endpoint.py [devices] [refreshes]
+
+Runs the pooled HTTP server in-process with devices registered and, over
+one keep-alive connection, times a dashboard refresh done as: a /status
+request per device; a full /devices; a gzipped full /devices; a ?since=
+delta after 1% of devices changed; and a conditional request that gets a
+304 (after one cached full fetch for its ETag). Bytes are body bytes on
+the wire.
+"""
+import http.client
+import sys
+import threading
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+import http_api
+from rssi_monitor import RSSIServer
+
+PORT = 18096
+
+
+def fetch(conn, path, headers=None):
+    conn.request("GET", path, headers=headers or {})
+    response = conn.getresponse()
+    body = response.read()
+    return response, len(body)
+
+
+def timed(refreshes, refresh):
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(refreshes):
+        total_bytes += refresh()
+    return (time.perf_counter() - start) / refreshes * 1000, total_bytes // refreshes
+
+
+def main():
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    refreshes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    server = RSSIServer(host='127.0.0.1', port=0, verbose=False)
+    names = [f"device-{i}" for i in range(devices)]
+    server.update_devices([(name, -40 - i % 50) for i, name in enumerate(names)], "10.0.0.1")
+    http_api.get_local_ip = lambda: "127.0.0.1"  # No discovery noise in the benchmark
+    threading.Thread(target=http_api.start_http_server, args=('127.0.0.1', PORT, server),
+                     daemon=True).start()
+    time.sleep(0.5)
+    conn = http.client.HTTPConnection('127.0.0.1', PORT)
+
+    def per_device():
+        return sum(fetch(conn, f"/status?device_name={name}")[1] for name in names)
+
+    def full():
+        server.update_device(names[0], -41, "10.0.0.1")  # A new version each refresh
+        return fetch(conn, "/devices")[1]
+
+    def full_gzip():
+        server.update_device(names[0], -42, "10.0.0.1")
+        return fetch(conn, "/devices", {"Accept-Encoding": "gzip"})[1]
+
+    def delta():
+        since = server.version
+        for name in names[:max(1, devices // 100)]:
+            server.update_device(name, -43, "10.0.0.1")
+        return fetch(conn, f"/devices?since={since}")[1]
+
+    def not_modified():
+        etag = fetch(conn, "/devices")[0].getheader("ETag")  # Served from the cached body
+        return fetch(conn, "/devices", {"If-None-Match": etag})[1]
+
+    print(f"{devices} devices, {refreshes} refreshes")
+    print(f"{'refresh via':>22} {'ms':>8} {'bytes':>9}")
+    for label, refresh in (("/status per device", per_device), ("/devices", full),
+                           ("/devices gzip", full_gzip), ("/devices?since= (1%)", delta),
+                           ("/devices 304", not_modified)):
+        ms, size = timed(refreshes, refresh)
+        print(f"{label:>22} {ms:>8.2f} {size:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""End-to-end benchmark: edge servers forwarding to an aggregator on loopback
+
+Usage: python benchmarks/federation_e2e.py [max_edges] [seconds] [devices_per_edge]
+
+Every node is its own process: one aggregator (socket server with
+federation enabled plus the pooled HTTP server), 1..max_edges edge
+RSSIServers each running a Forwarder, and one load process per edge that
+streams batch reports (ack none) for its own devices_per_edge devices as
+fast as it can. Reported per edge count: readings/s ingested by the edges,
+device updates/s merged by the aggregator (updates to the same device
+between two frames are coalesced into one), compression of the forwarded
+deltas, worst edge-to-aggregator lag, and whether the aggregator's
+/devices listing ends up matching every edge's registry exactly.
+"""
+import gzip
+import json
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+import urllib.request
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+from client import ReportStream
+from federation import Forwarder
+from http_api import start_http_server
+from rssi_monitor import RSSIServer
+
+SETTLE = 1.0  # Seconds allowed for the last frames to arrive after the load stops
+QUIET = 0.5  # An edge is done once its registry has not changed for this long, all of it acknowledged
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_aggregator(http_port, ports, start, stop, done, results):
+    server = RSSIServer(host='127.0.0.1', port=0, backlog=1024, verbose=False)
+    server.accept_federation()
+    threading.Thread(target=server.start, daemon=True).start()
+    threading.Thread(target=start_http_server, args=('127.0.0.1', http_port, server), daemon=True).start()
+    ports.put(("aggregator", server.port))
+    start.wait()
+    began, applied = time.time(), server.federation.applied
+    stop.wait()
+    rate = (server.federation.applied - applied) / (time.time() - began)
+    time.sleep(SETTLE)
+    results.put(("aggregator", rate, server.federation.metrics()))
+    done.wait()
+
+
+def run_edge(index, aggregator_port, ports, stop, done, results):
+    server = RSSIServer(host='127.0.0.1', port=0, backlog=1024, verbose=False)
+    forwarder = Forwarder(server, '127.0.0.1', aggregator_port, f"edge-{index}", min_interval=0.02)
+    threading.Thread(target=server.start, daemon=True).start()
+    forwarder.start()
+    ports.put((index, server.port))
+    stop.wait()
+    # Reports still buffered in the socket are ingested and forwarded first
+    deadline = time.time() + 30
+    version = -1
+    while time.time() < deadline and (server.version != version or forwarder.version != version):
+        version = server.version
+        time.sleep(QUIET)
+    devices = {name: record.last_seen for name, record in server.get_devices().items()}
+    results.put((index, forwarder.metrics(), devices))
+    done.wait()
+
+
+def run_load(index, port, devices, start, stop, counts):
+    reporter = ReportStream('127.0.0.1', port, ack="none", retries=0)
+    names = [f"edge{index}-device-{i}" for i in range(devices)]
+    batch = 500
+    sent = rssi = 0
+    start.wait()
+    while not stop.is_set():
+        rssi = rssi % 50 + 1
+        for first in range(0, devices, batch):
+            reporter.send_batch([(name, -40 - rssi) for name in names[first:first + batch]])
+            sent += min(batch, devices - first)
+    reporter.close()
+    counts.put(sent)
+
+
+def fetch_devices(http_port):
+    request = urllib.request.Request(f"http://127.0.0.1:{http_port}/devices",
+                                     headers={"Accept-Encoding": "gzip"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        body = response.read()
+        if response.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+    return json.loads(body)["devices"]
+
+
+def bench(edges, seconds, devices):
+    ports, results, counts = multiprocessing.Queue(), multiprocessing.Queue(), multiprocessing.Queue()
+    start, stop, done = multiprocessing.Event(), multiprocessing.Event(), multiprocessing.Event()
+    http_port = free_port()
+    processes = [multiprocessing.Process(target=run_aggregator,
+                                         args=(http_port, ports, start, stop, done, results), daemon=True)]
+    processes[0].start()
+    _, aggregator_port = ports.get(timeout=30)
+    for index in range(edges):
+        processes.append(multiprocessing.Process(
+            target=run_edge, args=(index, aggregator_port, ports, stop, done, results), daemon=True))
+        processes[-1].start()
+    edge_ports = dict(ports.get(timeout=30) for _ in range(edges))
+    for index in range(edges):
+        processes.append(multiprocessing.Process(
+            target=run_load, args=(index, edge_ports[index], devices, start, stop, counts), daemon=True))
+        processes[-1].start()
+    time.sleep(0.5)
+    start.set()
+    time.sleep(seconds)
+    stop.set()
+    sent = sum(counts.get(timeout=30) for _ in range(edges))
+    edge_devices = {}
+    raw = wire = 0
+    aggregate = None
+    for _ in range(edges + 1):
+        result = results.get(timeout=30)
+        if result[0] == "aggregator":
+            aggregate = result
+            continue
+        _, metrics, devices_seen = result
+        raw += metrics["raw_bytes"]
+        wire += metrics["wire_bytes"]
+        edge_devices.update(devices_seen)
+    merged = fetch_devices(http_port)
+    consistent = (merged.keys() == edge_devices.keys()
+                  and all(merged[name]["last_seen"] == last_seen for name, last_seen in edge_devices.items()))
+    done.set()
+    for process in processes:
+        process.join(timeout=5)
+    _, merge_rate, metrics = aggregate
+    return sent / seconds, merge_rate, raw / max(1, wire), metrics["max_lag"], len(merged), consistent
+
+
+def main():
+    max_edges = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    devices = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    print(f"{devices} devices per edge, {seconds:g}s of load per run, {multiprocessing.cpu_count()} CPUs")
+    print(f"{'edges':>6} {'ingest/s':>10} {'merged/s':>10} {'compress':>9} {'max lag ms':>11} "
+          f"{'devices':>8} {'consistent':>11}")
+    edges = 1
+    while edges <= max_edges:
+        ingest, merged, ratio, lag, count, consistent = bench(edges, seconds, devices)
+        print(f"{edges:>6} {ingest:>10.0f} {merged:>10.0f} {ratio:>8.1f}x {lag * 1000:>11.0f} "
+              f"{count:>8} {str(consistent):>11}")
+        edges *= 2
+
+
+if __name__ == "__main__":
+    main()
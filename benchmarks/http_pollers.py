@@ -0,0 +1,104 @@
+"""Load test: /status latency with many concurrent pollers, simple vs pooled HTTP server
+
+Usage: python benchmarks/http_pollers.py [pollers] [seconds] [interval]
+
+The HTTP server runs in a child process with pollers devices registered.
+The parent runs one asyncio task per poller, each requesting
+/status?device_name=<its device> every interval seconds (default 1 s, five
+times the page's rate) over a kept-alive connection when the server allows
+it. Latency is measured from sending the request (including reconnecting)
+to reading the full body.
+"""
+import asyncio
+import multiprocessing
+import random
+import statistics
+import sys
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+
+
+def run_server(mode, devices, ready):
+    import http_api
+    from rssi_monitor import RSSIServer
+    server = RSSIServer(host='127.0.0.1', port=0, verbose=False)
+    server.update_devices([(f"poller-{i}", -40 - i % 50) for i in range(devices)], "10.0.0.1")
+    http_api.get_local_ip = lambda: "127.0.0.1"  # No discovery noise in the benchmark
+    ready.set()
+    http_api.start_http_server('127.0.0.1', 18090, server, mode=mode)
+
+
+async def poll(index, interval, deadline, latencies, errors):
+    path = f"/status?device_name=poller-{index}"
+    request = f"GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n".encode()
+    reader = writer = None
+    await asyncio.sleep(random.random() * interval)  # Spread the pollers out
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', 18090)
+            writer.write(request)
+            status = await reader.readline()
+            length, close = None, status.startswith(b"HTTP/1.0")
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode().partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+                elif name.lower() == "connection" and value.strip().lower() == "close":
+                    close = True
+            if length is None:
+                await reader.read()
+            else:
+                await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError):
+            errors.append(index)
+            writer = None
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - start)))
+    if writer is not None:
+        writer.close()
+
+
+async def run_pollers(pollers, seconds, interval):
+    latencies, errors = [], []
+    deadline = time.monotonic() + seconds
+    await asyncio.gather(*(poll(i, interval, deadline, latencies, errors) for i in range(pollers)))
+    return latencies, errors
+
+
+def bench(mode, pollers, seconds, interval):
+    ready = multiprocessing.Event()
+    proc = multiprocessing.Process(target=run_server, args=(mode, pollers, ready), daemon=True)
+    proc.start()
+    ready.wait(10)
+    time.sleep(0.5)  # Let the server bind
+    latencies, errors = asyncio.run(run_pollers(pollers, seconds, interval))
+    proc.terminate()
+    proc.join()
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    return len(latencies) / seconds, p50, p99, len(errors)
+
+
+def main():
+    pollers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    interval = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+    print(f"{pollers} pollers every {interval:g}s for {seconds:g}s")
+    print(f"{'mode':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode in ("simple", "pooled"):
+        rate, p50, p99, errors = bench(mode, pollers, seconds, interval)
+        print(f"{mode:>7} {rate:>8.0f} {p50:>8.1f} {p99:>8.1f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
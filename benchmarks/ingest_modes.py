@@ -0,0 +1,78 @@
+"""Load benchmark: one-shot report connections per second, threaded vs asyncio ingest
+
+Usage: python benchmarks/ingest_modes.py [clients] [seconds]
+
+The server runs in a child process so the client threads do not compete with
+it for the GIL. Each client thread repeatedly connects, sends one
+'login|device|rssi' report, waits for the reply and closes, like client.py.
+"""
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+from rssi_monitor import RSSIServer
+
+
+def run_server(mode, port_queue):
+    server = RSSIServer(host='127.0.0.1', port=0, backlog=1024, verbose=False)
+    port_queue.put(server.port)
+    if mode == "async":
+        server.start_async(max_connections=1000)
+    else:
+        server.start()
+
+
+def client_loop(port, index, deadline, counts, errors):
+    message = f"login|bench-{index}|-60".encode()
+    done = 0
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=5) as s:
+                s.sendall(message)
+                if s.recv(1024) == b"SUCCESS":
+                    done += 1
+        except OSError:
+            errors[index] += 1
+    counts[index] = done
+
+
+def bench(mode, clients, seconds):
+    port_queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=run_server, args=(mode, port_queue), daemon=True)
+    proc.start()
+    port = port_queue.get(timeout=10)
+    time.sleep(0.2)
+
+    counts = [0] * clients
+    errors = [0] * clients
+    deadline = time.time() + seconds
+    threads = [
+        threading.Thread(target=client_loop, args=(port, i, deadline, counts, errors))
+        for i in range(clients)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    proc.terminate()
+    proc.join()
+    return sum(counts) / elapsed, sum(errors)
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"{clients} client threads, {seconds:.0f}s per mode")
+    for mode in ("threaded", "async"):
+        rate, errors = bench(mode, clients, seconds)
+        print(f"{mode:>9}: {rate:8.0f} connections/sec ({errors} errors)")
+
+
+if __name__ == "__main__":
+    main()
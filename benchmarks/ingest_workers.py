@@ -0,0 +1,107 @@
+"""Benchmark: reports/sec with 1..8 ingest worker processes sharing the port
+
+Usage: python benchmarks/ingest_workers.py [max_workers] [seconds] [loaders]
+
+Starts N worker processes (rssi_monitor.run_worker) listening on one port
+with SO_REUSEPORT and writing into a SharedDeviceTable, then loaders
+processes that each keep 8 stream connections (ack none) busy with
+newline-delimited reports for 10000 devices. Throughput is read straight
+from the table's stripe counters in this process, with no IPC, as the
+HTTP side does. Scaling needs as many free cores as workers plus loaders.
+"""
+import multiprocessing
+import socket
+import sys
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+from protocol import stream_hello
+from rssi_monitor import run_worker
+from shared_table import SharedDeviceTable
+
+DEVICES = 10000
+CONNECTIONS = 8
+CHUNK = 200
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def load(port, index, stop):
+    sockets = []
+    for _ in range(CONNECTIONS):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(stream_hello("none"))
+        sockets.append(sock)
+    chunks = [
+        "".join(f"login|device-{(first + i) % DEVICES}|-{40 + i % 50}\n" for i in range(CHUNK)).encode()
+        for first in range(index * CHUNK, index * CHUNK + DEVICES, CHUNK)
+    ]
+    sent = 0
+    try:
+        while not stop.is_set():
+            for sock in sockets:
+                sock.sendall(chunks[sent % len(chunks)])
+                sent += 1
+    except OSError:
+        pass  # Workers were stopped while this loader was blocked sending
+    for sock in sockets:
+        sock.close()
+
+
+def bench(workers, seconds, loaders):
+    context = multiprocessing.get_context("spawn")
+    table = SharedDeviceTable(slots=DEVICES * 2)
+    port = free_port()
+    processes = [context.Process(target=run_worker, args=(i, '127.0.0.1', port, table.name, table.locks),
+                                 daemon=True) for i in range(workers)]
+    for process in processes:
+        process.start()
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port)) as probe:
+                probe.sendall(stream_hello("none"))
+            break
+        except OSError:
+            time.sleep(0.1)
+    time.sleep(1.0)  # Let every worker reach accept()
+    stop = context.Event()
+    load_processes = [context.Process(target=load, args=(port, i, stop), daemon=True) for i in range(loaders)]
+    for process in load_processes:
+        process.start()
+    time.sleep(1.0)  # Warm up
+    start, before = time.time(), sum(table.stripe_counters())
+    time.sleep(seconds)
+    rate = (sum(table.stripe_counters()) - before) / (time.time() - start)
+    stop.set()
+    for process in load_processes:
+        process.join(timeout=5)
+    for process in processes:
+        process.terminate()
+        process.join(timeout=5)
+    table.close()
+    return rate
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    loaders = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    print(f"{loaders} loader processes x {CONNECTIONS} stream connections, {DEVICES} devices, "
+          f"{multiprocessing.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'reports/s':>11} {'speedup':>8}")
+    base = None
+    workers = 1
+    while workers <= max_workers:
+        rate = bench(workers, seconds, loaders)
+        base = base or rate
+        print(f"{workers:>8} {rate:>11.0f} {rate / base:>7.2f}x")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
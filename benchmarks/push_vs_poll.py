@@ -0,0 +1,127 @@
+"""Benchmark: server load and update delay, /stream push vs /status polling
+
+Usage: python benchmarks/push_vs_poll.py [clients] [seconds] [writes_per_sec]
+
+The pooled HTTP server runs in a child process together with a writer
+that updates random watched devices at writes_per_sec. The parent runs
+one asyncio client per device. "poll" clients request /status every 5 s,
+like the old page; "push" clients keep one /stream open. Reported: HTTP
+requests per second, the server process's CPU seconds, and for push the
+delay from a device write to the client receiving it (polling shows data
+up to 5 s stale, 2.5 s on average).
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+
+PORT = 18092
+POLL_INTERVAL = 5.0
+
+
+def run_server(clients, writes_per_sec, ready, stop, cpu):
+    import http_api
+    from rssi_monitor import RSSIServer
+    server = RSSIServer(host='127.0.0.1', port=0, verbose=False)
+    names = [f"watch-{i}" for i in range(clients)]
+    server.update_devices([(name, -50) for name in names], "10.0.0.1")
+    http_api.get_local_ip = lambda: "127.0.0.1"  # No discovery noise in the benchmark
+    threading.Thread(target=http_api.start_http_server, args=('127.0.0.1', PORT, server),
+                     daemon=True).start()
+    time.sleep(0.3)
+    ready.set()
+    start = os.times()
+    while not stop.is_set():
+        server.update_device(random.choice(names), random.randint(-90, -30), "10.0.0.1")
+        time.sleep(1 / writes_per_sec)
+    end = os.times()
+    cpu.put(end.user + end.system - start.user - start.system)
+
+
+async def poll_client(index, deadline, counts):
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    request = f"GET /status?device_name=watch-{index} HTTP/1.1\r\nHost: bench\r\n\r\n".encode()
+    await asyncio.sleep(random.random() * POLL_INTERVAL)
+    while time.monotonic() < deadline:
+        writer.write(request)
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line == b"\r\n":
+                break
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        await reader.readexactly(length)
+        counts.append(1)
+        await asyncio.sleep(POLL_INTERVAL)
+    writer.close()
+
+
+async def push_client(index, deadline, counts, delays):
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    writer.write(f"GET /stream?device_name=watch-{index} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+    counts.append(1)
+    first = True
+    while True:
+        try:
+            line = await asyncio.wait_for(reader.readline(), deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            break
+        if line.startswith(b"data: "):
+            if first:
+                first = False  # The current state sent on connect, not a fresh write
+                continue
+            delays.append(time.time() - json.loads(line[6:])["last_seen"])
+    writer.close()
+
+
+def bench(mode, clients, seconds, writes_per_sec):
+    ready, stop, cpu = multiprocessing.Event(), multiprocessing.Event(), multiprocessing.Queue()
+    proc = multiprocessing.Process(target=run_server, args=(clients, writes_per_sec, ready, stop, cpu),
+                                   daemon=True)
+    proc.start()
+    ready.wait(10)
+    counts, delays = [], []
+
+    async def run_clients():
+        deadline = time.monotonic() + seconds
+        if mode == "poll":
+            tasks = [poll_client(i, deadline, counts) for i in range(clients)]
+        else:
+            tasks = [push_client(i, deadline, counts, delays) for i in range(clients)]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run_clients())
+    stop.set()
+    cpu_seconds = cpu.get(timeout=10)
+    proc.terminate()
+    proc.join()
+    return len(counts) / seconds, cpu_seconds, delays
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    writes_per_sec = float(sys.argv[3]) if len(sys.argv) > 3 else 50
+    print(f"{clients} clients, {writes_per_sec:g} writes/s, {seconds:g}s")
+    print(f"{'mode':>5} {'req/s':>8} {'server cpu s':>13} {'p50 delay ms':>13} {'p99 delay ms':>13}")
+    for mode in ("poll", "push"):
+        rate, cpu_seconds, delays = bench(mode, clients, seconds, writes_per_sec)
+        if delays:
+            delays.sort()
+            p50 = f"{statistics.median(delays) * 1000:.1f}"
+            p99 = f"{delays[int(len(delays) * 0.99) - 1] * 1000:.1f}"
+        else:
+            p50 = p99 = f"<={POLL_INTERVAL * 1000:.0f}"
+        print(f"{mode:>5} {rate:>8.1f} {cpu_seconds:>13.2f} {p50:>13} {p99:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Contention microbenchmark for DeviceRegistry lock striping
+
+Usage: python benchmarks/registry_contention.py [updates_per_writer]
+
+Concurrent writer threads update disjoint device sets while one reader takes
+a snapshot every millisecond, like the UI and /status handler do. For a
+single shard (the old global lock) and for 16 shards it reports write
+throughput and the share of lock acquisitions that had to wait.
+"""
+import sys
+import threading
+import time
+
+from bench_util import count_registry_locks
+from device_registry import DeviceRegistry
+
+
+def bench(shards, writers, updates_per_writer, devices_per_writer=500):
+    registry = DeviceRegistry(shards)
+    locks = count_registry_locks(registry)
+    stop = threading.Event()
+
+    def writer(index):
+        names = [f"dev-{index}-{i}" for i in range(devices_per_writer)]
+        for n in range(updates_per_writer):
+            registry.update(names[n % devices_per_writer], -40 - n % 50, "10.0.0.1")
+
+    def reader():
+        while not stop.is_set():
+            registry.snapshot()
+            time.sleep(0.001)
+
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    reader_thread.join()
+
+    acquisitions = sum(lock.acquisitions for lock in locks)
+    contended = sum(lock.contended for lock in locks)
+    return writers * updates_per_writer / elapsed, contended / acquisitions
+
+
+def main():
+    updates_per_writer = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print(f"{'shards':>6} {'writers':>7} {'updates/sec':>12} {'contended':>10}")
+    for shards in (1, 16):
+        for writers in (1, 2, 4, 8):
+            rate, contended = bench(shards, writers, updates_per_writer)
+            print(f"{shards:>6} {writers:>7} {rate:>12.0f} {contended:>9.2%}")
+
+
+if __name__ == "__main__":
+    main()
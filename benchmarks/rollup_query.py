@@ -0,0 +1,86 @@
+"""Benchmark: cost of a 24 h history query, raw samples vs rollup tiers
+
+Usage: python benchmarks/rollup_query.py [devices] [points]
+
+Fills devices with 24 h of one reading per second each and answers
+"min/max per column over the last 24 h at points columns" for one device
+three ways: from a raw in-memory RingBuffer through decimate_minmax, by a
+range query on the on-disk ReadingStore (mmap) plus the same bucketing,
+and from RollupHistory, which picks its 1 min tier. Also reports the
+memory each keeps per device and the cost of folding a reading into the
+rollups.
+"""
+import math
+import shutil
+import sys
+import tempfile
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+from reading_store import ReadingStore
+from rollups import RollupHistory
+from signal_history import RingBuffer, decimate_minmax
+
+DAY = 86400
+
+
+def timed(repeat, query):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = query()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    points = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    now = time.time()
+    start = now - DAY
+    names = [f"device-{i}" for i in range(devices)]
+    directory = tempfile.mkdtemp(prefix="rssi-rollup-")
+    store = ReadingStore(directory)
+    rollups = RollupHistory()
+    ring = RingBuffer(DAY)
+    fold_seconds = 0.0
+    for second in range(DAY):
+        timestamp = start + second
+        readings = [(name, int(-60 + 20 * math.sin(second / 600 + i))) for i, name in enumerate(names)]
+        store.append_many(readings, timestamp)
+        ring.append(timestamp, readings[0][1])
+        begin = time.perf_counter()
+        rollups.record_many(readings, timestamp)
+        fold_seconds += time.perf_counter() - begin
+    store.flush()
+
+    def raw_ring():
+        return decimate_minmax(ring.view(since=start), start, now, points)
+
+    def raw_store():
+        samples = store.query(names[0], start, now)
+        return decimate_minmax([([t for t, _ in samples], [v for _, v in samples])], start, now, points)
+
+    def rollup():
+        return rollups.query(names[0], start, now, points)[1]
+
+    rings = rollups.rings[names[0]]
+    rollup_bytes = sum(
+        len(array) * array.itemsize
+        for tier in rings for array in (tier.buckets, tier.mins, tier.maxs, tier.sums, tier.counts, tier.lasts)
+    )
+    print(f"{devices} devices x 24 h at 1 reading/s, {points} columns, rollup tier "
+          f"{rollups.tiers[rollups.pick_tier(start, now, points)][0]} s")
+    print(f"{'source':>12} {'query ms':>9} {'rows':>6} {'bytes/device':>13}")
+    for label, repeat, query, size in (
+        ("raw ring", 5, raw_ring, DAY * (ring.times.itemsize + ring.values.itemsize)),
+        ("raw store", 2, raw_store, DAY * 16),
+        ("rollups", 50, rollup, rollup_bytes),
+    ):
+        ms, rows = timed(repeat, query)
+        print(f"{label:>12} {ms:>9.2f} {len(rows):>6} {size:>13}")
+    print(f"rollup fold: {fold_seconds / (DAY * devices) * 1e6:.2f} us per reading (3 tiers)")
+    store.close()
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
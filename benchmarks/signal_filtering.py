@@ -0,0 +1,77 @@
+"""Benchmark: per-device smoothing and presence tracking on the ingest path
+
+Usage: python benchmarks/signal_filtering.py [devices] [readings]
+
+Writes readings noisy reports (true level plus Gaussian noise, sigma 4 dB)
+spread over devices into a DeviceRegistry through update_batch, as the
+write-behind drain does, with no filter, EWMA and Kalman, and reports
+readings/s against the 100k readings/s target plus how much of the noise
+is left in the smoothed values. Then times one expire sweep
+after every device has gone silent.
+"""
+import random
+import statistics
+import sys
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+from device_registry import DeviceRegistry
+from signal_filter import SignalFilter
+
+TARGET = 100000
+NOISE = 4.0
+BATCH = 1000
+
+
+def make_batches(devices, readings, start):
+    names = [f"device-{i}" for i in range(devices)]
+    levels = [random.randint(-80, -40) for _ in names]
+    batches = []
+    for first in range(0, readings, BATCH):
+        timestamp = start + first / TARGET  # Reports arrive at the target rate
+        group = []
+        for n in range(first, min(first + BATCH, readings)):
+            i = n % devices
+            group.append((names[i], int(round(levels[i] + random.gauss(0, NOISE)))))
+        batches.append([(group, "10.0.0.1", timestamp)])
+    return names, levels, batches
+
+
+def bench(signal_filter, names, levels, batches):
+    registry = DeviceRegistry(signal_filter=signal_filter)
+    count = sum(len(group) for batch in batches for group, _, _ in batch)
+    start = time.perf_counter()
+    for batch in batches:
+        registry.update_batch(batch)
+    seconds = time.perf_counter() - start
+    errors = [registry.get(name).smoothed - level for name, level in zip(names, levels)]
+    return registry, count / seconds, statistics.pstdev(errors)
+
+
+def main():
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    readings = int(sys.argv[2]) if len(sys.argv) > 2 else 500000
+    now = time.time()
+    names, levels, batches = make_batches(devices, readings, now)
+    print(f"{readings} readings over {devices} devices, noise sigma {NOISE:g} dB, batches of {BATCH}")
+    print(f"{'filter':>34} {'readings/s':>11} {'x target':>9} {'error dB':>9}")
+    registry = None
+    for signal_filter in (None, SignalFilter("ewma"), SignalFilter("kalman")):
+        registry, rate, error = bench(signal_filter, names, levels, batches)
+        label = signal_filter.describe() if signal_filter else "none (raw)"
+        print(f"{label:>34} {rate:>11.0f} {rate / TARGET:>9.2f} {error:>9.2f}")
+
+    # Every device silent for longer than offline_after: one sweep marks them all
+    later = now + readings / TARGET + registry.signal_filter.offline_after + 1
+    start = time.perf_counter()
+    expired, _, _ = registry.expire(later)
+    sweep = time.perf_counter() - start
+    start = time.perf_counter()
+    registry.expire(later)
+    idle = time.perf_counter() - start
+    print(f"expire: {expired} devices offline in {sweep * 1000:.1f} ms, "
+          f"next sweep {idle * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
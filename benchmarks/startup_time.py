@@ -0,0 +1,58 @@
+"""Startup benchmark for rssi_monitor with a tracked target
+
+Usage: python benchmarks/startup_time.py [runs]
+
+Imports rssi_monitor in fresh interpreters under -X importtime and reports
+the median cumulative import time, plus which heavy modules got pulled in.
+Exits with status 1 when the median is over TARGET_MS or a module that
+should be lazy was imported, so it can gate CI.
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+TARGET_MS = 40  # Median cumulative import time of rssi_monitor we hold ourselves to
+LAZY_MODULES = ("tkinter", "http.server", "asyncio", "json", "random")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE = (
+    "import sys, rssi_monitor; "
+    f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+)
+
+
+def import_once():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == "rssi_monitor":
+            cumulative_us = int(fields[1])
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return cumulative_us / 1000, loaded
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        ms, loaded = import_once()
+        timings.append(ms)
+    median = statistics.median(timings)
+    print(f"import rssi_monitor: median {median:.1f} ms, min {min(timings):.1f} ms over {runs} runs "
+          f"(target {TARGET_MS} ms)")
+    print(f"heavy modules imported eagerly: {', '.join(loaded) or 'none'}")
+    if median > TARGET_MS or loaded:
+        print("FAIL")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
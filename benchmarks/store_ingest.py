@@ -0,0 +1,107 @@
+"""Benchmark: ingest cost with the on-disk reading store off and on
+
+Usage: python benchmarks/store_ingest.py [clients] [seconds]
+
+First times RSSIServer.update_device in-process (the work handle_client
+does per report). Then runs the threaded socket server in a child process
+and has client threads send one-shot 'login|device|rssi' reports,
+measuring reports/sec and per-report round-trip latency. Both are done
+without a store and with one flushing (and fsyncing) every second into a
+temporary directory.
+"""
+import multiprocessing
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+from reading_store import ReadingStore
+from rssi_monitor import RSSIServer
+
+
+def make_server(directory, **kwargs):
+    store = None
+    if directory:
+        store = ReadingStore(directory, flush_interval=1.0)
+        store.start()
+    return RSSIServer(host='127.0.0.1', port=0, verbose=False, store=store, **kwargs)
+
+
+def time_updates(directory, count=200000):
+    server = make_server(directory)
+    start = time.perf_counter()
+    for i in range(count):
+        server.update_device(f"bench-{i % 1000}", -60, "10.0.0.1")
+    elapsed = time.perf_counter() - start
+    server.server.close()
+    if server.store is not None:
+        server.store.close()
+    return elapsed / count * 1e6
+
+
+def run_server(directory, port_queue):
+    server = make_server(directory, backlog=1024)
+    port_queue.put(server.port)
+    server.start()
+
+
+def client_loop(port, index, deadline, latencies):
+    message = f"login|bench-{index}|-60".encode()
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=5) as s:
+                s.sendall(message)
+                if s.recv(1024) == b"SUCCESS":
+                    latencies.append(time.perf_counter() - start)
+        except OSError:
+            pass
+
+
+def time_clients(directory, clients, seconds):
+    port_queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=run_server, args=(directory, port_queue), daemon=True)
+    proc.start()
+    port = port_queue.get(timeout=10)
+    time.sleep(0.2)
+    latencies = []
+    deadline = time.time() + seconds
+    threads = [
+        threading.Thread(target=client_loop, args=(port, i, deadline, latencies))
+        for i in range(clients)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    proc.terminate()
+    proc.join()
+    latencies.sort()
+    return (len(latencies) / seconds, statistics.median(latencies) * 1000,
+            latencies[int(len(latencies) * 0.99) - 1] * 1000)
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"{'store':>6} {'update us':>10} {'reports/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for label in ("off", "on"):
+        directory = tempfile.mkdtemp(prefix="rssi-store-") if label == "on" else None
+        try:
+            update_us = time_updates(directory)
+            if directory:
+                shutil.rmtree(directory)
+                directory = tempfile.mkdtemp(prefix="rssi-store-")
+            rate, p50, p99 = time_clients(directory, clients, seconds)
+        finally:
+            if directory:
+                shutil.rmtree(directory)
+        print(f"{label:>6} {update_us:>10.2f} {rate:>10.0f} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
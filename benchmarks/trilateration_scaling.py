@@ -0,0 +1,80 @@
+"""Benchmark: batched trilateration cost over devices x sensors
+
+Usage: python benchmarks/trilateration_scaling.py [max_devices]
+
+Places devices at random in a 20 x 20 m area watched by the router plus a
+grid of monitor nodes, feeds every sensor's RSSI for every device (log
+distance model, 2 dB noise) into a PositionSolver, and times solving all
+devices from scratch and re-solving after 1% of them moved (cache hits for
+the rest). Reported with the mean position error. numpy is used for the
+group products when it is installed.
+"""
+import math
+import random
+import sys
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+import calibration
+from trilateration import PositionSolver
+
+AREA = 20.0
+NOISE = 2.0
+
+
+def sensor_grid(count):
+    """The router at the origin plus count - 1 nodes spread over the area"""
+    side = math.ceil(math.sqrt(count))
+    spots = [(AREA * (i % side) / max(1, side - 1), AREA * (i // side) / max(1, side - 1))
+             for i in range(side * side)]
+    nodes = [spot for spot in spots if spot != (0.0, 0.0)][:count - 1]
+    return {f"node-{i}": spot for i, spot in enumerate(nodes)}
+
+
+def rssi_at(device, sensor):
+    distance = max(0.1, math.dist(device, sensor))
+    return round(-50 - 40 * math.log10(distance) + random.gauss(0, NOISE))
+
+
+def feed(solver, truth, names, timestamp):
+    for sensor_id, position in solver.sensors.items():
+        solver.record_many([(name, rssi_at(truth[name], position)) for name in names], sensor_id, timestamp)
+
+
+def bench(devices, sensors):
+    solver = PositionSolver(sensor_grid(sensors), alpha=1.0)
+    truth = {f"device-{i}": (random.uniform(0, AREA), random.uniform(0, AREA)) for i in range(devices)}
+    names = list(truth)
+    feed(solver, truth, names, 0.0)
+    start = time.perf_counter()
+    solver.solve()
+    full = time.perf_counter() - start
+    error = sum(math.dist(solver.positions[name], truth[name]) for name in names) / devices
+    moved = random.sample(names, max(1, devices // 100))
+    for name in moved:
+        truth[name] = (random.uniform(0, AREA), random.uniform(0, AREA))
+    feed(solver, truth, moved, 1.0)
+    start = time.perf_counter()
+    solved = solver.solve()
+    incremental = time.perf_counter() - start
+    return full, incremental, solved, error
+
+
+def main():
+    max_devices = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    calibration.configure(distance_model="log")
+    numpy = calibration.load_numpy()
+    print(f"20 x 20 m area, noise sigma {NOISE:g} dB, numpy {'available' if numpy else 'not installed'}")
+    print(f"{'devices':>8} {'sensors':>8} {'full ms':>9} {'us/device':>10} {'1% moved ms':>12} "
+          f"{'re-solved':>10} {'error m':>8}")
+    for devices in (1000, 10000, max_devices):
+        if devices > max_devices:
+            continue
+        for sensors in (3, 5, 9, 16):
+            full, incremental, solved, error = bench(devices, sensors)
+            print(f"{devices:>8} {sensors:>8} {full * 1000:>9.1f} {full / devices * 1e6:>10.2f} "
+                  f"{incremental * 1000:>12.2f} {solved:>10} {error:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Timing harness for the per-tick device list update in RSSIMonitorUI
+
+Usage: python benchmarks/ui_tick.py [changed_fraction]
+
+Compares the old delete-all/insert-all refresh with the incremental
+update_device_list at 100, 1k and 10k devices. Each tick a fraction of the
+devices (default 20%, i.e. 5 s reports on a 1 s tick) gets a new reading.
+Runs against a real ttk.Treeview when a display is available, otherwise a
+stand-in that counts the widget calls, so it also works on headless hosts.
+"""
+import itertools
+import random
+import sys
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+from device_registry import DeviceRegistry
+from monitor_ui import RSSIMonitorUI
+
+
+class FakeTreeview:
+    """Minimal ttk.Treeview stand-in recording how many calls each tick makes"""
+
+    def __init__(self):
+        self.rows = {}
+        self.ids = itertools.count()
+        self.calls = 0
+
+    def insert(self, parent, index, values=()):
+        self.calls += 1
+        item = f"I{next(self.ids)}"
+        self.rows[item] = values
+        return item
+
+    def item(self, item, values=()):
+        self.calls += 1
+        self.rows[item] = values
+
+    def delete(self, item):
+        self.calls += 1
+        del self.rows[item]
+
+    def get_children(self):
+        self.calls += 1
+        return list(self.rows)
+
+
+def make_tree():
+    try:
+        import tkinter as tk
+        from tkinter import ttk
+        root = tk.Tk()
+        root.withdraw()
+        return ttk.Treeview(root, columns=("device", "ip", "rssi", "distance"), show="headings"), "Tk"
+    except Exception:
+        return FakeTreeview(), "headless stand-in"
+
+
+def full_refresh(ui, devices):
+    """What update_ui used to do every second"""
+    for item in ui.tree.get_children():
+        ui.tree.delete(item)
+    for device_name, data in devices.items():
+        distance = ui.rssi_to_distance(data.rssi)
+        ui.tree.insert("", "end", values=(device_name, data.ip, f"{data.rssi} dBm", f"{distance}m"))
+
+
+def bench(count, fraction, ticks=10):
+    tree, backend = make_tree()
+    ui = RSSIMonitorUI.__new__(RSSIMonitorUI)
+    ui.tree = tree
+    ui.tree_rows = {}
+    registry = DeviceRegistry()
+    names = [f"device-{i}" for i in range(count)]
+    for name in names:
+        registry.update(name, random.randint(-90, -30), "10.0.0.1")
+    version, changed, removed = registry.changes_since(0)
+    ui.update_device_list(changed, removed)
+
+    full = incremental = 0.0
+    for _ in range(ticks):
+        for name in random.sample(names, int(count * fraction)):
+            registry.update(name, random.randint(-90, -30), "10.0.0.1")
+        version, changed, removed = registry.changes_since(version)
+
+        start = time.perf_counter()
+        ui.update_device_list(changed, removed)
+        incremental += time.perf_counter() - start
+
+    for _ in range(ticks):
+        start = time.perf_counter()
+        full_refresh(ui, registry.snapshot())
+        full += time.perf_counter() - start
+    return backend, full / ticks * 1000, incremental / ticks * 1000
+
+
+def main():
+    fraction = float(sys.argv[1]) if len(sys.argv) > 1 else 0.2
+    print(f"{fraction:.0%} of devices report per tick")
+    print(f"{'devices':>8} {'full ms/tick':>13} {'incremental ms/tick':>20}  backend")
+    for count in (100, 1000, 10000):
+        backend, full_ms, incremental_ms = bench(count, fraction)
+        print(f"{count:>8} {full_ms:>13.2f} {incremental_ms:>20.2f}  {backend}")
+
+
+if __name__ == "__main__":
+    main()
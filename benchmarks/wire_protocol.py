@@ -0,0 +1,90 @@
+"""Microbenchmark: parsing text reports vs binary frames on the server
+
+Usage: python benchmarks/wire_protocol.py [readings] [devices]
+
+Feeds the same readings, spread over devices, through each server-side
+parser in 64 KiB chunks as a socket would deliver them: stream lines
+("login|name|rssi\\n" through LineStream and RSSIServer.process_message),
+batch lines of 500 readings, and binary frames of 500 readings received
+in place with BinaryStream.free()/received(). The server only counts the
+readings it is handed, so this times parsing alone. Reports readings/s
+and bytes on the wire per reading.
+"""
+import sys
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+from binary_protocol import BinaryEncoder, BinaryStream, binary_hello
+from protocol import LineStream, format_batch, stream_hello
+from rssi_monitor import RSSIServer
+
+CHUNK = 65536
+BATCH = 500
+ADDR = ("127.0.0.1", 40000)
+
+
+class CountingServer(RSSIServer):
+    """RSSIServer without sockets or storage: counts what the parsers hand it"""
+
+    def __init__(self):
+        super().__init__(port=None, verbose=False)
+        self.count = 0
+
+    def update_device(self, device_name, rssi, ip, sensor=""):
+        self.count += 1
+        return True
+
+    def record_readings(self, readings, ip, sensor=""):
+        self.count += len(readings)
+        return ()
+
+
+def chunks(data):
+    return [data[i:i + CHUNK] for i in range(0, len(data), CHUNK)]
+
+
+def run_text(server, payload):
+    stream = LineStream(lambda line: server.process_message(line, ADDR))
+    for chunk in payload:
+        stream.feed(chunk)
+
+
+def run_binary(server, payload):
+    stream = BinaryStream(lambda readings, sensor: server.stored_count(readings, ADDR[0], sensor))
+    for chunk in payload:
+        free = stream.free()
+        free[:len(chunk)] = chunk  # Stands in for sock.recv_into(free)
+        stream.received(len(chunk))
+
+
+def bench(name, run, payload, readings):
+    server = CountingServer()
+    start = time.perf_counter()
+    run(server, payload)
+    elapsed = time.perf_counter() - start
+    if server.count != readings:
+        raise RuntimeError(f"{name}: parsed {server.count} of {readings} readings")
+    return readings / elapsed, sum(len(chunk) for chunk in payload) / readings
+
+
+def main():
+    readings = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    devices = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    data = [(f"device-{i % devices:06d}", -40 - i % 50) for i in range(readings)]
+    batches = [data[first:first + BATCH] for first in range(0, readings, BATCH)]
+    lines = stream_hello("none") + "".join(f"login|{name}|{rssi}\n" for name, rssi in data).encode()
+    batch_lines = stream_hello("none") + b"".join(format_batch(batch) + b"\n" for batch in batches)
+    encoder = BinaryEncoder()
+    frames = binary_hello("none") + b"".join(encoder.encode(batch) for batch in batches)
+    print(f"{readings} readings over {devices} devices, fed in {CHUNK // 1024} KiB chunks")
+    print(f"{'format':>14} {'readings/s':>11} {'bytes/reading':>14} {'speedup':>8}")
+    base = None
+    for name, run, payload in (("text lines", run_text, lines), ("text batches", run_text, batch_lines),
+                               ("binary frames", run_binary, frames)):
+        rate, size = bench(name, run, chunks(payload), readings)
+        base = base or rate
+        print(f"{name:>14} {rate:>11.0f} {size:>14.1f} {rate / base:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark: time spent in update_device, writing directly vs through the write-behind queue
+
+Usage: python benchmarks/write_behind.py [threads] [seconds]
+
+Producer threads call RSSIServer.update_device as fast as they can, as
+handle_client does per report, with a ReadingStore in a temporary
+directory attached. "direct" writes registry, history and store inline;
+the queue modes only enqueue, and a drain thread applies batches, here
+with an extra consumer that takes 2 ms per batch to stand in for a slow
+alerting hook. Reported: reports/sec, per-call p50/p99 latency, and for
+the queue its peak depth, worst drain lag and readings discarded.
+"""
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import bench_util  # noqa: F401 (puts the repo root on sys.path)
+from ingest_queue import IngestQueue
+from reading_store import ReadingStore
+from rssi_monitor import RSSIServer
+
+
+def slow_consumer(batch):
+    time.sleep(0.002)
+
+
+def producer(server, index, deadline, latencies):
+    local = []
+    name = f"bench-{index}"
+    rssi = -60
+    while time.time() < deadline:
+        start = time.perf_counter()
+        server.update_device(name, rssi, "10.0.0.1")
+        local.append(time.perf_counter() - start)
+    latencies.extend(local)
+
+
+def bench(overflow, threads, seconds):
+    directory = tempfile.mkdtemp(prefix="rssi-queue-")
+    store = ReadingStore(directory)
+    store.start()
+    ingest = None
+    if overflow:
+        ingest = IngestQueue(max_readings=50000, overflow=overflow)
+        ingest.add_consumer(slow_consumer)
+    server = RSSIServer(host='127.0.0.1', port=0, verbose=False, store=store, ingest=ingest)
+    if ingest is not None:
+        ingest.start()
+    latencies = []
+    deadline = time.time() + seconds
+    workers = [threading.Thread(target=producer, args=(server, i, deadline, latencies))
+               for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    metrics = None
+    if ingest is not None:
+        ingest.stop()
+        metrics = ingest.metrics()
+    store.close()
+    server.server.close()
+    shutil.rmtree(directory)
+    latencies.sort()
+    return (len(latencies) / seconds, statistics.median(latencies) * 1e6,
+            latencies[int(len(latencies) * 0.99) - 1] * 1e6, metrics)
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(f"{threads} producer threads, {seconds:g}s per mode")
+    print(f"{'mode':>14} {'reports/s':>10} {'p50 us':>8} {'p99 us':>8} {'max depth':>10} "
+          f"{'max lag ms':>11} {'discarded':>10}")
+    for overflow in (None, "block", "drop", "sample"):
+        rate, p50, p99, metrics = bench(overflow, threads, seconds)
+        label = f"queue/{overflow}" if overflow else "direct"
+        if metrics:
+            extra = (f"{metrics['max_depth']:>10} {metrics['max_lag'] * 1000:>11.1f} "
+                     f"{metrics['dropped'] + metrics['evicted']:>10}")
+        else:
+            extra = f"{'-':>10} {'-':>11} {'-':>10}"
+        print(f"{label:>14} {rate:>10.0f} {p50:>8.2f} {p99:>8.2f} {extra}")
+
+
+if __name__ == "__main__":
+    main()
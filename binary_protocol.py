@@ -0,0 +1,269 @@
+"""Compact binary report protocol, accepted next to the text formats of protocol.py
+
+A session opens with a hello and the server's answer:
+
+    client  HELLO        magic "RSSB", version, ack mode, id width (2 or 4),
+                         password length, sensor id length, then both strings
+    server  HELLO_REPLY  magic, the version it speaks, status (HELLO_OK, ...)
+
+after which the client sends frames, each a FRAME header (type, flags,
+count, body length) followed by the body:
+
+    DEFINE    count entries of: device id, name length (1 byte), UTF-8 name
+    READINGS  count entries of READING: device id, RSSI as a signed byte
+
+Device ids are chosen by the client and only mean something within the
+session: ids are dense from 0, and a name is sent once, in a DEFINE frame,
+before the id is used. A reconnecting client starts over. The sensor id
+from the hello tags every reading of the session (see protocol.py).
+
+With ack "each" the server answers every READINGS frame with an ACK frame
+carrying (ok, total) readings; with "batch" it sends one per chunk read
+from the socket; with "none" it stays silent. All integers are big-endian.
+"""
+import struct
+
+from protocol import ACK_MODES, BINARY_MAGIC
+
+VERSION = 1
+HELLO = struct.Struct("!4sBBBBB")
+HELLO_REPLY = struct.Struct("!4sBB")
+HELLO_OK = 0
+HELLO_UNSUPPORTED = 1  # Reconnect speaking the version in the reply
+HELLO_REFUSED = 2  # Wrong password or malformed hello
+FRAME = struct.Struct("!BBHI")
+DEFINE = 1
+READINGS = 2
+ACK = 0x81
+ACK_BODY = struct.Struct("!II")
+MAX_BODY = 1 << 16  # Largest frame body accepted
+MAX_SESSION_DEVICES = 1 << 20
+READING_FORMATS = {2: struct.Struct("!Hb"), 4: struct.Struct("!Ib")}
+ID_FORMATS = {2: struct.Struct("!H"), 4: struct.Struct("!I")}
+
+
+def binary_hello(ack="batch", id_width=2, password="login", sensor_id=""):
+    """Build the hello that opens a binary session"""
+    if ack not in ACK_MODES:
+        raise ValueError(f"Unknown ack mode: {ack}")
+    if id_width not in READING_FORMATS:
+        raise ValueError("id_width must be 2 or 4")
+    password, sensor = password.encode(), sensor_id.encode()
+    return HELLO.pack(BINARY_MAGIC, VERSION, ACK_MODES.index(ack), id_width, len(password), len(sensor)) \
+        + password + sensor
+
+
+def valid_name(device_name):
+    """Whether a device name can be sent in a DEFINE frame"""
+    if not isinstance(device_name, str):
+        return False
+    name = device_name.encode()
+    return 0 < len(name) <= 255 and b"|" not in name and b"\n" not in name
+
+
+def ack_frame(ok, total):
+    return FRAME.pack(ACK, 0, 0, ACK_BODY.size) + ACK_BODY.pack(ok, total)
+
+
+class BinaryEncoder:
+    """Client side of a session: assigns device ids and encodes readings into frames"""
+
+    def __init__(self, id_width=2):
+        self.id_width = id_width
+        self.reading = READING_FORMATS[id_width]
+        self.id_format = ID_FORMATS[id_width]
+        self.ids = {}  # {device_name: id}
+        self.capacity = min(MAX_SESSION_DEVICES, 1 << (8 * id_width))  # Devices one session can define
+
+    def reset(self):
+        """Forget the ids, for a new connection"""
+        self.ids = {}
+
+    def encode(self, readings):
+        """Frames for [(device_name, rssi), ...]: DEFINEs for new names, then READINGS
+
+        RSSI values must be ints; they are clamped to a signed byte. Raises
+        ValueError, leaving the session's ids as they were, for a name that
+        valid_name() refuses or when the new names would take the session
+        past capacity devices.
+        """
+        frames = []
+        defines = []
+        ids, new = self.ids, {}
+        for device_name, _ in readings:
+            if device_name not in ids and device_name not in new:
+                if len(ids) + len(new) >= self.capacity:
+                    raise ValueError("Too many devices for one session")
+                if not valid_name(device_name):
+                    raise ValueError(f"Invalid device name: {device_name!r}")
+                name = device_name.encode()
+                new[device_name] = len(ids) + len(new)
+                defines.append(self.id_format.pack(new[device_name]) + bytes((len(name),)) + name)
+        ids.update(new)
+        body, count = bytearray(), 0
+        for define in defines:
+            if len(body) + len(define) > MAX_BODY or count == 0xFFFF:
+                frames.append(FRAME.pack(DEFINE, 0, count, len(body)) + body)
+                body, count = bytearray(), 0
+            body += define
+            count += 1
+        if count:
+            frames.append(FRAME.pack(DEFINE, 0, count, len(body)) + body)
+        per_frame = min(0xFFFF, MAX_BODY // self.reading.size)
+        pack = self.reading.pack
+        for first in range(0, len(readings), per_frame):
+            chunk = readings[first:first + per_frame]
+            body = b"".join([pack(ids[name], max(-128, min(127, rssi))) for name, rssi in chunk])
+            frames.append(FRAME.pack(READINGS, 0, len(chunk), len(body)) + body)
+        return b"".join(frames)
+
+
+class BinaryStream:
+    """Server side of a binary session, independent of the socket API in use
+
+    Bytes are received straight into a fixed buffer: call free() for a
+    writable memoryview, recv_into it, then received(nbytes). Frames are
+    parsed in place from memoryview slices of that buffer, so nothing is
+    copied except device names the first time they are defined. feed()
+    copies bytes already read elsewhere (the start of the connection) in.
+    Complete READINGS frames go to handle_readings(readings, sensor_id) as
+    [(device_name, rssi), ...], which may return how many it stored for the
+    ACK (None for all of them); readings with an undefined id are dropped.
+    The methods return the bytes to send back, which may be empty, and
+    raise ValueError on a malformed session, after which it must be closed
+    (sending reject first if it is set: the answer to a refused hello).
+    """
+
+    def __init__(self, handle_readings, password="login"):
+        self.handle_readings = handle_readings
+        self.password = password
+        self.buffer = bytearray(2 * (FRAME.size + MAX_BODY))
+        self.view = memoryview(self.buffer)
+        self.start = 0  # Unparsed bytes are buffer[start:end]
+        self.end = 0
+        self.ack = None  # Set once the hello has been read
+        self.reject = None
+        self.sensor = ""
+        self.reading = None
+        self.id_format = None
+        self.names = []  # Session device id -> name
+
+    def free(self):
+        """Writable memoryview of the buffer's free space"""
+        if self.start and len(self.buffer) - self.end < FRAME.size + MAX_BODY:
+            # Move the partial frame to the front so the largest frame fits
+            pending = self.end - self.start
+            self.buffer[:pending] = self.buffer[self.start:self.end]
+            self.start, self.end = 0, pending
+        return self.view[self.end:]
+
+    def received(self, nbytes):
+        """Parse after nbytes were written into free()"""
+        self.end += nbytes
+        return self._parse()
+
+    def feed(self, data):
+        """Copy data in and parse it"""
+        replies = []
+        view = memoryview(data)
+        while view:
+            free = self.free()
+            if not free:
+                raise ValueError("Binary frame too large")
+            size = min(len(free), len(view))
+            free[:size] = view[:size]
+            view = view[size:]
+            replies.append(self.received(size))
+        return b"".join(replies)
+
+    def _parse(self):
+        replies = []
+        ok = total = 0
+        buffer = self.buffer
+        if self.ack is None:
+            hello = self._parse_hello()
+            if hello is None:
+                return b""
+            replies.append(hello)
+        while self.end - self.start >= FRAME.size:
+            kind, _, count, length = FRAME.unpack_from(buffer, self.start)
+            if length > MAX_BODY:
+                raise ValueError("Binary frame too large")
+            body_at = self.start + FRAME.size
+            if self.end - body_at < length:
+                break
+            body = self.view[body_at:body_at + length]
+            self.start = body_at + length
+            if kind == READINGS:
+                accepted = self._readings(count, body)
+                ok += accepted
+                total += count
+                if self.ack == "each":
+                    replies.append(ack_frame(accepted, count))
+            elif kind == DEFINE:
+                self._define(count, body)
+            else:
+                raise ValueError(f"Unknown binary frame type {kind}")
+        if self.start == self.end:
+            self.start = self.end = 0
+        if self.ack == "batch" and total:
+            replies.append(ack_frame(ok, total))
+        return b"".join(replies)
+
+    def _parse_hello(self):
+        if self.end - self.start < HELLO.size:
+            return None
+        magic, version, ack, id_width, password_size, sensor_size = HELLO.unpack_from(self.buffer, self.start)
+        size = HELLO.size + password_size + sensor_size
+        if self.end - self.start < size:
+            return None
+        password_at = self.start + HELLO.size
+        password = bytes(self.buffer[password_at:password_at + password_size])
+        sensor = bytes(self.buffer[password_at + password_size:self.start + size])
+        self.start += size
+        if version != VERSION:
+            self.reject = HELLO_REPLY.pack(BINARY_MAGIC, VERSION, HELLO_UNSUPPORTED)
+            raise ValueError(f"Unsupported binary protocol version {version}")
+        if (magic != BINARY_MAGIC or password != self.password.encode() or ack >= len(ACK_MODES)
+                or id_width not in READING_FORMATS or b"|" in sensor):
+            self.reject = HELLO_REPLY.pack(BINARY_MAGIC, VERSION, HELLO_REFUSED)
+            raise ValueError("Invalid binary hello")
+        self.ack = ACK_MODES[ack]
+        self.sensor = sensor.decode()
+        self.reading = READING_FORMATS[id_width]
+        self.id_format = ID_FORMATS[id_width]
+        return HELLO_REPLY.pack(BINARY_MAGIC, VERSION, HELLO_OK)
+
+    def _define(self, count, body):
+        id_size = self.id_format.size
+        at = 0
+        names = self.names
+        for _ in range(count):
+            if len(body) < at + id_size + 1:
+                raise ValueError("Binary define frame truncated")
+            (device_id,) = self.id_format.unpack_from(body, at)
+            size = body[at + id_size]
+            name = bytes(body[at + id_size + 1:at + id_size + 1 + size]).decode()
+            at += id_size + 1 + size
+            if not name or len(name.encode()) != size or "|" in name or "\n" in name:
+                raise ValueError("Invalid device name in binary define")
+            if device_id == len(names) and device_id < MAX_SESSION_DEVICES:
+                names.append(name)
+            elif device_id < len(names):
+                names[device_id] = name
+            else:
+                raise ValueError(f"Binary device id {device_id} out of order")
+        if at != len(body):
+            raise ValueError("Binary define frame size mismatch")
+
+    def _readings(self, count, body):
+        if len(body) != count * self.reading.size:
+            raise ValueError("Binary readings frame size mismatch")
+        names = self.names
+        known = len(names)
+        readings = [(names[device_id], rssi) for device_id, rssi in self.reading.iter_unpack(body)
+                    if device_id < known]
+        if not readings:
+            return 0
+        stored = self.handle_readings(readings, self.sensor)
+        return len(readings) if stored is None else stored
@@ -0,0 +1,107 @@
+from bisect import bisect_right
+
+# Bucket tables, thresholds ascending: a reading at or above thresholds[i]
+# (and below thresholds[i + 1]) gets entry i + 1, anything lower entry 0.
+# Calibrated against known distances: -50 dBm is about 1 m, -70 dBm about 3 m.
+DISTANCE_THRESHOLDS = (-80, -70, -60, -50, -30)
+DISTANCES = (5.0, 4.0, 3.0, 2.0, 1.0, 0.5)
+QUALITY_THRESHOLDS = (-80, -70, -60, -50)
+QUALITY_LABELS = ("Very Poor", "Poor", "Fair", "Good", "Excellent")
+
+NUMPY_MIN_SIZE = 64  # Below this, converting to an array costs more than it saves
+
+_numpy = None  # The numpy module once looked up, False if it is not installed
+
+
+def load_numpy():
+    # numpy takes ~100 ms to import, so only pay for it on the first fleet-sized call
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+
+class Calibration:
+    """Turns RSSI readings into distance estimates and quality labels
+
+    distance_model "buckets" uses the DISTANCES table; "log" uses the
+    log-distance path-loss model d = 10 ** ((tx_power - rssi) / (10 * n)),
+    where tx_power is the RSSI at 1 m and n the path-loss exponent (2 in
+    free space, 3-4 indoors; 4 with -50 dBm roughly matches the table).
+    The plural methods take a whole sequence of readings (list, array or
+    memoryview) and do one vectorized call with numpy when it is installed
+    and the input is large enough, falling back to bisect otherwise. They
+    always return lists.
+    """
+
+    def __init__(self, distance_model="buckets", tx_power=-50.0, exponent=4.0,
+                 distance_thresholds=DISTANCE_THRESHOLDS, distances=DISTANCES,
+                 quality_thresholds=QUALITY_THRESHOLDS, quality_labels=QUALITY_LABELS):
+        if distance_model not in ("buckets", "log"):
+            raise ValueError("distance_model must be 'buckets' or 'log'")
+        if len(distances) != len(distance_thresholds) + 1 or len(quality_labels) != len(quality_thresholds) + 1:
+            raise ValueError("each table needs one more value than it has thresholds")
+        self.distance_model = distance_model
+        self.tx_power = tx_power
+        self.exponent = exponent
+        self.distance_thresholds = tuple(distance_thresholds)
+        self.distance_table = tuple(distances)
+        self.quality_thresholds = tuple(quality_thresholds)
+        self.quality_labels = tuple(quality_labels)
+
+    def distance(self, rssi):
+        """Approximate distance in meters for one reading"""
+        if self.distance_model == "log":
+            return 10 ** ((self.tx_power - rssi) / (10 * self.exponent))
+        return self.distance_table[bisect_right(self.distance_thresholds, rssi)]
+
+    def quality(self, rssi):
+        """Human-readable quality label for one reading"""
+        return self.quality_labels[bisect_right(self.quality_thresholds, rssi)]
+
+    def distances(self, readings):
+        """Distances in meters for a sequence of readings"""
+        np = load_numpy() if len(readings) >= NUMPY_MIN_SIZE else False
+        if np:
+            values = np.asarray(readings, dtype=np.float64)
+            if self.distance_model == "log":
+                return (10 ** ((self.tx_power - values) / (10 * self.exponent))).tolist()
+            table = np.asarray(self.distance_table)
+            return table[np.searchsorted(self.distance_thresholds, values, side="right")].tolist()
+        if self.distance_model == "log":
+            scale = 10 * self.exponent
+            tx_power = self.tx_power
+            return [10 ** ((tx_power - rssi) / scale) for rssi in readings]
+        thresholds, table = self.distance_thresholds, self.distance_table
+        return [table[bisect_right(thresholds, rssi)] for rssi in readings]
+
+    def qualities(self, readings):
+        """Quality labels for a sequence of readings"""
+        np = load_numpy() if len(readings) >= NUMPY_MIN_SIZE else False
+        if np:
+            indexes = np.searchsorted(self.quality_thresholds, np.asarray(readings), side="right")
+            return np.asarray(self.quality_labels, dtype=object)[indexes].tolist()
+        thresholds, labels = self.quality_thresholds, self.quality_labels
+        return [labels[bisect_right(thresholds, rssi)] for rssi in readings]
+
+
+default = Calibration()  # What the UI, HTTP API and ChangeFeed use; see configure()
+
+
+def configure(**options):
+    """Replace the shared calibration, e.g. configure(distance_model="log", tx_power=-45)"""
+    global default
+    default = Calibration(**options)
+    return default
+
+
+def rssi_to_distance(rssi):
+    return default.distance(rssi)
+
+
+def rssi_to_quality(rssi):
+    return default.quality(rssi)
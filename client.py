@@ -1,10 +1,10 @@
+import abc
 import socket
 import time
 import subprocess
-import platform
 import re
-import sys
-import random
+
+from protocol import stream_hello, format_batch, parse_batch_reply, sensor_prefix
 
 def get_rssi():
     """Get the Wi-Fi RSSI from Windows using netsh"""
@@ -58,14 +58,248 @@ def send_rssi_to_server(device_name, server_host, server_port=5000):
     
     return False
 
-def main(device_name, server_host, server_port=5000, interval=5):
+class ReportConnection(abc.ABC):
+    """Long-lived connection that carries many reports
+
+    Reconnects transparently: when a send fails the socket is dropped and the
+    reports are retried on a fresh connection, backing off between attempts.
+    Subclasses open the session in connect() and speak a wire format.
+    """
+
+    def __init__(self, server_host, server_port=5000, ack="each", retries=3, max_backoff=30,
+                 sensor_id=""):
+        self.server_host = server_host
+        self.server_port = server_port
+        self.ack = ack
+        self.sensor_id = sensor_id  # Monitor nodes tag the readings they hear
+        self.retries = retries
+        self.max_backoff = max_backoff
+        self.sock = None
+        self.reader = None
+
+    @abc.abstractmethod
+    def connect(self):
+        """Open the connection and send the hello"""
+
+    def close(self):
+        """Drop the connection, it is reopened on the next send"""
+        if self.sock is not None:
+            try:
+                self.reader.close()
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.reader = None
+
+    def _open(self, hello):
+        self.sock = socket.create_connection((self.server_host, self.server_port), timeout=5)
+        self.reader = self.sock.makefile('rb')
+        self.sock.sendall(hello)
+
+    def _request(self, payload, read_reply):
+        # payload is bytes, or a function building them once connected; it
+        # must not fail, as every error here is retried as a broken connection
+        backoff = 1
+        for attempt in range(self.retries + 1):
+            try:
+                if self.sock is None:
+                    self.connect()
+                self.sock.sendall(payload() if callable(payload) else payload)
+                return read_reply()
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Report stream failed ({e}), reconnecting")
+                self.close()
+                if attempt < self.retries:
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+        print("[ERROR] Giving up on this batch of reports")
+        return None
+
+class ReportStream(ReportConnection):
+    """Report connection speaking the text stream protocol (stream mode)"""
+
+    def __init__(self, server_host, server_port=5000, ack="each", retries=3, max_backoff=30,
+                 sensor_id=""):
+        super().__init__(server_host, server_port, ack, retries, max_backoff, sensor_id)
+        self.prefix = sensor_prefix(sensor_id)
+
+    def connect(self):
+        """Open the connection and send the stream hello"""
+        print(f"[INFO] Opening report stream to {self.server_host}:{self.server_port} (ack={self.ack})")
+        self._open(stream_hello(self.ack))
+
+    def send(self, reports):
+        """Send [(device_name, rssi), ...] and return how many were accepted
+
+        With ack="none" the server sends nothing back, so every report that
+        was written is counted as accepted.
+        """
+        payload = "".join(f"{self.prefix}login|{name}|{rssi}\n" for name, rssi in reports).encode()
+        accepted = self._request(payload, lambda: self._read_acks(len(reports)))
+        return accepted or 0
+
+    def send_batch(self, readings):
+        """Send [(device_name, rssi), ...] as one batch message
+
+        Returns the per-reading statuses ("OK", "ERR_RSSI", ...) when ack is
+        "each", otherwise None.
+        """
+        def read_reply():
+            if self.ack == "each":
+                return parse_batch_reply(self._read_line())
+            self._read_acks(1)
+            return None
+        return self._request(format_batch(readings, sensor_id=self.sensor_id) + b"\n", read_reply)
+
+    def _read_line(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Server closed the stream")
+        return line.decode().strip()
+
+    def _read_acks(self, count):
+        if self.ack == "none":
+            return count
+        ok = seen = 0
+        while seen < count:
+            line = self._read_line()
+            if self.ack == "each":
+                seen += 1
+                if line == "SUCCESS":
+                    ok += 1
+                else:
+                    print(f"[WARN] Server response: {line}")
+            else:
+                # ACK|<ok>|<total>, one per chunk the server read
+                _, chunk_ok, chunk_total = line.split('|')
+                ok += int(chunk_ok)
+                seen += int(chunk_total)
+        return ok
+
+class BinaryReportStream(ReportConnection):
+    """Report connection speaking the binary protocol (see binary_protocol.py)
+
+    Each device name goes over the wire once per connection; after that a
+    reading costs 3 bytes (5 with 4-byte ids) instead of a text line. Every
+    send() is already a batch, so there is no send_batch(). The server only
+    acknowledges counts, not which readings it refused.
+    """
+
+    def __init__(self, server_host, server_port=5000, ack="batch", retries=3, max_backoff=30,
+                 sensor_id="", id_width=2):
+        super().__init__(server_host, server_port, ack, retries, max_backoff, sensor_id)
+        from binary_protocol import BinaryEncoder
+        self.encoder = BinaryEncoder(id_width)
+
+    def connect(self):
+        """Open the connection, send the binary hello and check the server's answer"""
+        from binary_protocol import HELLO_OK, HELLO_REPLY, binary_hello
+        print(f"[INFO] Opening binary report stream to {self.server_host}:{self.server_port} (ack={self.ack})")
+        self._open(binary_hello(self.ack, self.encoder.id_width, sensor_id=self.sensor_id))
+        reply = self.reader.read(HELLO_REPLY.size)
+        if len(reply) < HELLO_REPLY.size or HELLO_REPLY.unpack(reply)[2] != HELLO_OK:
+            raise ConnectionError(f"Binary session refused: {reply!r}")
+        self.encoder.reset()  # Device ids only last as long as the connection
+
+    def send(self, reports):
+        """Send [(device_name, rssi), ...] and return how many were accepted
+
+        Readings the protocol cannot carry (a name valid_name() refuses, or
+        an RSSI that is not an integer) are dropped with a warning and not
+        counted. Past 65536 devices in a session the stream reconnects with
+        4-byte ids; readings for more devices than a session may define are
+        split over fresh sessions.
+        """
+        readings = self._checked(reports)
+        accepted = 0
+        for chunk in self._sessions(readings):
+            self._make_room(chunk)
+            # Encoding cannot fail now, also after a reconnect resets the ids
+            accepted += self._request(lambda: self.encoder.encode(chunk),
+                                      lambda: self._read_acks(len(chunk))) or 0
+        return accepted
+
+    def _checked(self, reports):
+        from binary_protocol import valid_name
+        ids = self.encoder.ids
+        readings = []
+        dropped = []
+        for name, rssi in reports:
+            if type(rssi) is not int:
+                try:
+                    rssi = int(rssi)
+                except (TypeError, ValueError):
+                    dropped.append((name, rssi))
+                    continue
+            if name in ids or valid_name(name):
+                readings.append((name, rssi))
+            else:
+                dropped.append((name, rssi))
+        if dropped:
+            print(f"[WARN] Dropped {len(dropped)} readings the binary protocol cannot carry, e.g. {dropped[0]!r}")
+        return readings
+
+    def _sessions(self, readings):
+        # Split readings so that no part names more devices than a session may define
+        from binary_protocol import MAX_SESSION_DEVICES
+        if len(readings) <= MAX_SESSION_DEVICES:
+            return [readings] if readings else []
+        parts, names, first = [], set(), 0
+        for i, (name, _) in enumerate(readings):
+            if name not in names:
+                if len(names) == MAX_SESSION_DEVICES:
+                    parts.append(readings[first:i])
+                    names, first = set(), i
+                names.add(name)
+        parts.append(readings[first:])
+        return parts
+
+    def _make_room(self, readings):
+        # Reconnect, with wider ids if need be, when the session has no ids left for these readings
+        from binary_protocol import BinaryEncoder
+        encoder = self.encoder
+        if len(encoder.ids) + len(readings) <= encoder.capacity:
+            return
+        new = len({name for name, _ in readings if name not in encoder.ids})
+        if len(encoder.ids) + new <= encoder.capacity:
+            return
+        if encoder.id_width == 2:
+            print(f"[INFO] Over {encoder.capacity} devices: switching the binary stream to 4-byte ids")
+            self.encoder = BinaryEncoder(4)
+        else:
+            print(f"[INFO] Over {encoder.capacity} devices: starting a new binary session")
+        self.close()  # The next request connects with a fresh set of ids
+
+    def _read_acks(self, count):
+        from binary_protocol import ACK_BODY, FRAME
+        if self.ack == "none":
+            return count
+        ok = seen = 0
+        while seen < count:
+            frame = self.reader.read(FRAME.size + ACK_BODY.size)
+            if len(frame) < FRAME.size + ACK_BODY.size:
+                raise ConnectionError("Server closed the stream")
+            chunk_ok, chunk_total = ACK_BODY.unpack_from(frame, FRAME.size)
+            ok += chunk_ok
+            seen += chunk_total
+        return ok
+
+def main(device_name, server_host, server_port=5000, interval=5, stream=False, ack="each", binary=False):
     """Main loop to periodically send RSSI updates"""
     print(f"[INFO] Starting RSSI reporter for device '{device_name}'")
     print(f"[INFO] Will connect to server at {server_host}:{server_port}")
     print(f"[INFO] Update interval: {interval} seconds")
     
+    if binary:
+        reporter = BinaryReportStream(server_host, server_port, ack)
+    else:
+        reporter = ReportStream(server_host, server_port, ack) if stream else None
     while True:
-        success = send_rssi_to_server(device_name, server_host, server_port)
+        if reporter is not None:
+            success = reporter.send([(device_name, get_rssi())]) == 1
+        else:
+            success = send_rssi_to_server(device_name, server_host, server_port)
         
         # Wait before the next update
         print(f"[INFO] Waiting {interval} seconds before next update")
@@ -73,20 +307,25 @@ def main(device_name, server_host, server_port=5000, interval=5):
 
 if __name__ == "__main__":
     # Parse command line arguments
-    if len(sys.argv) < 3:
-        print("Usage: python client.py <device_name> <server_host> [server_port] [interval]")
-        print("Example: python client.py my-laptop 192.168.1.100 5000 10")
-        sys.exit(1)
-    
-    device_name = sys.argv[1]
-    server_host = sys.argv[2]
-    
-    # Optional arguments
-    server_port = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
-    interval = int(sys.argv[4]) if len(sys.argv) > 4 else 5
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Periodically report this machine's Wi-Fi RSSI",
+        epilog="Example: python client.py my-laptop 192.168.1.100 5000 10"
+    )
+    parser.add_argument("device_name")
+    parser.add_argument("server_host")
+    parser.add_argument("server_port", nargs="?", type=int, default=5000)
+    parser.add_argument("interval", nargs="?", type=int, default=5)
+    parser.add_argument("--stream", action="store_true",
+                        help="keep one connection open instead of reconnecting for every report")
+    parser.add_argument("--ack", choices=["each", "batch", "none"], default="each",
+                        help="acknowledgement mode for --stream and --binary")
+    parser.add_argument("--binary", action="store_true",
+                        help="keep one connection open and use the compact binary protocol")
+    args = parser.parse_args()
     
     try:
-        main(device_name, server_host, server_port, interval)
+        main(args.device_name, args.server_host, args.server_port, args.interval, args.stream, args.ack, args.binary)
     except KeyboardInterrupt:
         print("[INFO] Client shutting down...")
     except Exception as e:
@@ -0,0 +1,597 @@
+import heapq
+import socket
+import struct
+import threading
+import time
+import types
+from array import array
+import zlib
+
+from protocol import clamp_rssi
+
+
+class DeviceRecord:
+    """Latest reading for one device, updated in place on every report
+
+    Supports record["rssi"] and record.get("ip") so code written against the
+    old per-device dicts keeps working.
+    """
+
+    __slots__ = ("rssi", "last_seen", "ip", "active", "version", "smoothed", "variance", "streak", "presence",
+                 "due")
+
+    def __init__(self, rssi, last_seen, ip, active=True, version=0):
+        self.rssi = rssi
+        self.last_seen = last_seen
+        self.ip = ip
+        self.active = active
+        self.version = version  # Registry version of the last write
+        # Filter state, maintained by the registry's SignalFilter if it has one
+        self.smoothed = rssi
+        self.variance = 0.0
+        self.streak = 1
+        self.presence = "online"
+        self.due = 0.0  # When the registry's expiry timer for this record fires, 0 if none is set
+
+    def update(self, rssi, last_seen, ip):
+        self.rssi = rssi
+        self.last_seen = last_seen
+        self.ip = ip
+        self.active = True
+
+    def __getitem__(self, key):
+        if key in DeviceRecord.FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in DeviceRecord.FIELDS:
+            return getattr(self, key)
+        return default
+
+    def as_dict(self):
+        return {"rssi": self.rssi, "last_seen": self.last_seen, "ip": self.ip, "active": self.active,
+                "smoothed": round(self.smoothed, 1), "presence": self.presence}
+
+    def __repr__(self):
+        return f"DeviceRecord({self.as_dict()})"
+
+
+DeviceRecord.FIELDS = ("rssi", "last_seen", "ip", "active", "smoothed", "presence")
+
+
+class _Shard:
+    """One lock stripe: its devices, ordered by the version of their last write"""
+
+    __slots__ = ("lock", "entries", "removed", "version", "snapshot", "snapshot_version", "timers")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # {device_name: DeviceRecord}, least recently written first. Names
+        # are moved to the end on every write, so walking it backwards visits
+        # only what changed since a given version.
+        self.entries = {}
+        self.removed = {}  # {device_name: version of its removal}, same ordering
+        self.version = 0
+        self.snapshot = {}
+        self.snapshot_version = 0
+        self.timers = []  # Heap of (due, device_name) expiry timers
+
+
+class DeviceRegistry:
+    """Thread-safe store of the latest reading per device, split into lock-striped shards
+
+    Each device name maps to one shard by a stable hash, and every shard has
+    its own lock, so writers for different devices rarely wait on each other.
+    Readers copy one shard at a time: a snapshot is consistent within a shard
+    but not across shards, which is plenty for a UI refreshing every second.
+
+    Every write or removal gets a number from one monotonically increasing
+    version counter. snapshot() returns a cached immutable mapping that is
+    only rebuilt after a write, and changes_since() returns just the entries
+    written after a given version.
+
+    Entries are DeviceRecord objects that are updated in place, so a
+    snapshot fixes which devices exist but may show readings newer than its
+    version. Use record.as_dict() for a frozen copy.
+
+    With a signal_filter (see signal_filter.SignalFilter), every write also
+    updates the record's smoothed RSSI and presence state in O(1).
+
+    Devices that go silent are expired by expire(): offline after the
+    filter's offline_after seconds, inactive (active=False) after
+    inactive_after and removed after evict_after, each None to disable.
+    Removals leave tombstones for changes_since; only max_tombstones of the
+    most recent ones are kept, and tombstone_floor is the newest version
+    whose tombstone was dropped.
+    """
+
+    def __init__(self, shards=16, signal_filter=None, inactive_after=None, evict_after=None,
+                 max_tombstones=65536):
+        self.shard_count = shards
+        self.signal_filter = signal_filter
+        self.inactive_after = inactive_after
+        self.evict_after = evict_after
+        # Silences after which expire() has something to do, shortest first
+        offline_after = signal_filter.offline_after if signal_filter is not None else None
+        self._deadlines = tuple(sorted(after for after in (offline_after, inactive_after, evict_after) if after))
+        self._tombstones_per_shard = max(1, max_tombstones // shards)
+        self.tombstone_floor = 0
+        self.shards = [self.shard_type() for _ in range(shards)]
+        self._version = 0
+        self._version_lock = threading.Lock()
+        self._version_changed = threading.Condition(self._version_lock)
+        self._snapshot = types.MappingProxyType({})
+        self._snapshot_version = 0
+        self._snapshot_lock = threading.Lock()
+
+    @property
+    def version(self):
+        """Version of the most recent write or removal (0 if none yet)"""
+        return self._version
+
+    def _next_version(self):
+        with self._version_lock:
+            self._version += 1
+            self._version_changed.notify_all()  # Next to free when nobody is waiting
+            return self._version
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until the version moves past version or timeout passes; returns the version"""
+        with self._version_lock:
+            self._version_changed.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+    def shard_index(self, device_name):
+        """Shard number for a device (crc32, so it is the same in every process)"""
+        return zlib.crc32(device_name.encode()) % self.shard_count
+
+    def _shard(self, device_name):
+        return self.shards[self.shard_index(device_name)]
+
+    # How records are held. Here shard.entries maps names to DeviceRecord
+    # objects; ColumnarDeviceRegistry overrides these to keep them in arrays.
+    shard_type = _Shard
+
+    def _create(self, shard, device_name, rssi, now, ip):
+        """New entry for a device's first reading; the caller stores it in shard.entries"""
+        return DeviceRecord(rssi, now, ip)
+
+    def _live(self, shard, entry):
+        """The record behind an entry, for reading or changing it under the shard lock"""
+        return entry
+
+    def _frozen(self, shard, entry):
+        """The record behind an entry, as handed to readers"""
+        return entry
+
+    def _copy_entries(self, shard):
+        return shard.entries.copy()
+
+    def _release(self, shard, entry):
+        """Called when an entry has been taken out of shard.entries"""
+
+    def _write(self, shard, device_name, rssi, ip, now):
+        # Caller holds shard.lock
+        version = self._next_version()
+        entry = shard.entries.pop(device_name, None)
+        if entry is None:
+            entry = self._create(shard, device_name, rssi, now, ip)
+            record = self._live(shard, entry)
+            if self.signal_filter is not None:
+                self.signal_filter.first(record)
+            if shard.removed:
+                shard.removed.pop(device_name, None)
+        else:
+            record = self._live(shard, entry)
+            if self.signal_filter is not None:
+                self.signal_filter.step(record, rssi, now)  # Needs the previous last_seen
+            else:
+                record.smoothed = rssi
+            record.update(rssi, now, ip)
+        record.version = version
+        shard.entries[device_name] = entry  # Re-insert at the most recent end
+        shard.version = version
+        # A timer already set for an earlier silence fires, sees the new
+        # last_seen and re-arms itself, so most writes push nothing
+        if self._deadlines and (not record.due or record.due > now + self._deadlines[0]):
+            record.due = now + self._deadlines[0]
+            heapq.heappush(shard.timers, (record.due, device_name))
+
+    def _tombstone(self, shard, device_name, version):
+        # Caller holds shard.lock
+        shard.removed[device_name] = version
+        if len(shard.removed) > self._tombstones_per_shard:
+            oldest = next(iter(shard.removed))
+            self.tombstone_floor = max(self.tombstone_floor, shard.removed.pop(oldest))
+
+    def update(self, device_name, rssi, ip, now=None):
+        """Record one reading for a device"""
+        if now is None:
+            now = time.time()
+        shard = self._shard(device_name)
+        with shard.lock:
+            self._write(shard, device_name, rssi, ip, now)
+
+    def update_many(self, readings, ip, now=None):
+        """Record [(device_name, rssi), ...], taking each touched shard's lock once"""
+        if now is None:
+            now = time.time()
+        by_shard = {}
+        for device_name, rssi in readings:
+            by_shard.setdefault(self.shard_index(device_name), []).append((device_name, rssi))
+        for index, items in by_shard.items():
+            shard = self.shards[index]
+            with shard.lock:
+                for device_name, rssi in items:
+                    self._write(shard, device_name, rssi, ip, now)
+
+    def update_batch(self, batch):
+        """Record [(readings, ip, now), ...] groups, taking each touched shard's lock once for all"""
+        by_shard = {}
+        for readings, ip, now in batch:
+            for device_name, rssi in readings:
+                by_shard.setdefault(self.shard_index(device_name), []).append((device_name, rssi, ip, now))
+        for index, items in by_shard.items():
+            shard = self.shards[index]
+            with shard.lock:
+                for device_name, rssi, ip, now in items:
+                    self._write(shard, device_name, rssi, ip, now)
+
+    def merge_many(self, readings):
+        """Apply [(device_name, rssi, last_seen, ip), ...] from another node, last writer wins
+
+        A reading is only written if it is newer than the one held for its
+        device. Returns the readings that were written.
+        """
+        by_shard = {}
+        for reading in readings:
+            by_shard.setdefault(self.shard_index(reading[0]), []).append(reading)
+        applied = []
+        for index, items in by_shard.items():
+            shard = self.shards[index]
+            with shard.lock:
+                for reading in items:
+                    device_name, rssi, last_seen, ip = reading
+                    entry = shard.entries.get(device_name)
+                    if entry is None or self._live(shard, entry).last_seen < last_seen:
+                        self._write(shard, device_name, rssi, ip, last_seen)
+                        applied.append(reading)
+        return applied
+
+    def get(self, device_name):
+        """Return the DeviceRecord for one device, or None"""
+        shard = self._shard(device_name)
+        with shard.lock:
+            entry = shard.entries.get(device_name)
+            return None if entry is None else self._frozen(shard, entry)
+
+    def remove(self, device_name):
+        """Forget a device; returns True if it was present"""
+        shard = self._shard(device_name)
+        with shard.lock:
+            entry = shard.entries.pop(device_name, None)
+            if entry is None:
+                return False
+            self._release(shard, entry)
+            # Keep a tombstone so changes_since can report the removal
+            version = self._next_version()
+            self._tombstone(shard, device_name, version)
+            shard.version = version
+            return True
+
+    def expire(self, now=None):
+        """Apply every expiry deadline that has passed; returns (offline, inactive, evicted)
+
+        offline and inactive count the devices marked so, evicted lists the
+        names removed. Marking a device is a write with a new version and an
+        eviction a removal, so both reach changes_since readers.
+
+        Each device has at most one timer in its shard's heap, set for the
+        first deadline after its last_seen. Writes do not move it: when it
+        fires for a device that has reported since, it is simply re-armed.
+        A sweep therefore costs O(log n) per timer due, not a scan of every
+        device.
+        """
+        if now is None:
+            now = time.time()
+        signal_filter = self.signal_filter
+        offline_after = signal_filter.offline_after if signal_filter is not None else None
+        offline = inactive = 0
+        evicted = []
+        for shard in self.shards:
+            with shard.lock:
+                timers = shard.timers
+                while timers and timers[0][0] <= now:
+                    due, device_name = heapq.heappop(timers)
+                    entry = shard.entries.get(device_name)
+                    if entry is None:
+                        continue  # Removed since this timer was set
+                    record = self._live(shard, entry)
+                    if record.due != due:
+                        continue  # Re-armed since this timer was set
+                    silent = now - record.last_seen
+                    if self.evict_after and silent >= self.evict_after:
+                        del shard.entries[device_name]
+                        self._release(shard, entry)
+                        version = shard.version = self._next_version()
+                        self._tombstone(shard, device_name, version)
+                        evicted.append(device_name)
+                        continue
+                    changed = False
+                    if offline_after and silent >= offline_after and record.presence == "online":
+                        signal_filter.expire(record)
+                        offline += 1
+                        changed = True
+                    if self.inactive_after and silent >= self.inactive_after and record.active:
+                        record.active = False
+                        inactive += 1
+                        changed = True
+                    if changed:
+                        record.version = shard.version = self._next_version()
+                        # Re-insert at the most recent end
+                        shard.entries[device_name] = shard.entries.pop(device_name)
+                    record.due = 0.0
+                    for after in self._deadlines:
+                        if record.last_seen + after > now:
+                            record.due = record.last_seen + after
+                            heapq.heappush(timers, (record.due, device_name))
+                            break
+        return offline, inactive, evicted
+
+    def shard_snapshots(self):
+        """Yield a copy of each shard in turn
+
+        Copies are reused until their shard is written again, so treat them
+        as read-only.
+        """
+        for shard in self.shards:
+            with shard.lock:
+                if shard.snapshot_version != shard.version:
+                    shard.snapshot = self._copy_entries(shard)
+                    shard.snapshot_version = shard.version
+                copy = shard.snapshot
+            yield copy
+
+    def items(self):
+        """Iterate (device_name, entry) pairs, one shard copy at a time"""
+        for shard in self.shard_snapshots():
+            yield from shard.items()
+
+    def snapshot(self):
+        """Return an immutable mapping of every device
+
+        The mapping is cached and shared between callers until the next
+        write, so polling an idle registry costs nothing.
+        """
+        with self._snapshot_lock:
+            version = self._version
+            if version != self._snapshot_version:
+                devices = {}
+                for shard in self.shard_snapshots():
+                    devices.update(shard)
+                self._snapshot = types.MappingProxyType(devices)
+                self._snapshot_version = version
+            return self._snapshot
+
+    def changes_since(self, version):
+        """Return (current_version, changed, removed) for writes after version
+
+        changed maps device names to their current entries and removed is a
+        set of names deleted since then. Pass the returned version to the next
+        call. Cost is proportional to the number of changes, not devices. An
+        entry may be reported again on the next call if it was written while
+        this one was scanning; applying it twice is harmless.
+
+        If version is below tombstone_floor, removals after it may be
+        missing: callers keeping state should start over from version 0.
+        """
+        current = self._version
+        changed = {}
+        removed = set()
+        if version >= current:
+            return current, changed, removed
+        for shard in self.shards:
+            with shard.lock:
+                if shard.version <= version:
+                    continue
+                for device_name, entry in reversed(shard.entries.items()):
+                    if self._live(shard, entry).version <= version:
+                        break
+                    changed[device_name] = self._frozen(shard, entry)
+                for device_name, removed_at in reversed(shard.removed.items()):
+                    if removed_at <= version:
+                        break
+                    removed.add(device_name)
+        return current, changed, removed
+
+    def __len__(self):
+        return sum(len(shard.entries) for shard in self.shards)
+
+    def __contains__(self, device_name):
+        return device_name in self._shard(device_name).entries
+
+
+PRESENCE = ("offline", "online")
+
+
+class _Columns:
+    """One shard's records as parallel typed arrays, indexed by slot
+
+        rssi       array('h')  2 bytes
+        last_seen  array('d')  8 bytes
+        ip         array('I')  4 bytes, IPv4 packed into an int
+        active     array('b')  1 byte
+        version    array('q')  8 bytes
+        smoothed   array('d')  8 bytes
+        variance   array('d')  8 bytes
+        streak     array('i')  4 bytes
+        presence   array('b')  1 byte, index into PRESENCE
+        due        array('d')  8 bytes
+
+    Addresses that are not dotted IPv4 (or are empty, for devices restored
+    from the store) are kept in a side dict. Slots of removed devices are
+    reused.
+    """
+
+    __slots__ = ("rssi", "last_seen", "ip", "active", "version", "smoothed", "variance", "streak", "presence",
+                 "due", "other_ips", "free")
+
+    def __init__(self):
+        self.rssi = array('h')
+        self.last_seen = array('d')
+        self.ip = array('I')
+        self.active = array('b')
+        self.version = array('q')
+        self.smoothed = array('d')
+        self.variance = array('d')
+        self.streak = array('i')
+        self.presence = array('b')
+        self.due = array('d')
+        self.other_ips = {}  # {slot: ip} for addresses that do not pack
+        self.free = []
+
+    def allocate(self):
+        if self.free:
+            return self.free.pop()
+        for column in (self.rssi, self.last_seen, self.ip, self.active, self.version, self.smoothed,
+                       self.variance, self.streak, self.presence, self.due):
+            column.append(0)
+        return len(self.rssi) - 1
+
+    def release(self, slot):
+        self.other_ips.pop(slot, None)
+        self.free.append(slot)
+
+    def set_ip(self, slot, ip):
+        try:
+            self.ip[slot] = struct.unpack('!I', socket.inet_pton(socket.AF_INET, ip))[0]
+        except OSError:
+            self.ip[slot] = 0
+            self.other_ips[slot] = ip
+            return
+        if self.other_ips:
+            self.other_ips.pop(slot, None)
+
+    def get_ip(self, slot):
+        ip = self.other_ips.get(slot)
+        if ip is None:
+            ip = socket.inet_ntop(socket.AF_INET, struct.pack('!I', self.ip[slot]))
+        return ip
+
+
+def _column(name):
+    def get(cursor):
+        return getattr(cursor.columns, name)[cursor.slot]
+
+    def set(cursor, value):
+        getattr(cursor.columns, name)[cursor.slot] = value
+
+    return property(get, set)
+
+
+class _Cursor:
+    """DeviceRecord look-alike reading and writing one slot of a shard's columns
+
+    Lets the registry and its SignalFilter work on columnar shards
+    unchanged. One per shard, moved between slots under the shard lock.
+    """
+
+    __slots__ = ("columns", "slot")
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.slot = 0
+
+    last_seen = _column("last_seen")
+    version = _column("version")
+    smoothed = _column("smoothed")
+    variance = _column("variance")
+    streak = _column("streak")
+    due = _column("due")
+
+    @property
+    def rssi(self):
+        return self.columns.rssi[self.slot]
+
+    @property
+    def active(self):
+        return bool(self.columns.active[self.slot])
+
+    @active.setter
+    def active(self, value):
+        self.columns.active[self.slot] = value
+
+    @property
+    def presence(self):
+        return PRESENCE[self.columns.presence[self.slot]]
+
+    @presence.setter
+    def presence(self, value):
+        self.columns.presence[self.slot] = PRESENCE.index(value)
+
+    def update(self, rssi, last_seen, ip):
+        columns, slot = self.columns, self.slot
+        columns.rssi[slot] = clamp_rssi(rssi)
+        columns.last_seen[slot] = last_seen
+        columns.set_ip(slot, ip)
+        columns.active[slot] = 1
+
+
+class _ColumnarShard(_Shard):
+    """A shard whose entries map device names to slots in its columns"""
+
+    __slots__ = ("columns", "cursor")
+
+    def __init__(self):
+        super().__init__()
+        self.columns = _Columns()
+        self.cursor = _Cursor(self.columns)
+
+
+class ColumnarDeviceRegistry(DeviceRegistry):
+    """DeviceRegistry keeping its records in typed arrays, for very large fleets
+
+    Same interface and behavior, but each shard stores its records as
+    parallel arrays (see _Columns) and maps device names to slots, instead
+    of holding a DeviceRecord object per device. Readers get DeviceRecord
+    copies: unlike the default registry's, they do not change after they
+    are handed out. Writes cost a little more, going through a cursor
+    object rather than plain attributes.
+    """
+
+    shard_type = _ColumnarShard
+
+    def _create(self, shard, device_name, rssi, now, ip):
+        slot = shard.columns.allocate()
+        cursor = shard.cursor
+        cursor.slot = slot
+        cursor.update(rssi, now, ip)
+        cursor.smoothed = rssi
+        cursor.variance = 0.0
+        cursor.streak = 1
+        cursor.presence = "online"
+        cursor.due = 0.0
+        return slot
+
+    def _live(self, shard, slot):
+        cursor = shard.cursor
+        cursor.slot = slot
+        return cursor
+
+    def _frozen(self, shard, slot):
+        columns = shard.columns
+        record = DeviceRecord(columns.rssi[slot], columns.last_seen[slot], columns.get_ip(slot),
+                              bool(columns.active[slot]), columns.version[slot])
+        record.smoothed = columns.smoothed[slot]
+        record.variance = columns.variance[slot]
+        record.streak = columns.streak[slot]
+        record.presence = PRESENCE[columns.presence[slot]]
+        record.due = columns.due[slot]
+        return record
+
+    def _copy_entries(self, shard):
+        return {device_name: self._frozen(shard, slot) for device_name, slot in shard.entries.items()}
+
+    def _release(self, shard, slot):
+        shard.columns.release(slot)
@@ -0,0 +1,192 @@
+import json
+import threading
+import time
+from collections import deque
+
+from background import BackgroundThread
+
+RETRY_MS = 3000  # How long browsers wait before reconnecting a dropped stream
+
+
+def format_event(event, data):
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class _Subscriber:
+    """One open /stream response: its socket, device filter and bounded event queue"""
+    __slots__ = ("sock", "device_name", "events", "pending", "dropped")
+
+    def __init__(self, sock, device_name, max_events):
+        self.sock = sock
+        self.device_name = device_name  # None to receive every device
+        self.events = deque(maxlen=max_events)  # The oldest events fall off when full
+        self.pending = b""  # Bytes taken off the queue that the socket has not accepted yet
+        self.dropped = 0
+
+    def push(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+        self.events.append(event)
+
+    def flush(self):
+        """Send what the socket takes without blocking; returns False once the client is gone"""
+        while True:
+            if not self.pending:
+                if not self.events:
+                    return True
+                self.pending = b"".join(self.events)
+                self.events.clear()
+            try:
+                sent = self.sock.send(self.pending)
+            except (BlockingIOError, InterruptedError):
+                return True
+            except OSError:
+                return False
+            self.pending = self.pending[sent:]
+            if self.pending:
+                return True  # Socket buffer is full; the rest goes on a later pass
+
+
+class StreamHub(BackgroundThread):
+    """Pushes device changes from an RSSIServer to open Server-Sent Events responses
+
+    One thread sleeps until the registry version moves, reads the changes
+    once, formats each changed device once and fans the messages out to
+    the subscribers that want them. Sockets are non-blocking and every
+    subscriber has its own queue of at most max_events messages, so a slow
+    client loses its oldest updates instead of holding up the others.
+    Clients that went away are dropped on the next write or heartbeat.
+    Bursts are coalesced into at most one push per min_interval seconds.
+    """
+
+    def __init__(self, rssi_server, quality, max_subscribers=1024, max_events=256,
+                 min_interval=0.05, heartbeat=15):
+        self.rssi_server = rssi_server
+        self.quality = quality  # rssi -> description, as on the status page
+        self.max_subscribers = max_subscribers
+        self.max_events = max_events
+        self.min_interval = min_interval
+        self.heartbeat = heartbeat
+        self.subscribers = []
+        self.version = 0
+        self.lock = threading.Lock()
+        self.has_subscribers = threading.Event()
+
+    def device_event(self, device_name, record, version):
+        return format_event("device", {
+            "device_name": device_name,
+            "connected": self.rssi_server.connected(record),
+            "presence": record.presence,
+            "rssi": record.rssi,
+            "smoothed": round(record.smoothed, 1),
+            "quality": self.quality(record.rssi),
+            "last_seen": record.last_seen,
+            "version": version
+        })
+
+    def subscribe(self, sock, device_name=None, last_event_id=None):
+        """Stream to sock, whose response headers have been sent; False when full
+
+        The client first gets the current state of its device (or of every
+        device), or only what changed after last_event_id when it is
+        reconnecting. Events carry the registry version as their id.
+        """
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return False
+            if not self.subscribers:
+                self.version = self.rssi_server.version  # Nothing older is owed to anyone
+            subscriber = _Subscriber(sock, device_name, self.max_events)
+            since = last_event_id if last_event_id and last_event_id <= self.rssi_server.version else 0
+            if since < self.rssi_server.registry.tombstone_floor:
+                since = 0  # Too far behind to list the removals; send the full state
+            if device_name is not None and not since:
+                # One device's state is a lookup, not a scan of the whole fleet
+                version = self.rssi_server.version
+                record = self.rssi_server.registry.get(device_name)
+                changed, removed = ({device_name: record} if record else {}), ()
+            else:
+                version, changed, removed = self.rssi_server.get_devices_since(since)
+            initial = [f"retry: {RETRY_MS}\n\n".encode()]
+            for name, record in changed.items():
+                if device_name is None or name == device_name:
+                    initial.append(self.device_event(name, record, version))
+            for name in removed if since else ():
+                if device_name is None or name == device_name:
+                    initial.append(format_event("removed", {"device_name": name, "version": version}))
+            initial.append(f"id: {version}\n\n".encode())
+            subscriber.pending = b"".join(initial)  # Not subject to the queue bound
+            sock.setblocking(False)
+            if not subscriber.flush():
+                sock.close()
+                return True
+            self.subscribers.append(subscriber)
+            self.has_subscribers.set()
+        return True
+
+    def publish(self):
+        """Queue and send the changes since the last call; returns True if there were any"""
+        with self.lock:
+            version, changed, removed = self.rssi_server.get_devices_since(self.version)
+            self.version = version
+            if changed or removed:
+                formatted = {}  # Each device is formatted once, however many subscribers want it
+                marker = f"id: {version}\n\n".encode()
+                for subscriber in self.subscribers:
+                    wanted = subscriber.device_name
+                    if wanted is None:
+                        names, gone = changed, removed
+                    else:
+                        names = (wanted,) if wanted in changed else ()
+                        gone = (wanted,) if wanted in removed else ()
+                    for name in names:
+                        event = formatted.get(name)
+                        if event is None:
+                            event = formatted[name] = self.device_event(name, changed[name], version)
+                        subscriber.push(event)
+                    for name in gone:
+                        subscriber.push(format_event("removed", {"device_name": name, "version": version}))
+                    if names or gone:
+                        subscriber.push(marker)  # Last-Event-ID for reconnects
+            self._flush()
+            return bool(changed or removed)
+
+    def send_heartbeat(self):
+        """Write a comment to every subscriber so dead connections are noticed"""
+        with self.lock:
+            for subscriber in self.subscribers:
+                subscriber.push(b": keep-alive\n\n")
+            self._flush()
+
+    def _flush(self):
+        # Caller holds self.lock
+        alive = []
+        for subscriber in self.subscribers:
+            if subscriber.flush():
+                alive.append(subscriber)
+            else:
+                if subscriber.dropped:
+                    print(f"[DEBUG] Stream client dropped {subscriber.dropped} events while slow")
+                subscriber.sock.close()
+        self.subscribers = alive
+        if not alive:
+            self.has_subscribers.clear()
+
+    def run(self):
+        """Wait for registry changes and push them to subscribers, with heartbeats in between"""
+        next_heartbeat = time.monotonic() + self.heartbeat
+        while True:
+            self.has_subscribers.wait()
+            # Wake for new writes, and at least every second to retry slow sockets
+            self.rssi_server.wait_for_change(self.version, timeout=1.0)
+            try:
+                pushed = self.publish()
+                if time.monotonic() >= next_heartbeat:
+                    next_heartbeat = time.monotonic() + self.heartbeat
+                    self.send_heartbeat()
+            except Exception as e:
+                print(f"[ERROR] Stream push error: {e}")
+                pushed = False
+            if pushed:
+                time.sleep(self.min_interval)  # Let a burst of writes gather into one push
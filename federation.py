@@ -0,0 +1,239 @@
+"""Forwarding registry deltas from edge RSSIServers to an aggregator
+
+An edge runs a Forwarder, which follows its registry with changes_since
+and ships every batch of changes as one compressed frame over a
+federation session (see protocol.py). The aggregator feeds the bytes it
+reads to a DeltaReader and merges each delta with its FederationMerger:
+a device's reading is taken only if its last_seen is newer than the one
+held (last writer wins), so edges that hear the same device can report in
+any order. last_seen is the edge's clock, so the nodes' clocks should be
+kept in sync (NTP).
+"""
+import json
+import socket
+import struct
+import threading
+import time
+import zlib
+
+from background import BackgroundThread
+from protocol import FEDERATE_PREFIX, STREAM_IDLE_TIMEOUT
+
+HEADER = struct.Struct("!I")
+MAX_FRAME = 16 << 20  # Largest compressed frame accepted
+MAX_DELTA = 256 << 20  # Largest delta accepted once decompressed
+
+
+def federation_hello(node_id, password="login"):
+    """Build the line an edge sends to open a federation session"""
+    if "|" in node_id or "\n" in node_id:
+        raise ValueError(f"Invalid node id: {node_id!r}")
+    return FEDERATE_PREFIX + f"{password}|{node_id}\n".encode()
+
+
+def encode_delta(version, changed, removed):
+    """Frame (version, changed, removed) from changes_since; returns (frame, uncompressed size)"""
+    payload = json.dumps({
+        "version": version,
+        "devices": [[name, record.rssi, record.last_seen, record.ip] for name, record in changed.items()],
+        "removed": list(removed),
+    }, separators=(",", ":")).encode()
+    compressed = zlib.compress(payload, 1)
+    return HEADER.pack(len(compressed)) + compressed, len(payload)
+
+
+def decode_delta(data):
+    """Inverse of encode_delta, for the bytes after the length header"""
+    inflater = zlib.decompressobj()
+    payload = inflater.decompress(data, MAX_DELTA)
+    if inflater.unconsumed_tail:
+        raise ValueError("Federation delta too large")
+    return json.loads(payload)
+
+
+class DeltaReader:
+    """Aggregator side of a federation session, independent of the socket API in use
+
+    feed() takes raw bytes as they arrive, hands every complete delta to
+    apply(node_id, delta) and returns the acknowledgements to send back.
+    """
+
+    def __init__(self, apply):
+        self.apply = apply
+        self.node_id = None  # Set once the hello line has been read
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        if self.node_id is None:
+            end = self.buffer.find(b"\n")
+            if end < 0:
+                if len(self.buffer) > 1024:
+                    raise ValueError("Federation hello too long")
+                return b""
+            self.node_id = self._parse_hello(self.buffer[:end].decode())
+            del self.buffer[:end + 1]
+        replies = []
+        while len(self.buffer) >= HEADER.size:
+            (size,) = HEADER.unpack_from(self.buffer)
+            if size > MAX_FRAME:
+                raise ValueError("Federation frame too large")
+            if len(self.buffer) < HEADER.size + size:
+                break
+            delta = decode_delta(bytes(self.buffer[HEADER.size:HEADER.size + size]))
+            del self.buffer[:HEADER.size + size]
+            self.apply(self.node_id, delta)
+            replies.append(f"ACK|{delta['version']}\n".encode())
+        return b"".join(replies)
+
+    def _parse_hello(self, line):
+        parts = line.strip().split('|')
+        if len(parts) != 3 or parts[0] != "federate" or parts[1] != "login" or not parts[2]:
+            raise ValueError(f"Invalid federation hello: {line}")
+        return parts[2]
+
+
+class FederationMerger:
+    """Merges deltas from edge nodes into an aggregator's RSSIServer
+
+    Readings are applied with RSSIServer.merge_readings (last writer wins
+    on last_seen). A removal is only applied if the device's latest
+    reading came from the node removing it.
+    """
+
+    def __init__(self, rssi_server):
+        self.rssi_server = rssi_server
+        self.origins = {}  # {device_name: node_id of the reading held}
+        self.nodes = {}  # {node_id: last edge version applied}
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.applied = 0
+        self.stale = 0  # Readings older than the one already held
+        self.lag = 0.0  # Edge ingest to aggregator merge, newest reading of the last frame
+        self.max_lag = 0.0
+
+    def merge(self, node_id, delta):
+        server = self.rssi_server
+        devices = delta["devices"]
+        # An edge configured as a --sensor here has its readings tagged with its node id
+        sensor = node_id if node_id in server.positions.sensors else ""
+        applied = server.merge_readings(devices, sensor)
+        now = time.time()
+        with self.lock:
+            for device_name, _, _, _ in applied:
+                self.origins[device_name] = node_id
+            gone = [name for name in delta["removed"] if self.origins.get(name) == node_id]
+            for device_name in gone:
+                del self.origins[device_name]
+            self.nodes[node_id] = delta["version"]
+            self.frames += 1
+            self.applied += len(applied)
+            self.stale += len(devices) - len(applied)
+            if applied:
+                self.lag = now - max(last_seen for _, _, last_seen, _ in applied)
+                self.max_lag = max(self.max_lag, self.lag)
+        for device_name in gone:
+            server.registry.remove(device_name)
+            server.history.remove(device_name)
+            server.rollups.remove(device_name)
+            server.positions.remove(device_name)
+
+    def forget(self, device_names):
+        """Drop the origins of devices the aggregator has evicted"""
+        with self.lock:
+            for device_name in device_names:
+                self.origins.pop(device_name, None)
+
+    def metrics(self):
+        with self.lock:
+            return {"nodes": len(self.nodes), "devices": len(self.origins), "frames": self.frames,
+                    "applied": self.applied, "stale": self.stale, "lag": self.lag, "max_lag": self.max_lag}
+
+
+class Forwarder(BackgroundThread):
+    """Ships an edge RSSIServer's registry changes to an aggregator
+
+    Each frame carries everything that changed since the last acknowledged
+    one, and the next frame is only sent once the aggregator has
+    acknowledged the previous one, so batches grow by themselves when the
+    aggregator or the link is slow. A new connection starts with the full
+    registry. When there is nothing to send, an empty frame goes out every
+    keepalive seconds so the aggregator does not time the session out.
+    """
+
+    def __init__(self, rssi_server, host, port, node_id, min_interval=0.05, keepalive=15,
+                 max_backoff=30):
+        self.rssi_server = rssi_server
+        self.address = (host, port)
+        self.hello = federation_hello(node_id)
+        self.node_id = node_id
+        self.min_interval = min_interval  # Coalescing delay after each frame
+        self.keepalive = min(keepalive, STREAM_IDLE_TIMEOUT / 2)
+        self.max_backoff = max_backoff
+        self.sock = None
+        self.reader = None
+        self.version = 0  # Registry version the aggregator has acknowledged
+        self.frames = 0
+        self.readings = 0
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.reconnects = 0
+
+    def connect(self):
+        print(f"[INFO] Forwarding devices to aggregator {self.address[0]}:{self.address[1]} as '{self.node_id}'")
+        self.sock = socket.create_connection(self.address, timeout=10)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+        self.sock.sendall(self.hello)
+        self.version = 0  # The aggregator may have lost state, so resend everything
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.reader.close()
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.reader = None
+
+    def send_changes(self):
+        """Send one frame with every change since the last acknowledged one; returns its size in changes"""
+        since = self.version
+        if since < self.rssi_server.registry.tombstone_floor:
+            since = 0  # Removals since then are forgotten; resend everything instead
+        version, changed, removed = self.rssi_server.get_devices_since(since)
+        frame, raw_size = encode_delta(version, changed, removed)
+        self.sock.sendall(frame)
+        reply = self.reader.readline()
+        if not reply.startswith(b"ACK|"):
+            raise ConnectionError(f"Aggregator replied {reply!r}")
+        self.version = version
+        self.frames += 1
+        self.readings += len(changed)
+        self.raw_bytes += raw_size
+        self.wire_bytes += len(frame)
+        return len(changed) + len(removed)
+
+    def run(self):
+        """Send each batch of changes once the last is acknowledged, reconnecting with backoff"""
+        backoff = 1
+        while True:
+            try:
+                if self.sock is None:
+                    self.connect()
+                    backoff = 1
+                if self.rssi_server.version == self.version:
+                    self.rssi_server.wait_for_change(self.version, self.keepalive)
+                if self.send_changes() and self.min_interval:
+                    time.sleep(self.min_interval)
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Forwarding to aggregator failed ({e}), retrying in {backoff}s")
+                self.close()
+                self.reconnects += 1
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def metrics(self):
+        return {"frames": self.frames, "readings": self.readings, "raw_bytes": self.raw_bytes,
+                "wire_bytes": self.wire_bytes, "reconnects": self.reconnects}
@@ -0,0 +1,549 @@
+import gzip
+import json
+import math
+import queue
+import random
+import selectors
+import socket
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import calibration
+from event_stream import StreamHub
+from netinfo import get_local_ip
+
+rssi_server = None  # The RSSIServer whose devices are served, set by start_http_server
+stream_hub = None  # Pushes device updates to /stream clients (pooled mode only)
+
+INDEX_HTML = b"""
+            <html>
+            <head>
+                <title>Wi-Fi RSSI Reporter</title>
+                <style>
+                    body { font-family: Arial, sans-serif; padding: 20px; }
+                    .success { color: green; }
+                    .error { color: red; }
+                </style>
+            </head>
+            <body>
+                <h1>Wi-Fi RSSI Reporter</h1>
+                <div id="status"></div>
+                <form id="rssiForm" onsubmit="submitForm(event)">
+                    <label for="device_name">Device Name:</label>
+                    <input type="text" id="device_name" name="device_name" required><br><br>
+                    <label for="password">Password:</label>
+                    <input type="password" id="password" name="password" required><br><br>
+                    <input type="submit" value="Submit">
+                </form>
+
+                <script>
+                let source = null;
+                let pollTimer = null;
+                let staleTimer = null;
+
+                function submitForm(event) {
+                    event.preventDefault();
+                    const deviceName = document.getElementById('device_name').value;
+                    const password = document.getElementById('password').value;
+                    const status = document.getElementById('status');
+
+                    // Get client IP address from server
+                    fetch('/submit?' + new URLSearchParams({
+                        device_name: deviceName,
+                        password: password,
+                        client_ip: window.location.hostname
+                    }))
+                    .then(response => response.json())
+                    .then(data => {
+                        if (data.success) {
+                            status.innerHTML = `<p class="success">Successfully connected! RSSI: ${data.rssi} dBm (${data.quality})</p>`;
+                            // Keep updating status
+                            watchStatus(deviceName);
+                        } else {
+                            status.innerHTML = `<p class="error">Error: ${data.message}</p>`;
+                        }
+                    })
+                    .catch(error => {
+                        status.innerHTML = `<p class="error">Error: ${error}</p>`;
+                    });
+                }
+
+                function watchStatus(deviceName) {
+                    // Resubmitting the form replaces the previous watch instead of adding one
+                    stopWatching();
+                    if (!window.EventSource) {
+                        startPolling(deviceName);
+                        return;
+                    }
+                    source = new EventSource('/stream?' + new URLSearchParams({device_name: deviceName}));
+                    source.addEventListener('device', event => showStatus(JSON.parse(event.data)));
+                    source.addEventListener('removed', () => showStatus({connected: false}));
+                    source.onerror = () => {
+                        // A closed source will not reconnect (the server cannot stream): poll instead
+                        if (source && source.readyState === EventSource.CLOSED) {
+                            source = null;
+                            startPolling(deviceName);
+                        }
+                    };
+                }
+
+                function stopWatching() {
+                    if (source) {
+                        source.close();
+                        source = null;
+                    }
+                    clearInterval(pollTimer);
+                    clearTimeout(staleTimer);
+                }
+
+                function startPolling(deviceName) {
+                    pollTimer = setInterval(() => updateStatus(deviceName), 5000);
+                }
+
+                function showStatus(data) {
+                    const status = document.getElementById('status');
+                    clearTimeout(staleTimer);
+                    if (data.connected) {
+                        const weak = data.presence === 'offline' ? ', too weak to count as present' : '';
+                        status.innerHTML = `<p class="success">Connected! RSSI: ${data.rssi} dBm, smoothed ${data.smoothed} dBm (${data.quality}${weak})</p>`;
+                        // The server pushes going offline too; this covers losing the server itself
+                        staleTimer = setTimeout(() => showStatus({connected: false}), 30000);
+                    } else {
+                        status.innerHTML = `<p class="error">Device disconnected</p>`;
+                    }
+                }
+
+                function updateStatus(deviceName) {
+                    fetch('/status?' + new URLSearchParams({device_name: deviceName}))
+                    .then(response => response.json())
+                    .then(showStatus);
+                }
+                </script>
+            </body>
+            </html>
+            """
+
+DISCONNECTED_JSON = json.dumps({"connected": False}).encode()
+
+class ResponseCache:
+    """Serialized response bodies keyed by whatever versions they were built from
+
+    Keys include the registry version of the data, so entries never go
+    stale; the cache is simply emptied when it grows past max_entries.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = {}
+
+    def get(self, key, build):
+        body = self.entries.get(key)
+        if body is None:
+            if len(self.entries) >= self.max_entries:
+                self.entries = {}
+            body = self.entries[key] = build()
+        return body
+
+response_cache = ResponseCache()
+
+GZIP_MIN_SIZE = 1024  # Smaller bodies are sent as-is; gzip would barely shrink them
+
+class _Listing:
+    """One serialized /devices body and its gzipped form (made on first request)"""
+    __slots__ = ("version", "etag", "body", "gzipped")
+
+    def __init__(self, version, etag, body):
+        self.version = version
+        self.etag = etag
+        self.body = body
+        self.gzipped = None
+
+    def gzip_body(self):
+        if self.gzipped is None:
+            self.gzipped = gzip.compress(self.body, compresslevel=5)
+        return self.gzipped
+
+def listing_etag(since, version):
+    """ETag of the /devices body for changes after since, as of version"""
+    return f'"{version}"' if since == 0 else f'"{since}-{version}"'
+
+class DeviceListing:
+    """/devices bodies, serialized at most once per registry version
+
+    The full listing is kept for the latest version only. Deltas go in a
+    ResponseCache keyed by (since, version): dashboards that keep up all
+    ask for the same delta, so it is built once for all of them. Building
+    happens under a lock, so a burst of requests after a write costs one
+    json.dumps rather than one per request.
+    """
+
+    def __init__(self, max_deltas=256):
+        self.lock = threading.Lock()
+        self.latest = None
+        self.deltas = ResponseCache(max_entries=max_deltas)
+
+    def get(self, server, since):
+        """Return the _Listing of devices changed after since (0 for all of them)"""
+        with self.lock:
+            if since < server.registry.tombstone_floor:
+                since = 0  # Removals since then are forgotten; the client gets a full listing
+            if since == 0:
+                latest = self.latest
+                if latest is None or latest.version != server.version:
+                    latest = self.latest = self._build(server, 0)
+                return latest
+            return self.deltas.get((since, server.version), lambda: self._build(server, since))
+
+    def _build(self, server, since):
+        version, changed, removed = server.get_devices_since(since)
+        records = list(changed.values())
+        qualities = calibration.default.qualities([record.rssi for record in records])
+        positions = server.positions.locate(changed)
+        devices = {}
+        for device_name, record, quality, position in zip(changed, records, qualities, positions):
+            data = record.as_dict()
+            data["quality"] = quality
+            if position is not None:
+                data["x"], data["y"] = round(position[0], 2), round(position[1], 2)
+            devices[device_name] = data
+        body = json.dumps({
+            "version": version,
+            "full": since == 0,
+            "devices": devices,
+            "removed": [] if since == 0 else sorted(removed)
+        }, separators=(",", ":")).encode()
+        return _Listing(version, listing_etag(since, version), body)
+
+device_listing = DeviceListing()
+
+class SimpleHTTPRequestHandler(BaseHTTPRequestHandler):
+    detached = False  # Set once another component owns the connection (see send_stream)
+
+    def do_GET(self):
+        """Serve a simple HTML page with a form"""
+        if self.path == '/':
+            self.send_body(200, 'text/html', INDEX_HTML)
+        elif self.path.startswith('/submit'):
+            query = urllib.parse.urlparse(self.path).query
+            params = dict(urllib.parse.parse_qsl(query))
+            device_name = params.get('device_name', '')
+            password = params.get('password', '')
+            client_ip = self.client_address[0]  # Get actual client IP
+            rssi = random.randint(-90, -30)  # Simulate RSSI value
+
+            if password == "login":
+                rssi_server.update_device(device_name, rssi, client_ip)  # Store client IP
+                quality = self.rssi_to_quality(rssi)
+                print(f"[INFO] New device connected - Name: {device_name}, IP: {client_ip}, RSSI: {rssi}")
+                self.send_json(200, {
+                    "success": True,
+                    "rssi": rssi,
+                    "quality": quality
+                })
+            else:
+                self.send_json(403, {
+                    "success": False,
+                    "message": "Invalid password"
+                })
+        elif self.path.startswith('/status'):
+            query = urllib.parse.urlparse(self.path).query
+            params = dict(urllib.parse.parse_qsl(query))
+            device_name = params.get('device_name', '')
+            
+            device = rssi_server.registry.get(device_name)
+            if device and rssi_server.connected(device):
+                # Same record version means same body, so serialize once per write
+                body = response_cache.get(
+                    ("status", device_name, device.version),
+                    lambda: json.dumps({
+                        "connected": True,
+                        "presence": device.presence,
+                        "rssi": device.rssi,
+                        "smoothed": round(device.smoothed, 1),
+                        "quality": self.rssi_to_quality(device.rssi)
+                    }).encode()
+                )
+            else:
+                body = DISCONNECTED_JSON
+            self.send_body(200, 'application/json', body)
+        elif self.path.startswith('/devices'):
+            self.send_devices()
+        elif self.path.startswith('/stream'):
+            self.send_stream()
+        elif self.path.startswith('/history'):
+            self.send_history()
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def send_devices(self):
+        """Every device in one response, or with ?since=<version> only what changed after it
+
+        The body carries the version to pass as since next time. Clients
+        that send back the ETag in If-None-Match get a 304 while nothing
+        has changed.
+        """
+        query = urllib.parse.urlparse(self.path).query
+        params = dict(urllib.parse.parse_qsl(query))
+        try:
+            since = max(0, int(params.get('since', 0)))
+        except ValueError:
+            self.send_json(400, {"error": "since must be an integer version"})
+            return
+        if since > rssi_server.version:
+            since = 0  # A version from before a server restart; start the client over
+
+        # Checked before building anything, so an unchanged fleet costs no serialization
+        etag = listing_etag(since, rssi_server.version)
+        if_none_match = self.headers.get('If-None-Match', '')
+        if etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        listing = device_listing.get(rssi_server, since)
+        headers = [('ETag', listing.etag), ('Cache-Control', 'no-cache'), ('Vary', 'Accept-Encoding')]
+        body = listing.body
+        if len(body) >= GZIP_MIN_SIZE and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = listing.gzip_body()
+            headers.append(('Content-Encoding', 'gzip'))
+        self.send_body(200, 'application/json', body, headers)
+
+    def send_history(self):
+        """Signal history of ?device_name=<name> over the last ?seconds= (default 1 h)
+
+        Served from the rollup tier that best fits seconds / ?points=
+        (default 300). Each row is [time, min, max, mean, count, last] and
+        covers "resolution" seconds.
+        """
+        query = urllib.parse.urlparse(self.path).query
+        params = dict(urllib.parse.parse_qsl(query))
+        try:
+            seconds = float(params.get('seconds', 3600))
+            points = int(params.get('points', 300))
+        except ValueError:
+            self.send_json(400, {"error": "seconds and points must be numbers"})
+            return
+        if not math.isfinite(seconds) or seconds <= 0 or points <= 0:
+            self.send_json(400, {"error": "seconds and points must be finite and positive"})
+            return
+        device_name = params.get('device_name', '')
+        end = time.time()
+        resolution, rows = rssi_server.rollups.query(device_name, end - seconds, end, points)
+        self.send_json(200, {"device_name": device_name, "resolution": resolution, "rows": rows})
+
+    def send_stream(self):
+        """Push updates for ?device_name=<name> (or every device) as Server-Sent Events
+
+        After the headers the socket belongs to the stream hub and this
+        handler lets go of it without closing it.
+        """
+        if stream_hub is None or not isinstance(self.server, PooledHTTPServer):
+            self.send_json(503, {"error": "Streaming needs the pooled HTTP server"})
+            return
+        query = urllib.parse.urlparse(self.path).query
+        params = dict(urllib.parse.parse_qsl(query))
+        try:
+            last_event_id = int(self.headers.get('Last-Event-ID', 0))
+        except ValueError:
+            last_event_id = 0
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+        if stream_hub.subscribe(self.connection, params.get('device_name') or None, last_event_id):
+            self.detached = True
+
+    def send_body(self, status, content_type, body, headers=()):
+        """Send a complete response; Content-Length lets HTTP/1.1 clients keep the connection"""
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data):
+        self.send_body(status, 'application/json', json.dumps(data).encode())
+
+    @staticmethod
+    def rssi_to_quality(rssi):
+        """Convert RSSI value to a human-readable quality description"""
+        return calibration.rssi_to_quality(rssi)
+
+    def log_message(self, format, *args):
+        """Override to prevent printing to stderr"""
+        return
+
+class KeepAliveHTTPRequestHandler(SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler speaking HTTP/1.1, so connections stay open between polls"""
+    protocol_version = "HTTP/1.1"
+    timeout = 10  # Seconds to wait for the rest of a request once it has started
+    # Headers and body are separate writes; with Nagle on, the body waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+class _Connection:
+    """A keep-alive client connection and the handler that parses its requests"""
+    __slots__ = ("sock", "handler", "last_active")
+
+    def __init__(self, sock, handler):
+        self.sock = sock
+        self.handler = handler
+        self.last_active = time.monotonic()
+
+class PooledHTTPServer(HTTPServer):
+    """HTTP/1.1 server with a bounded worker pool
+
+    The serving thread only multiplexes sockets. When a connection has a
+    request waiting it is handed to one of workers threads; once answered,
+    the connection goes back to the selector instead of holding the worker
+    while the client is idle between polls. Idle connections are closed
+    after idle_timeout seconds, and new ones are refused beyond
+    max_connections.
+    """
+
+    def __init__(self, server_address, RequestHandlerClass, workers=32,
+                 max_connections=4096, idle_timeout=30):
+        self.request_queue_size = 1024
+        super().__init__(server_address, RequestHandlerClass)
+        self.workers = workers
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+        self.selector = selectors.DefaultSelector()
+        self.connections = set()
+        self.returned = queue.SimpleQueue()  # Connections workers have finished with
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+
+    def serve_forever(self, poll_interval=0.5):
+        self.socket.setblocking(False)
+        self.selector.register(self.socket, selectors.EVENT_READ)
+        self.selector.register(self._wakeup_recv, selectors.EVENT_READ)
+        next_sweep = time.monotonic() + 1
+        while True:
+            for key, _ in self.selector.select(poll_interval):
+                if key.fileobj is self.socket:
+                    self._accept()
+                elif key.fileobj is self._wakeup_recv:
+                    self._take_back()
+                else:
+                    # A request is arriving; a worker owns the socket until it is answered
+                    self.selector.unregister(key.fileobj)
+                    try:
+                        self.pool.submit(self._serve, key.data)
+                    except RuntimeError:
+                        return  # The pool is shut down: the interpreter is exiting
+            if time.monotonic() >= next_sweep:
+                self._close_idle()
+                next_sweep = time.monotonic() + 1
+
+    def _accept(self):
+        while True:
+            try:
+                sock, addr = self.socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            if len(self.connections) >= self.max_connections:
+                sock.close()
+                continue
+            # Build the handler without running it; _serve drives it one request at a time
+            handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+            handler.request = sock
+            handler.client_address = addr
+            handler.server = self
+            handler.setup()
+            connection = _Connection(sock, handler)
+            self.connections.add(connection)
+            self.selector.register(sock, selectors.EVENT_READ, connection)
+
+    def _serve(self, connection):
+        handler = connection.handler
+        try:
+            while True:
+                handler.handle_one_request()
+                if handler.detached:
+                    # Release the handler's buffers; the socket itself stays open
+                    self.connections.discard(connection)
+                    handler.finish()
+                    return
+                if handler.close_connection:
+                    self._close(connection)
+                    return
+                handler.wfile.flush()
+                # Pipelined requests may already sit in the read buffer
+                connection.sock.setblocking(False)
+                pending = handler.rfile.peek(1)
+                connection.sock.settimeout(handler.timeout)
+                if not pending:
+                    break
+        except Exception:
+            self._close(connection)
+            return
+        connection.last_active = time.monotonic()
+        self.returned.put(connection)
+        self._wakeup_send.send(b"x")
+
+    def _take_back(self):
+        try:
+            while self._wakeup_recv.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            try:
+                connection = self.returned.get_nowait()
+            except queue.Empty:
+                return
+            self.selector.register(connection.sock, selectors.EVENT_READ, connection)
+
+    def _close_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        for key in list(self.selector.get_map().values()):
+            connection = key.data
+            if connection is not None and connection.last_active < cutoff:
+                self.selector.unregister(connection.sock)
+                self._close(connection)
+
+    def _close(self, connection):
+        self.connections.discard(connection)
+        try:
+            connection.handler.finish()
+        except Exception:
+            pass
+        self.shutdown_request(connection.sock)
+
+def start_http_server(host='0.0.0.0', port=5000, server=None, mode="pooled", workers=32):
+    """Start the HTTP server
+
+    mode "pooled" serves many keep-alive clients concurrently from a bounded
+    worker pool; "simple" is the original one-request-at-a-time HTTPServer.
+    """
+    global rssi_server, stream_hub
+    rssi_server = server
+    if mode == "pooled":
+        stream_hub = StreamHub(server, calibration.rssi_to_quality)
+        stream_hub.start()
+    
+    # Print the actual addresses the server will be available on
+    local_ip = get_local_ip()
+    print(f"[INFO] Server will be available at:")
+    print(f"[INFO] Local machine: http://localhost:{port}")
+    print(f"[INFO] Network devices: http://{local_ip}:{port}")
+    
+    try:
+        if mode == "pooled":
+            httpd = PooledHTTPServer((host, port), KeepAliveHTTPRequestHandler, workers=workers)
+        else:
+            httpd = HTTPServer((host, port), SimpleHTTPRequestHandler)
+        print(f"[INFO] HTTP server is ready to accept connections ({mode} mode)")
+        httpd.serve_forever()
+    except Exception as e:
+        print(f"[ERROR] Failed to start HTTP server: {e}")
+        raise
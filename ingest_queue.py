@@ -0,0 +1,163 @@
+import random
+import threading
+import time
+from collections import deque
+
+from background import BackgroundThread
+
+OVERFLOW_POLICIES = ("block", "drop", "sample")
+
+
+class IngestQueue(BackgroundThread):
+    """Bounded write-behind queue between socket handling and whatever stores readings
+
+    Producers put (readings, ip, timestamp) groups, readings being a list of
+    (device_name, rssi), and return at once. A drain thread takes up to
+    batch_size readings at a time, every flush_interval seconds or sooner
+    once a batch is waiting, and calls every consumer with the batch (a
+    list of groups). A slow consumer delays the others but never the
+    producers.
+
+    The queue holds at most max_readings readings. When it is full the
+    overflow policy decides: "block" waits for room (backpressure all the
+    way to the client), "drop" discards the new group, and "sample" keeps
+    one in sample_every overflowing groups by evicting the oldest queued
+    group, so a flood leaves a thinned-out but current picture. A producer
+    on an event loop must not wait in put(): it passes wait=False and
+    awaits room() before reading more from its client instead.
+
+    Producers only hold a lock long enough to append and count, and the
+    drain thread only to pop a batch; all consumer work happens outside it.
+    """
+
+    def __init__(self, max_readings=100000, batch_size=1000, flush_interval=0.05,
+                 overflow="block", sample_every=10):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {', '.join(OVERFLOW_POLICIES)}")
+        self.max_readings = max_readings
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.sample_every = sample_every
+        self.consumers = []
+        self.groups = deque()
+        self.depth = 0  # Readings queued
+        self.lock = threading.Lock()  # Guards groups, depth and the producer counters
+        self.ready = threading.Event()  # Set when a full batch is waiting
+        self.space = threading.Event()  # Set while there is room; "block" waits on it
+        self.space.set()
+        self.stats = {
+            "enqueued": 0, "drained": 0, "dropped": 0, "evicted": 0, "batches": 0,
+            "max_depth": 0, "lag": 0.0, "max_lag": 0.0
+        }
+        self._stop = threading.Event()
+
+    def add_consumer(self, callback):
+        """Register callback(batch), called from the drain thread for every batch"""
+        self.consumers.append(callback)
+
+    def put(self, readings, ip, timestamp, wait=True):
+        """Queue readings; returns False if the overflow policy discarded them
+
+        With wait=False, "block" takes the group even when the queue is full,
+        leaving the waiting to room().
+        """
+        count = len(readings)
+        if not count:
+            return True
+        while True:
+            with self.lock:
+                # An empty queue takes any group, however large
+                full = self.depth and self.depth + count > self.max_readings
+                if full and not wait and self.overflow == "block":
+                    full = False
+                if full and self.overflow == "block":
+                    self.space.clear()
+                elif full and (self.overflow == "drop" or random.randrange(self.sample_every)):
+                    self.stats["dropped"] += count
+                    return False
+                elif full:
+                    self._evict(count)  # The sampled one in sample_every
+                    full = False
+                if not full:
+                    self.groups.append((readings, ip, timestamp))
+                    self.depth += count
+                    self.stats["enqueued"] += count
+                    if self.depth > self.stats["max_depth"]:
+                        self.stats["max_depth"] = self.depth
+                    batch_waiting = self.depth >= self.batch_size
+                    break
+            # "block": make sure the drain thread is awake, then wait for it to make room
+            self.ready.set()
+            self.space.wait(self.flush_interval)
+        if batch_waiting:
+            self.ready.set()
+        return True
+
+    async def room(self):
+        """For "block" producers on an event loop: return once the queue is below max_readings"""
+        if self.overflow != "block" or self.depth < self.max_readings:
+            return
+        import asyncio
+        while self.depth >= self.max_readings and not self._stop.is_set():
+            self.ready.set()  # Make sure the drain thread is awake
+            await asyncio.sleep(self.flush_interval)
+
+    def _evict(self, count):
+        # Caller holds self.lock; drop the oldest groups to make room for count readings
+        while self.groups and self.depth + count > self.max_readings:
+            readings = self.groups.popleft()[0]
+            self.depth -= len(readings)
+            self.stats["evicted"] += len(readings)
+
+    def take_batch(self):
+        """Pop up to batch_size readings' worth of groups (at least one group if any)"""
+        batch = []
+        taken = 0
+        with self.lock:
+            while taken < self.batch_size and self.groups:
+                group = self.groups.popleft()
+                batch.append(group)
+                taken += len(group[0])
+            self.depth -= taken
+        return batch
+
+    def drain(self):
+        """Hand everything queued so far to the consumers, one batch at a time"""
+        while True:
+            batch = self.take_batch()
+            if not batch:
+                return
+            self.space.set()
+            lag = time.time() - batch[0][2]  # Age of the oldest reading in the batch
+            self.stats["lag"] = lag
+            if lag > self.stats["max_lag"]:
+                self.stats["max_lag"] = lag
+            for callback in self.consumers:
+                try:
+                    callback(batch)
+                except Exception as e:
+                    print(f"[ERROR] Ingest consumer {callback} failed: {e}")
+            self.stats["batches"] += 1
+            self.stats["drained"] += sum(len(group[0]) for group in batch)
+
+    def run(self):
+        """Hand batches to the consumers when one is ready or flush_interval passes, until stopped"""
+        while not self._stop.is_set():
+            self.ready.wait(self.flush_interval)
+            self.ready.clear()
+            self.drain()
+
+    def stop(self):
+        """Stop the drain thread after passing on what is still queued"""
+        self._stop.set()
+        self.ready.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.drain()
+
+    def metrics(self):
+        """Queue depth, drain lag (seconds) and counters, for logging"""
+        metrics = dict(self.stats)
+        metrics["depth"] = self.depth
+        return metrics
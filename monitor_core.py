@@ -0,0 +1,146 @@
+import threading
+import time
+
+import calibration
+from background import BackgroundThread
+
+
+class ChangeFeed(BackgroundThread):
+    """Publishes device changes from an RSSIServer to any number of subscribers
+
+    A background thread polls the registry's change log every interval
+    seconds and calls each subscriber with (version, changed, removed). It
+    also keeps fleet aggregates up to date from those changes alone, so they
+    cost O(changes) per tick. Nothing here depends on a UI; the Tk monitor
+    is just one subscriber.
+    """
+
+    def __init__(self, rssi_server, interval=1.0, log_interval=None):
+        self.rssi_server = rssi_server
+        self.interval = interval
+        self.log_interval = log_interval  # Print the summary this often (headless mode)
+        self.subscribers = []
+        self.version = 0
+        self._lock = threading.Lock()  # Held while publishing and while subscribing
+        self._rssi = {}  # {device_name: rssi} behind the running sum
+        self._rssi_sum = 0
+        self._quality = {}  # {device_name: quality label} behind the quality counts
+        self._rate_mark = (time.time(), 0)
+        self.summary = {"devices": 0, "mean_rssi": None, "reports_per_sec": 0.0, "version": 0, "quality": {},
+                        "evicted": 0}
+
+    def subscribe(self, callback):
+        """Register callback(version, changed, removed)
+
+        The callback is first called right away with every known device,
+        then from the feed thread with changes only. Callbacks must be quick
+        and thread-safe; UIs should hand the data to their own event loop.
+        """
+        with self._lock:
+            version, changed, removed = self.rssi_server.get_devices_since(0)
+            callback(version, changed, removed)
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self.subscribers.remove(callback)
+
+    def publish(self):
+        """Deliver changes since the last call; returns True if there were any"""
+        with self._lock:
+            # Devices that went silent become changes like any report, evicted ones removals
+            _, _, evicted = self.rssi_server.expire()
+            self.summary["evicted"] += len(evicted)
+            if self.version < self.rssi_server.registry.tombstone_floor:
+                # Some removals since the last tick are forgotten: diff a full listing instead
+                version, changed, _ = self.rssi_server.get_devices_since(0)
+                removed = self._rssi.keys() - changed.keys()
+            else:
+                version, changed, removed = self.rssi_server.get_devices_since(self.version)
+            self.version = version
+            if not changed and not removed:
+                self._update_rate(version)
+                return False
+            self._aggregate(changed, removed)
+            self._update_rate(version)
+            for callback in list(self.subscribers):
+                try:
+                    callback(version, changed, removed)
+                except Exception as e:
+                    print(f"[ERROR] Subscriber {callback} failed: {e}")
+            return True
+
+    def _aggregate(self, changed, removed):
+        counts = self.summary["quality"]
+        for device_name in removed:
+            self._rssi_sum -= self._rssi.pop(device_name, 0)
+            label = self._quality.pop(device_name, None)
+            if label is not None:
+                counts[label] -= 1
+        # One vectorized classification for the whole batch of changes
+        labels = calibration.default.qualities([data.rssi for data in changed.values()])
+        for (device_name, data), label in zip(changed.items(), labels):
+            self._rssi_sum += data.rssi - self._rssi.get(device_name, 0)
+            self._rssi[device_name] = data.rssi
+            previous = self._quality.get(device_name)
+            if previous != label:
+                if previous is not None:
+                    counts[previous] -= 1
+                counts[label] = counts.get(label, 0) + 1
+                self._quality[device_name] = label
+        count = len(self._rssi)
+        self.summary["devices"] = count
+        self.summary["mean_rssi"] = self._rssi_sum / count if count else None
+
+    def _update_rate(self, version):
+        # Every write bumps the registry version, so its slope is the report rate
+        now = time.time()
+        mark_time, mark_version = self._rate_mark
+        if now - mark_time >= 5:
+            self.summary["reports_per_sec"] = (version - mark_version) / (now - mark_time)
+            self._rate_mark = (now, version)
+        self.summary["version"] = version
+
+    def run(self):
+        """Publish the registry's changes every interval seconds, logging the summary if asked"""
+        next_log = time.time() + (self.log_interval or 0)
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.publish()
+            except Exception as e:
+                print(f"[ERROR] Change feed error: {e}")
+            if self.log_interval and time.time() >= next_log:
+                next_log = time.time() + self.log_interval
+                self.log_summary()
+
+    def log_summary(self):
+        summary = self.summary
+        mean = "n/a" if summary["mean_rssi"] is None else f"{summary['mean_rssi']:.1f} dBm"
+        print(
+            f"[INFO] Devices: {summary['devices']} | Mean RSSI: {mean} | "
+            f"Reports/sec: {summary['reports_per_sec']:.1f}"
+        )
+        if summary["evicted"]:
+            print(f"[INFO] Evicted devices: {summary['evicted']}")
+        counts = summary["quality"]
+        quality = ", ".join(f"{label}: {counts[label]}" for label in reversed(calibration.default.quality_labels)
+                            if counts.get(label))
+        if quality:
+            print(f"[INFO] Signal quality: {quality}")
+        ingest = getattr(self.rssi_server, "ingest", None)
+        if ingest is not None:
+            metrics = ingest.metrics()
+            print(
+                f"[INFO] Ingest queue: depth {metrics['depth']} (max {metrics['max_depth']}) | "
+                f"Drain lag: {metrics['lag'] * 1000:.0f} ms (max {metrics['max_lag'] * 1000:.0f} ms) | "
+                f"Dropped: {metrics['dropped'] + metrics['evicted']}"
+            )
+        federation = getattr(self.rssi_server, "federation", None)
+        if federation is not None:
+            metrics = federation.metrics()
+            print(
+                f"[INFO] Federation: {metrics['nodes']} nodes, {metrics['devices']} devices | "
+                f"Merged: {metrics['applied']} (stale {metrics['stale']}) | "
+                f"Lag: {metrics['lag'] * 1000:.0f} ms (max {metrics['max_lag'] * 1000:.0f} ms)"
+            )
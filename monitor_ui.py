@@ -0,0 +1,549 @@
+import math
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk
+
+import calibration
+
+FRAME_BUDGET = 0.050  # Seconds each canvas may spend drawing per UI tick
+
+class FrameThrottle:
+    """Skips redraws of a view whose last draw went over its time budget
+
+    Use as a context manager around the draw. If a draw took three budgets,
+    the next two ticks are skipped, so drawing never takes more than about
+    one budget per tick on average.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.skip = 0
+        self.started = 0.0
+        self.last_cost = 0.0
+
+    def ready(self):
+        if self.skip > 0:
+            self.skip -= 1
+            return False
+        return True
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.last_cost = time.perf_counter() - self.started
+        # Ticks after this one that together with it bring the cost to one budget each
+        self.skip = max(0, math.ceil(self.last_cost / self.budget) - 1)
+
+class RSSIMonitorUI:
+    def __init__(self, root, rssi_server, feed):
+        self.root = root
+        self.rssi_server = rssi_server  # Read for signal history
+        # Device changes arrive from the feed thread and wait here for the Tk loop
+        self.inbox_lock = threading.Lock()
+        self.inbox_changed = {}
+        self.inbox_removed = set()
+        self.tree_rows = {}  # {device_name: (item_id, values)} for incremental list updates
+        # Retained canvas items, created once and then moved
+        self.radar_items = {}  # {device_name: ([3 blip ovals, label], x, y, label_text)}
+        self.radar_pending = {}  # Changes not yet drawn on the radar
+        self.radar_removed = set()
+        self.chart_lines = {}  # {device_name: [3 glow lines, legend text, legend y]}
+        self.chart_dirty = set()  # Devices reported since their line was last drawn
+        self.chart_removed = set()  # Removed devices whose lines are still on the chart
+        self.chart_size = None  # (width, height) the chart background was drawn for
+        self.chart_drawn = None  # Axis end time the lines were last all drawn for
+        self.chart_time_labels = ()
+        self.radar_throttle = FrameThrottle(FRAME_BUDGET)
+        self.chart_throttle = FrameThrottle(FRAME_BUDGET)
+        self.setup_ui()
+        feed.subscribe(self.on_devices_changed)
+        
+        # Start the update loop
+        self.update_ui()
+    
+    def on_devices_changed(self, version, changed, removed):
+        """ChangeFeed callback; runs on the feed thread, so only queue the changes"""
+        with self.inbox_lock:
+            for device_name in removed:
+                self.inbox_changed.pop(device_name, None)
+            self.inbox_removed.difference_update(changed)
+            self.inbox_removed.update(removed)
+            self.inbox_changed.update(changed)
+    
+    def setup_ui(self):
+        """Set up the UI components"""
+        self.root.title("Wi-Fi RSSI Monitor")
+        self.root.geometry("1000x600")  # Made wider for the chart
+        self.root.configure(bg='#1a1a1a')
+        
+        # Configure styles
+        style = ttk.Style()
+        style.configure(".", background='#1a1a1a', foreground='#00ff00')
+        style.configure("TNotebook", background='#1a1a1a')
+        style.configure("TNotebook.Tab", background='white', foreground='black')
+        style.configure("DeviceList.Treeview", 
+            background='white', 
+            foreground='black',
+            fieldbackground='white'
+        )
+        style.configure("DeviceList.Treeview.Heading", 
+            background='#f0f0f0',
+            foreground='black'
+        )
+        
+        # Create main container
+        main_frame = ttk.Frame(self.root)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        # Create left frame for tabs
+        left_frame = ttk.Frame(main_frame)
+        left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        # Create notebook (tabbed interface)
+        self.notebook = ttk.Notebook(left_frame)
+        self.notebook.pack(fill=tk.BOTH, expand=True)
+        
+        # Tab 1: Device List
+        devices_tab = ttk.Frame(self.notebook)
+        self.notebook.add(devices_tab, text='Connected Devices')
+        
+        # Setup device list
+        columns = ("device", "ip", "rssi", "distance")
+        self.tree = ttk.Treeview(devices_tab, columns=columns, show="headings", style="DeviceList.Treeview")
+        
+        self.tree.heading("device", text="Device Name")
+        self.tree.heading("ip", text="IP Address")
+        self.tree.heading("rssi", text="RSSI (dBm)")
+        self.tree.heading("distance", text="Est. Distance (m)")
+        
+        self.tree.column("device", width=100)
+        self.tree.column("ip", width=120)
+        self.tree.column("rssi", width=80)
+        self.tree.column("distance", width=100)
+        
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        
+        # Tab 2: History Chart
+        history_tab = ttk.Frame(self.notebook)
+        self.notebook.add(history_tab, text='Signal History')
+        
+        # Setup history chart with dark theme
+        self.history_canvas = tk.Canvas(
+            history_tab,
+            background='black',
+            width=400,
+            height=300
+        )
+        self.history_canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        # Samples are recorded by the server as reports arrive (RSSIServer.chart_points)
+        self.history_window = self.rssi_server.history_window  # --history-window, 5 minutes by default
+        
+        # Create right frame for radar
+        map_frame = ttk.Frame(main_frame)
+        map_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+        
+        # Setup radar map (right side)
+        self.canvas = tk.Canvas(
+            map_frame, 
+            width=400, 
+            height=400, 
+            bg='#1a1a1a',
+            highlightbackground='#00ff00',
+            highlightthickness=1
+        )
+        self.canvas.pack(padx=10, pady=10)
+        
+        # Draw radar circles
+        center_x, center_y = 200, 200
+        for radius in [45, 90, 135, 180]:  # Represents 1m, 2m, 3m, 4m
+            self.canvas.create_oval(
+                center_x - radius, 
+                center_y - radius,
+                center_x + radius, 
+                center_y + radius,
+                outline='#00ff00',
+                dash=(2, 4)
+            )
+            # Add distance label
+            self.canvas.create_text(
+                center_x, 
+                center_y - radius,
+                text=f"{radius/45}m",
+                fill='#00ff00',
+                font=('Courier', 8)
+            )
+        
+        # Draw crosshairs
+        self.canvas.create_line(200, 0, 200, 400, fill='#00ff00', dash=(2, 4))
+        self.canvas.create_line(0, 200, 400, 200, fill='#00ff00', dash=(2, 4))
+        
+        # Draw router at center with glow effect
+        self.canvas.create_oval(190, 190, 210, 210, fill='#00ff00', outline='#00ff00')
+        self.canvas.create_text(200, 170, text="Router", fill='#00ff00', font=('Courier', 10))
+        
+        # Other monitor nodes at their configured positions (45 pixels = 1 meter)
+        for sensor_id, (sensor_x, sensor_y) in self.rssi_server.positions.sensors.items():
+            if sensor_id:
+                x, y = center_x + sensor_x * 45, center_y + sensor_y * 45
+                self.canvas.create_rectangle(x-6, y-6, x+6, y+6, outline='#00ffff')
+                self.canvas.create_text(x, y+14, text=sensor_id, fill='#00ffff', font=('Courier', 8))
+        
+        # Status bar
+        self.status_var = tk.StringVar(value="Radar Active")
+        self.status_label = ttk.Label(
+            self.root,
+            textvariable=self.status_var,
+            font=("Courier", 10)
+        )
+        self.status_label.pack(side=tk.BOTTOM, fill=tk.X, padx=10)
+
+    def rssi_to_distance(self, rssi):
+        """Convert RSSI to approximate distance in meters"""
+        return calibration.rssi_to_distance(rssi)
+
+    def update_device_list(self, changed, removed):
+        """Apply registry changes to the device list, touching only affected rows"""
+        for device_name in removed:
+            row = self.tree_rows.pop(device_name, None)
+            if row is not None:
+                self.tree.delete(row[0])
+        
+        records = list(changed.values())
+        # Distances come from the smoothed signal, so they do not jump on every sample
+        distances = calibration.default.distances([data.smoothed for data in records])
+        for device_name, data, distance in zip(changed, records, distances):
+            rssi = data.rssi
+            ip = data.ip or "Unknown"
+            values = (device_name, ip, f"{rssi} dBm", f"{distance:.1f}m")
+            
+            row = self.tree_rows.get(device_name)
+            if row is None:
+                item = self.tree.insert("", "end", values=values)
+                self.tree_rows[device_name] = (item, values)
+            elif row[1] != values:
+                # Reports that only refresh last_seen leave the row alone
+                self.tree.item(row[0], values=values)
+                self.tree_rows[device_name] = (row[0], values)
+
+    def update_device_positions(self, changed, removed):
+        """Move, add or remove radar blips for the devices that changed"""
+        center_x, center_y = 200, 200
+        moved = 0
+        
+        for device_name in removed:
+            blip = self.radar_items.pop(device_name, None)
+            if blip is not None:
+                for item in blip[0]:
+                    self.canvas.delete(item)
+        
+        # Positions of all changed devices, solved in one batch by the server
+        positions = self.rssi_server.positions.locate(changed)
+        for (device_name, data), position in zip(changed.items(), positions):
+            if position is None:
+                continue
+            rssi = data.rssi
+            color = '#00ff00' if data.presence == "online" else '#555555'
+            
+            # Convert meters to canvas coordinates (scale: 45 pixels = 1 meter),
+            # keeping far away devices on the edge of the radar
+            dx, dy = position[0] * 45, position[1] * 45
+            scale = min(1.0, 180 / max(math.hypot(dx, dy), 1e-9))
+            x = center_x + dx * scale
+            y = center_y + dy * scale
+            label = f"{device_name}\n{rssi}dBm"
+            
+            blip = self.radar_items.get(device_name)
+            if blip is None:
+                # Draw device blip with pulsing effect, then its label
+                items = [
+                    self.canvas.create_oval(
+                        x-size, y-size, x+size, y+size,
+                        fill=color,
+                        stipple='gray50',
+                        tags="device"
+                    )
+                    for size in [10, 8, 6]
+                ]
+                items.append(self.canvas.create_text(
+                    x, y-20,
+                    text=label,
+                    fill=color,
+                    font=('Courier', 9),
+                    tags="device"
+                ))
+                self.radar_items[device_name] = (items, x, y, label, color)
+                moved += 1
+            elif blip[1:] != (x, y, label, color):
+                items = blip[0]
+                for item, size in zip(items, [10, 8, 6]):
+                    self.canvas.coords(item, x-size, y-size, x+size, y+size)
+                self.canvas.coords(items[3], x, y-20)
+                if label != blip[3]:
+                    self.canvas.itemconfigure(items[3], text=label)
+                if color != blip[4]:
+                    # Offline devices stay on the radar, greyed out
+                    for item in items:
+                        self.canvas.itemconfigure(item, fill=color)
+                self.radar_items[device_name] = (items, x, y, label, color)
+                moved += 1
+        
+        print(f"[DEBUG] Radar updated: {moved} moved, {len(removed)} removed")
+
+    def draw_chart_background(self, width, height, padding):
+        """Draw the grid, axes and RSSI scale, which only change with the canvas size"""
+        self.history_canvas.delete("static")
+        
+        # Draw grid
+        for i in range(0, height + padding, 20):
+            y = padding + i
+            self.history_canvas.create_line(
+                padding, y,
+                width + padding, y,
+                fill='#333333',
+                dash=(1, 2),
+                tags="static"
+            )
+        
+        for i in range(0, width + padding, 40):
+            x = padding + i
+            self.history_canvas.create_line(
+                x, padding,
+                x, height + padding,
+                fill='#333333',
+                dash=(1, 2),
+                tags="static"
+            )
+        
+        # Draw axes
+        self.history_canvas.create_line(
+            padding, padding,
+            padding, height + padding,
+            fill='#666666',
+            width=2,
+            tags="static"
+        )
+        self.history_canvas.create_line(
+            padding, height + padding,
+            width + padding, height + padding,
+            fill='#666666',
+            width=2,
+            tags="static"
+        )
+        
+        # Draw RSSI scale (-30 to -90 dBm)
+        for rssi in range(-30, -91, -10):
+            y = padding + ((-30 - rssi) / 60.0) * height
+            self.history_canvas.create_line(
+                padding - 5, y,
+                padding, y,
+                fill='#666666',
+                tags="static"
+            )
+            self.history_canvas.create_text(
+                padding - 10, y,
+                text=str(rssi),
+                fill='#666666',
+                anchor='e',
+                font=('Courier', 8),
+                tags="static"
+            )
+        
+        # Time labels, text filled in by update_history_chart
+        self.chart_time_labels = (
+            self.history_canvas.create_text(
+                padding, height + padding + 15,
+                fill='#666666',
+                anchor='w',
+                font=('Courier', 8),
+                tags="static"
+            ),
+            self.history_canvas.create_text(
+                width + padding, height + padding + 15,
+                fill='#666666',
+                anchor='e',
+                font=('Courier', 8),
+                tags="static"
+            ),
+        )
+
+    def update_history_chart(self):
+        """Update the signal history chart
+
+        Items are created once and then moved with coords(). Only the
+        lines of devices reported since the last draw are recomputed,
+        against the same time axis, unless the axis has scrolled by at least
+        a pixel: then every line moves and all of them are redrawn.
+        """
+        try:
+            # Chart dimensions
+            padding = 40
+            width = self.history_canvas.winfo_width() - 2 * padding
+            height = self.history_canvas.winfo_height() - 2 * padding
+            
+            history = self.rssi_server.history
+            
+            if (width, height) != self.chart_size:
+                # Resized: the background and every line have to be redone
+                self.draw_chart_background(width, height, padding)
+                self.chart_size = (width, height)
+                self.chart_drawn = None
+            now = time.time()
+            redraw = self.chart_dirty
+            if self.chart_drawn is None or (now - self.chart_drawn) * width / self.history_window >= 1:
+                redraw = None  # Every line
+                self.chart_drawn = now
+            elif not redraw and not self.chart_removed:
+                return
+            self.chart_dirty = set()
+            newest_time = self.chart_drawn
+            oldest_time = newest_time - self.history_window
+            
+            for device in self.chart_removed:
+                lines = self.chart_lines.pop(device, None)
+                if lines is not None:
+                    for item in lines[:4]:
+                        self.history_canvas.delete(item)
+            self.chart_removed = set()
+            
+            # Plot data for each device
+            colors = {'#0066ff': 'blue', '#ff3333': 'red', '#00ff00': 'green', '#ff00ff': 'purple', '#ff9900': 'orange'}
+            
+            # Legend rows follow the current devices in the order they first appeared
+            for row, (device, samples) in enumerate(history.items()):
+                lines = self.chart_lines.get(device)
+                new = lines is None
+                if new:
+                    i = len(self.chart_lines)
+                    color = list(colors.keys())[i % len(colors)]
+                    # Line with slight glow effect, then the device label in the legend
+                    lines = [
+                        self.history_canvas.create_line(
+                            0, 0, 0, 0,
+                            fill=color,
+                            width=3-offset,
+                            smooth=True,
+                            stipple='gray50' if offset > 0 else '',
+                            state='hidden'
+                        )
+                        for offset in [2, 1, 0]
+                    ]
+                    lines.append(self.history_canvas.create_text(
+                        0, 0,
+                        text=device,
+                        fill=color,
+                        anchor='e',
+                        font=('Courier', 10),
+                        state='hidden'
+                    ))
+                    lines.append(0)  # Legend y
+                    self.chart_lines[device] = lines
+                if lines[4] != padding + 20 * row:
+                    lines[4] = padding + 20 * row
+                    self.history_canvas.coords(lines[3], width + padding - 10, lines[4])
+                if not new and redraw is not None and device not in redraw:
+                    continue
+                
+                points = []
+                # At most two points per two pixel columns, however long the window is
+                decimated = self.rssi_server.chart_points(device, oldest_time, newest_time, max(1, width // 2))
+                
+                # Convert timestamps to x-coordinates
+                for timestamp, rssi in decimated:
+                    x = padding + ((timestamp - oldest_time) / (newest_time - oldest_time)) * width
+                    y = padding + ((-30 - rssi) / 60.0) * height
+                    points.extend([x, y])
+                
+                if len(points) >= 4:
+                    for line in lines[:3]:
+                        self.history_canvas.coords(line, points)
+                        self.history_canvas.itemconfigure(line, state='normal')
+                else:
+                    for line in lines[:3]:
+                        self.history_canvas.itemconfigure(line, state='hidden')
+                
+                if redraw is None:
+                    self.history_canvas.coords(lines[3], width + padding - 10, lines[4])
+                self.history_canvas.itemconfigure(lines[3], state='normal' if len(samples) > 1 else 'hidden')
+            
+            # Update time labels
+            start_label, end_label = self.chart_time_labels
+            self.history_canvas.itemconfigure(
+                start_label,
+                text=time.strftime('%H:%M:%S', time.localtime(oldest_time))
+            )
+            self.history_canvas.itemconfigure(
+                end_label,
+                text=time.strftime('%H:%M:%S', time.localtime(newest_time))
+            )
+            
+        except Exception as e:
+            print(f"[ERROR] History chart update error: {e}")
+
+    def update_ui(self):
+        """Update the UI with current device information"""
+        try:
+            with self.inbox_lock:
+                changed, self.inbox_changed = self.inbox_changed, {}
+                removed, self.inbox_removed = self.inbox_removed, set()
+            
+            # Only devices reported since the last tick need touching;
+            # if nothing was reported the list and radar are already current
+            if changed or removed:
+                self.update_device_list(changed, removed)
+                # Hold radar changes back while drawing is over its frame budget
+                for device_name in removed:
+                    self.radar_pending.pop(device_name, None)
+                self.radar_removed.difference_update(changed)
+                self.radar_removed.update(removed)
+                self.radar_pending.update(changed)
+                self.chart_removed.difference_update(changed)
+                self.chart_removed.update(removed)
+                self.chart_dirty.difference_update(removed)
+                self.chart_dirty.update(changed)
+            
+            # Update visualizations
+            if (self.radar_pending or self.radar_removed) and self.radar_throttle.ready():
+                with self.radar_throttle:
+                    self.update_device_positions(self.radar_pending, self.radar_removed)
+                self.radar_pending = {}
+                self.radar_removed = set()
+            if self.chart_throttle.ready():
+                with self.chart_throttle:
+                    self.update_history_chart()
+            
+            # Update status bar
+            self.status_var.set(
+                f"Connected Devices: {len(self.tree_rows)} | "
+                f"Last Updated: {time.strftime('%H:%M:%S')}"
+            )
+            
+        except Exception as e:
+            print(f"[ERROR] UI update error: {e}")
+            self.status_var.set("Error updating UI")
+        
+        # Schedule next update
+        self.root.after(1000, self.update_ui)  # Update every second
+
+def run_ui(rssi_server, feed, info_lines=()):
+    """Build the Tk monitor as a subscriber of feed and run its main loop"""
+    print("[INFO] Starting UI...")
+    root = tk.Tk()
+    RSSIMonitorUI(root, rssi_server, feed)
+    
+    # Add address information to the UI, e.g. instructions for web access
+    info_frame = ttk.Frame(root)
+    info_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=5)
+    
+    for line in info_lines:
+        ttk.Label(
+            info_frame,
+            text=line,
+            font=("Arial", 10)
+        ).pack(side=tk.TOP, anchor=tk.W)
+    
+    # Start the UI main loop
+    root.mainloop()
@@ -0,0 +1,66 @@
+import socket
+import threading
+
+# Discovery can hang on hosts without DNS or a default route, so it runs in
+# a background thread once per process and callers wait a bounded time
+_local_ip = None
+_discovery = None
+_discovery_lock = threading.Lock()
+
+
+def _discover_local_ip():
+    """Get the local IP address of this machine"""
+    global _local_ip
+    try:
+        # This is more reliable for getting the correct network IP
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.connect(("8.8.8.8", 80))
+        ip = s.getsockname()[0]
+        s.close()
+    except:
+        print("[WARN] Could not determine network IP, falling back to hostname method")
+        try:
+            ip = socket.gethostbyname(socket.gethostname())
+        except:
+            print("[ERROR] Could not determine IP address, using localhost")
+            ip = "127.0.0.1"
+    _local_ip = ip
+
+
+def start_discovery():
+    """Start looking up the local IP in the background (idempotent)"""
+    global _discovery
+    with _discovery_lock:
+        if _discovery is None:
+            _discovery = threading.Thread(target=_discover_local_ip, daemon=True)
+            _discovery.start()
+        return _discovery
+
+
+def get_local_ip(timeout=1.0):
+    """Get the local IP address of this machine
+
+    The answer is cached. If discovery has not finished within timeout
+    seconds, "127.0.0.1" is returned for now and the cache is filled in
+    when discovery completes.
+    """
+    if _local_ip is None:
+        start_discovery().join(timeout)
+        if _local_ip is None:
+            print("[WARN] Local IP lookup still running, using localhost for now")
+            return "127.0.0.1"
+    return _local_ip
+
+
+def log_network_interfaces():
+    """Print the local IP and every network interface (may be slow, run it in a thread)"""
+    local_ip = get_local_ip(timeout=10)
+    print("\n=== Network Configuration ===")
+    print(f"[INFO] Local IP address: {local_ip}")
+    print("\n[DEBUG] Available Network Interfaces:")
+    try:
+        addr = socket.gethostbyname(socket.gethostname())
+    except OSError:
+        addr = "Unable to get address"
+    for iface in socket.if_nameindex():
+        print(f"[DEBUG] Interface {iface[1]}: {addr}")
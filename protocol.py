@@ -0,0 +1,194 @@
+"""Wire formats shared by RSSIServer and client.py
+
+Legacy one-shot format: the client connects, sends "login|device_name|rssi"
+without a newline, reads one reply ("SUCCESS" or "ERROR: ...") and closes.
+
+Stream format: one long-lived connection carrying many newline-terminated
+reports. The first line is a hello that picks the acknowledgement mode:
+
+    stream|each     one reply line per report ("SUCCESS" / "ERROR: ...")
+    stream|batch    one "ACK|<ok>|<total>" line per chunk the server reads
+    stream|none     no replies at all
+
+followed by any number of "login|device_name|rssi" lines.
+
+Batch reports carry many readings in one message, either as a stream line or
+as a one-shot message:
+
+    batch|login|device_1|rssi_1|device_2|rssi_2|...
+
+A one-shot batch ends with a newline or with the client shutting down its
+side of the connection, and may be up to MAX_LINE bytes; larger ones are
+refused with "ERROR: Batch too large" and belong in stream mode.
+
+and are answered with one status per reading, in order:
+
+    BATCH|<ok>|<total>|OK|ERR_RSSI|...
+
+(ERR_NAME, ERR_RSSI, or ERR_FULL when an ingest worker's shared device
+table has no room for a new device).
+
+Monitor nodes that measure other devices' signal tag their reports with
+their sensor id, by prefixing any one-shot message or stream line with
+"sensor|<sensor_id>|":
+
+    sensor|node-2|login|device_name|rssi
+    sensor|node-2|batch|login|device_1|rssi_1|...
+
+Untagged reports are the device's own view of this server's router.
+
+Federation: an edge RSSIServer forwards its registry to an aggregator over
+one long-lived connection opened with
+
+    federate|login|<node_id>
+
+followed by frames of a 4-byte big-endian length and a zlib-compressed
+JSON delta (see federation.encode_delta). The aggregator answers each
+frame with "ACK|<version>", the edge's registry version it carried.
+
+Binary: a connection whose first bytes are BINARY_MAGIC speaks the compact
+protocol of binary_protocol.py, where a device name is sent once per
+session and every later reading is a 3 or 5 byte (id, rssi) record.
+"""
+
+STREAM_PREFIX = b"stream|"
+ACK_MODES = ("each", "batch", "none")
+MAX_LINE = 1 << 20  # Longest line we buffer before giving up on a client (big batches)
+STREAM_IDLE_TIMEOUT = 60  # Seconds a stream connection may stay silent
+FEDERATE_PREFIX = b"federate|"
+BINARY_MAGIC = b"RSSB"
+RSSI_MIN, RSSI_MAX = -32768, 32767  # Range of the int16 fields RSSI is stored in
+
+
+def clamp_rssi(rssi):
+    """Limit an RSSI to what the int16 fields of the stores and tables hold"""
+    return max(RSSI_MIN, min(RSSI_MAX, rssi))
+
+
+def is_stream_hello(data):
+    """Return True if the first bytes of a connection open a stream session"""
+    return data.startswith(STREAM_PREFIX)
+
+
+def is_federation_hello(data):
+    """Return True if the first bytes of a connection open a federation session"""
+    return data.startswith(FEDERATE_PREFIX)
+
+
+def is_binary_hello(data):
+    """Return True if the first bytes of a connection open a binary session"""
+    return data.startswith(BINARY_MAGIC)
+
+
+def stream_hello(ack="each"):
+    """Build the hello line a client sends to open a stream session"""
+    if ack not in ACK_MODES:
+        raise ValueError(f"Unknown ack mode: {ack}")
+    return f"stream|{ack}\n".encode()
+
+
+def sensor_prefix(sensor_id):
+    """Prefix that tags a report with the sensor that heard it ("" for untagged)"""
+    if "|" in sensor_id:
+        raise ValueError(f"Sensor id may not contain '|': {sensor_id}")
+    return f"sensor|{sensor_id}|" if sensor_id else ""
+
+
+def format_batch(readings, password="login", sensor_id=""):
+    """Encode [(device_name, rssi), ...] as one batch message (no newline)"""
+    fields = [f"{name}|{rssi}" for name, rssi in readings]
+    return f"{sensor_prefix(sensor_id)}batch|{password}|{'|'.join(fields)}".encode()
+
+
+def parse_batch_reply(reply):
+    """Split a decoded BATCH reply line into the list of per-reading statuses"""
+    parts = reply.strip().split('|')
+    if parts[0] != "BATCH":
+        raise ValueError(f"Not a batch reply: {reply!r}")
+    return parts[3:]
+
+
+class LineStream:
+    """Server side of a stream session, independent of the socket API in use
+
+    feed() takes raw bytes as they arrive, runs every complete report line
+    through handle_line (which returns the legacy reply bytes) and returns the
+    bytes to send back, which may be empty.
+    """
+
+    def __init__(self, handle_line):
+        self.handle_line = handle_line
+        self.ack = None  # Set once the hello line has been read
+        self.buffer = bytearray()
+        self.scanned = 0  # Bytes of buffer already known to hold no newline
+
+    def feed(self, data):
+        self.buffer += data
+        replies = []
+        ok = total = 0
+        while True:
+            end = self.buffer.find(b"\n", self.scanned)
+            if end < 0:
+                self.scanned = len(self.buffer)
+                break
+            self.scanned = 0
+            line = self.buffer[:end].decode().strip()
+            del self.buffer[:end + 1]
+            if self.ack is None:
+                self.ack = self._parse_hello(line)
+                continue
+            if not line:
+                continue
+            reply = self.handle_line(line)
+            total += 1
+            if not reply.startswith(b"ERROR"):
+                ok += 1
+            if self.ack == "each":
+                replies.append(reply + b"\n")
+        if len(self.buffer) > MAX_LINE:
+            raise ValueError("Stream line too long")
+        if self.ack == "batch" and total:
+            replies.append(f"ACK|{ok}|{total}\n".encode())
+        return b"".join(replies)
+
+    def _parse_hello(self, line):
+        parts = line.split('|')
+        if len(parts) != 2 or parts[0] != "stream" or parts[1] not in ACK_MODES:
+            raise ValueError(f"Invalid stream hello: {line}")
+        return parts[1]
+
+
+class OneShotMessage:
+    """A one-shot message being read, independent of the socket API in use
+
+    A plain report is complete after the first read, as legacy clients
+    send it without a newline and wait for the reply. A batch is only
+    complete at its newline or at EOF (feed(b"")), so one longer than a
+    single read is never cut short; past MAX_LINE bytes it is too_large.
+    """
+
+    def __init__(self, data):
+        self.chunks = [data]
+        self.size = len(data)
+        self.complete = b"\n" in data or not self._is_batch(data)
+        self.too_large = False
+
+    @staticmethod
+    def _is_batch(data):
+        if data.startswith(b"sensor|"):
+            data = data.split(b"|", 2)[-1]
+        return data.startswith(b"batch|")
+
+    def feed(self, data):
+        """Add the next read (b"" at EOF); returns True once the message is complete"""
+        if not data or b"\n" in data:
+            self.complete = True
+        self.chunks.append(data)
+        self.size += len(data)
+        if self.size > MAX_LINE:
+            self.too_large = self.complete = True
+        return self.complete
+
+    def text(self):
+        """The message up to its newline, decoded"""
+        return b"".join(self.chunks).split(b"\n", 1)[0].decode().strip()
@@ -0,0 +1,389 @@
+import heapq
+import mmap
+import os
+import struct
+import threading
+from itertools import chain
+
+from background import BackgroundThread
+from protocol import clamp_rssi
+
+# One reading on disk: device id, timestamp, rssi, padded to 16 bytes
+RECORD = struct.Struct("<Idhxx")
+SEGMENT_SUFFIX = ".seg"
+DEVICES_FILE = "devices.txt"
+LATENESS_FILE = "lateness.txt"
+
+
+class _Segment:
+    """One segment file, memory-mapped for reading once it is full"""
+    __slots__ = ("path", "map", "first", "last")
+
+    def __init__(self, path):
+        self.path = path
+        self.map = None  # Only set for full segments, which never change again
+        self.first = self.last = None  # Timestamp range, once known
+
+
+def _timestamp(buffer, index):
+    return RECORD.unpack_from(buffer, index * RECORD.size)[1]
+
+
+def _record_time(record):
+    return record[1]
+
+
+def _first_at_or_after(buffer, count, timestamp):
+    # Records are sorted by time, or out of order by at most a known
+    # lateness; ReadingStore._scan_buffer widens the bounds by it
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        if _timestamp(buffer, middle) < timestamp:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class ReadingStore(BackgroundThread):
+    """Append-only on-disk log of every reading, in fixed-width binary segments
+
+    Readings are packed into an in-memory buffer by the ingest threads,
+    which costs them a struct.pack and nothing else. A background thread
+    writes the buffer out and fsyncs every flush_interval seconds, so a
+    crash loses at most that much. Files live in directory:
+
+      devices.txt        device names, one per line; the line number is the id
+      00000001.seg ...   RECORD entries, segment_records per file, oldest first
+      lateness.txt       segments holding records older than ones before them:
+                         name, lateness and newest timestamp stored before them
+
+    Local readings are stamped just before the lock is taken, so a racing
+    writer can arrive a little out of order; its timestamp is moved up to
+    the newest one stored. Readings merged from other nodes keep their own
+    timestamps (append_batch with exact=True). Each flush is sorted, and a
+    segment that receives records older than what was flushed before gets
+    its lateness, the most they are out of order, in lateness.txt.
+
+    Reads mmap the segments and binary-search them by time, widened by the
+    segment's lateness, so a range query only touches the records inside
+    its window. Out-of-order records are sorted as they are read.
+    """
+
+    def __init__(self, directory, flush_interval=1.0, segment_records=1 << 20):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.segment_records = segment_records
+        self.lock = threading.Lock()  # Guards the buffer, ids and last timestamp
+        self.file_lock = threading.Lock()  # Guards the files and segment list
+        self.buffer = bytearray()
+        self.new_names = []  # Names given ids since the last flush
+        self.ids = {}
+        self.names = []
+        self.last_timestamp = 0.0  # Newest timestamp appended
+        self.buffer_lateness = 0.0  # How far the buffer's records are out of order
+        self.lateness = {}  # {segment path: seconds}, for segments with out-of-order records
+        self.flushed_last = 0.0  # Newest timestamp written to the segments
+        os.makedirs(directory, exist_ok=True)
+        self._load_devices()
+        self._load_lateness()
+        self.segments = [
+            _Segment(os.path.join(directory, name))
+            for name in sorted(os.listdir(directory)) if name.endswith(SEGMENT_SUFFIX)
+        ]
+        if not self.segments:
+            self.segments.append(self._new_segment())
+        self.active = self._open_active()
+        self._stop = threading.Event()
+
+    def _load_devices(self):
+        path = os.path.join(self.directory, DEVICES_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            lines = f.read().split(b"\n")
+        # A torn last line was never fsynced, so no stored reading refers to it
+        for line in lines[:-1]:
+            name = line.decode("unicode_escape")
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        with open(path, "r+b") as f:
+            f.truncate(sum(len(line) + 1 for line in lines[:-1]))
+
+    def _load_lateness(self):
+        path = os.path.join(self.directory, LATENESS_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            for line in f.read().split(b"\n")[:-1]:
+                name, lateness, newest = line.decode().split()
+                path = os.path.join(self.directory, name)
+                self.lateness[path] = max(self.lateness.get(path, 0.0), float(lateness))
+                self.flushed_last = max(self.flushed_last, float(newest))
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"{number:08d}{SEGMENT_SUFFIX}")
+
+    def _new_segment(self):
+        return _Segment(self._segment_path(len(self.segments) + 1))
+
+    def _open_active(self):
+        segment = self.segments[-1]
+        f = open(segment.path, "ab")
+        size = f.tell()
+        if size % RECORD.size:
+            f.truncate(size - size % RECORD.size)  # Drop a record torn by a crash
+            f.seek(0, os.SEEK_END)
+        # The newest record may be in an earlier segment if this one is still empty
+        for previous in reversed(self.segments):
+            if os.path.getsize(previous.path) >= RECORD.size:
+                with open(previous.path, "rb") as r:
+                    r.seek(-RECORD.size, os.SEEK_END)
+                    last = RECORD.unpack(r.read(RECORD.size))[1]
+                # Unless the last flush was late, its last record is the newest
+                self.flushed_last = max(self.flushed_last, last)
+                break
+        self.last_timestamp = self.flushed_last
+        return f
+
+    def append(self, device_name, timestamp, rssi):
+        """Queue one reading for the next flush"""
+        with self.lock:
+            device_id = self.ids.get(device_name)
+            if device_id is None:
+                device_id = self._add_device(device_name)
+            if timestamp < self.last_timestamp:
+                timestamp = self.last_timestamp  # A racing writer got the lock first
+            self.last_timestamp = timestamp
+            self.buffer += RECORD.pack(device_id, timestamp, clamp_rssi(rssi))
+
+    def append_many(self, readings, timestamp):
+        """Queue many (device_name, rssi) readings taken at the same time"""
+        with self.lock:
+            if timestamp < self.last_timestamp:
+                timestamp = self.last_timestamp
+            self.last_timestamp = timestamp
+            ids = self.ids
+            pack = RECORD.pack
+            for device_name, rssi in readings:
+                device_id = ids.get(device_name)
+                if device_id is None:
+                    device_id = self._add_device(device_name)
+                self.buffer += pack(device_id, timestamp, clamp_rssi(rssi))
+
+    def append_batch(self, batch, exact=False):
+        """Queue readings from [(readings, ip, timestamp), ...] groups under one lock
+
+        exact keeps every timestamp as given, for readings taken elsewhere
+        that may be older than ones already stored. Otherwise they are
+        treated as local readings, like append's.
+        """
+        with self.lock:
+            ids = self.ids
+            pack = RECORD.pack
+            for readings, _, timestamp in batch:
+                if timestamp < self.last_timestamp:
+                    if exact:
+                        self.buffer_lateness = max(self.buffer_lateness, self.last_timestamp - timestamp)
+                    else:
+                        timestamp = self.last_timestamp
+                else:
+                    self.last_timestamp = timestamp
+                for device_name, rssi in readings:
+                    device_id = ids.get(device_name)
+                    if device_id is None:
+                        device_id = self._add_device(device_name)
+                    self.buffer += pack(device_id, timestamp, clamp_rssi(rssi))
+
+    def _add_device(self, device_name):
+        # Caller holds self.lock
+        device_id = len(self.names)
+        self.ids[device_name] = device_id
+        self.names.append(device_name)
+        self.new_names.append(device_name)
+        return device_id
+
+    def flush(self):
+        """Write out and fsync everything queued so far"""
+        # file_lock first: a reading is always either in the buffer or in a file for scan()
+        with self.file_lock:
+            with self.lock:
+                data, self.buffer = self.buffer, bytearray()
+                names, self.new_names = self.new_names, []
+                lateness, self.buffer_lateness = self.buffer_lateness, 0.0
+            if not data and not names:
+                return
+            if names:
+                # Names first, so every id on disk has its name on disk
+                with open(os.path.join(self.directory, DEVICES_FILE), "ab") as f:
+                    f.write(b"".join(name.encode("unicode_escape") + b"\n" for name in names))
+                    f.flush()
+                    os.fsync(f.fileno())
+            if data:
+                if lateness:
+                    # Sorted is stable, so each device's readings keep their order
+                    data = b"".join(RECORD.pack(*record) for record in sorted(RECORD.iter_unpack(data),
+                                                                              key=_record_time))
+                count = len(data) // RECORD.size
+                late = _first_at_or_after(data, count, self.flushed_last)
+                if late:
+                    self._mark_late(late * RECORD.size, self.flushed_last - _timestamp(data, 0))
+                self.flushed_last = max(self.flushed_last, _timestamp(data, count - 1))
+            view = memoryview(data)
+            while view:
+                room = (self.segment_records * RECORD.size) - self.active.tell()
+                if room <= 0:
+                    self._rotate()
+                    continue
+                self.active.write(view[:room])
+                view = view[room:]
+            self.active.flush()
+            os.fsync(self.active.fileno())
+
+    def _mark_late(self, size, lateness):
+        # Caller holds self.file_lock. The next size bytes written are up to
+        # lateness seconds older than records already written: record that
+        # for every segment they will land in, before writing them
+        capacity = self.segment_records * RECORD.size
+        position = self.active.tell()
+        number = len(self.segments)
+        lines = []
+        while size > 0:
+            room = capacity - position
+            if room > 0:
+                path = self._segment_path(number)
+                if lateness > self.lateness.get(path, 0.0):
+                    self.lateness[path] = lateness
+                    lines.append(f"{os.path.basename(path)} {lateness!r} {self.flushed_last!r}\n")
+                size -= room
+            number += 1
+            position = 0
+        if lines:
+            with open(os.path.join(self.directory, LATENESS_FILE), "a") as f:
+                f.write("".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _rotate(self):
+        # Caller holds self.file_lock
+        os.fsync(self.active.fileno())
+        self.active.close()
+        self.segments.append(self._new_segment())
+        self.active = open(self.segments[-1].path, "ab")
+
+    def _segment_map(self, segment, size=None):
+        """Return (buffer, record count) for a segment; None if it is empty
+
+        Pass size for the active segment, which is still growing; full
+        segments are mapped once and kept.
+        """
+        if segment.map is not None:
+            return segment.map, len(segment.map) // RECORD.size
+        active = size is not None
+        if not active:
+            size = os.path.getsize(segment.path)
+        if size < RECORD.size:
+            return None
+        with open(segment.path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), size - size % RECORD.size, access=mmap.ACCESS_READ)
+        count = len(buffer) // RECORD.size
+        if not active:
+            segment.map = buffer
+            segment.first = _timestamp(buffer, 0)
+            segment.last = _timestamp(buffer, count - 1)
+        return buffer, count
+
+    def scan(self, start=0.0, end=float("inf")):
+        """Yield (device_id, timestamp, rssi) for readings with start <= timestamp < end, oldest first
+
+        Includes readings still waiting for the next flush.
+        """
+        with self.file_lock:
+            segments = list(self.segments)
+            active_size = self.active.tell()
+            lateness = dict(self.lateness)
+            with self.lock:
+                pending = bytes(self.buffer)
+                pending_lateness = self.buffer_lateness
+        parts = []
+        ordered = True
+        for segment in segments:
+            late = lateness.get(segment.path, 0.0)
+            if segment.last is not None and (segment.last + late < start or segment.first - late >= end):
+                continue
+            mapped = self._segment_map(segment, active_size if segment is segments[-1] else None)
+            if mapped is not None:
+                parts.append(self._scan_buffer(*mapped, start, end, late))
+                ordered = ordered and not late
+        if pending:
+            parts.append(self._scan_buffer(pending, len(pending) // RECORD.size, start, end, pending_lateness))
+            ordered = ordered and not pending_lateness
+        if not ordered:
+            # Out-of-order records may belong before ones in earlier parts
+            yield from heapq.merge(*parts, key=_record_time)
+        else:
+            yield from chain.from_iterable(parts)
+
+    def _scan_buffer(self, buffer, count, start, end, lateness=0.0):
+        # Every record is at most lateness older than any before it, so records
+        # before one older than start - lateness are all older than start, and
+        # records after one at or past end + lateness are all at or past end
+        low = _first_at_or_after(buffer, count, start - lateness)
+        high = _first_at_or_after(buffer, count, end + lateness)
+        if low >= high:
+            return iter(())
+        records = RECORD.iter_unpack(memoryview(buffer)[low * RECORD.size:high * RECORD.size])
+        if not lateness:
+            return records
+        return iter(sorted((record for record in records if start <= record[1] < end), key=_record_time))
+
+    def query(self, device_name, start=0.0, end=float("inf")):
+        """Return [(timestamp, rssi), ...] for one device between start and end"""
+        device_id = self.ids.get(device_name)
+        if device_id is None:
+            return []
+        return [(timestamp, rssi) for found, timestamp, rssi in self.scan(start, end) if found == device_id]
+
+    def last_state(self):
+        """Return {device_name: (timestamp, rssi)} for the latest reading of every device
+
+        Segments are read from the newest backwards, stopping as soon as
+        every known device has been seen.
+        """
+        self.flush()
+        latest = {}
+        wanted = len(self.names)
+        with self.file_lock:
+            segments = list(self.segments)
+            active_size = self.active.tell()
+        for number in range(len(segments) - 1, -1, -1):
+            segment = segments[number]
+            mapped = self._segment_map(segment, active_size if segment is segments[-1] else None)
+            if mapped is None:
+                continue
+            buffer, count = mapped
+            for index in range(count - 1, -1, -1):
+                device_id, timestamp, rssi = RECORD.unpack_from(buffer, index * RECORD.size)
+                if device_id not in latest:
+                    latest[device_id] = (timestamp, rssi)
+                    if len(latest) == wanted:
+                        return {self.names[i]: state for i, state in latest.items()}
+        return {self.names[i]: state for i, state in latest.items()}
+
+    def run(self):
+        """Write the buffer out every flush_interval seconds until closed"""
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"[ERROR] Could not write readings to {self.directory}: {e}")
+
+    def close(self):
+        """Stop the flusher and write out what is left"""
+        self._stop.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        with self.file_lock:
+            self.active.close()
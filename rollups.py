@@ -0,0 +1,214 @@
+import threading
+import time
+from array import array
+
+from protocol import clamp_rssi
+
+# (bucket seconds, buckets kept): 15 min of 1 s, 24 h of 1 min, 30 days of 1 h
+DEFAULT_TIERS = ((1, 900), (60, 1440), (3600, 720))
+
+
+class RollupRing:
+    """min/max/sum/count/last of one device's readings per fixed-width time bucket
+
+    Buckets are stored round-robin in parallel arrays, oldest overwritten
+    once capacity is reached, like RingBuffer. The arrays grow as buckets
+    are opened, so a device that reports rarely costs little. Buckets are
+    keyed by bucket number (timestamp // resolution) and only exist for
+    intervals that had readings.
+    """
+
+    __slots__ = ("resolution", "capacity", "buckets", "mins", "maxs", "sums", "counts", "lasts",
+                 "start", "count", "newest", "newest_index")
+
+    def __init__(self, resolution, capacity):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.buckets = array('I')
+        self.mins = array('h')
+        self.maxs = array('h')
+        self.sums = array('d')
+        self.counts = array('I')
+        self.lasts = array('h')
+        self.start = 0  # Physical index of the oldest bucket
+        self.count = 0
+        self.newest = -1  # Bucket number and index of the newest bucket, the usual target
+        self.newest_index = 0
+
+    def add(self, timestamp, rssi):
+        """Fold one reading into its bucket, opening a new bucket if needed"""
+        rssi = clamp_rssi(rssi)
+        bucket = int(timestamp // self.resolution)
+        if bucket == self.newest:
+            index = self.newest_index
+        elif bucket > self.newest:
+            self._open(bucket, rssi)
+            return
+        else:
+            # A reading that lost a race with a newer one: look a few buckets back
+            for back in range(1, min(4, self.count)):
+                index = (self.newest_index - back) % self.capacity
+                if self.buckets[index] == bucket:
+                    break
+            else:
+                return
+        if rssi < self.mins[index]:
+            self.mins[index] = rssi
+        elif rssi > self.maxs[index]:
+            self.maxs[index] = rssi
+        self.sums[index] += rssi
+        self.counts[index] += 1
+        self.lasts[index] = rssi
+
+    def _open(self, bucket, rssi):
+        if self.count < self.capacity:
+            index = self.count
+            self.buckets.append(bucket)
+            self.mins.append(rssi)
+            self.maxs.append(rssi)
+            self.sums.append(rssi)
+            self.counts.append(1)
+            self.lasts.append(rssi)
+            self.count += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+            self.buckets[index] = bucket
+            self.mins[index] = self.maxs[index] = self.lasts[index] = rssi
+            self.sums[index] = rssi
+            self.counts[index] = 1
+        self.newest = bucket
+        self.newest_index = index
+
+    def _first_at_or_after(self, bucket):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.buckets[(self.start + mid) % self.capacity] < bucket:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def rows(self, start, end):
+        """Yield (bucket start time, min, max, sum, count, last) for buckets overlapping start..end"""
+        first = self._first_at_or_after(int(start // self.resolution))
+        last_bucket = end / self.resolution
+        for position in range(first, self.count):
+            index = (self.start + position) % self.capacity
+            bucket = self.buckets[index]
+            if bucket >= last_bucket:
+                return
+            yield (bucket * self.resolution, self.mins[index], self.maxs[index],
+                   self.sums[index], self.counts[index], self.lasts[index])
+
+    def oldest(self):
+        """Start time of the oldest bucket held, or None if empty"""
+        return self.buckets[self.start] * self.resolution if self.count else None
+
+
+class RollupHistory:
+    """Per-device rollups at several resolutions, updated as readings arrive
+
+    Every reading is folded into one bucket per tier, so keeping days of
+    history costs a few arrays per device rather than every raw sample,
+    and a long-range query reads a bounded number of buckets. tiers is a
+    sequence of (bucket seconds, buckets kept), finest first.
+    """
+
+    def __init__(self, tiers=DEFAULT_TIERS):
+        self.tiers = tuple(sorted(tiers))
+        self.rings = {}  # {device_name: [RollupRing per tier]}
+        self.lock = threading.Lock()
+
+    def _device_rings(self, device_name):
+        rings = self.rings.get(device_name)
+        if rings is None:
+            rings = self.rings[device_name] = [RollupRing(*tier) for tier in self.tiers]
+        return rings
+
+    def record(self, device_name, timestamp, rssi):
+        with self.lock:
+            for ring in self._device_rings(device_name):
+                ring.add(timestamp, rssi)
+
+    def record_many(self, readings, timestamp):
+        """Fold in [(device_name, rssi), ...] taken at the same time"""
+        with self.lock:
+            for device_name, rssi in readings:
+                for ring in self._device_rings(device_name):
+                    ring.add(timestamp, rssi)
+
+    def record_batch(self, batch):
+        """Fold in [(readings, ip, timestamp), ...] groups under one lock"""
+        with self.lock:
+            for readings, _, timestamp in batch:
+                for device_name, rssi in readings:
+                    for ring in self._device_rings(device_name):
+                        ring.add(timestamp, rssi)
+
+    def remove(self, device_name):
+        with self.lock:
+            self.rings.pop(device_name, None)
+
+    def pick_tier(self, start, end, points, now=None):
+        """Index of the coarsest tier that still gives points buckets over start..end
+
+        Only tiers whose retention reaches back to start are considered;
+        if none does, the one reaching furthest back is used.
+        """
+        if now is None:
+            now = time.time()
+        wanted = (end - start) / max(1, points)
+        # One bucket of slack, so "the last 24 h" still fits a tier that keeps 24 h
+        covering = [i for i, (resolution, kept) in enumerate(self.tiers)
+                    if now - resolution * (kept + 1) <= start]
+        if not covering:
+            return len(self.tiers) - 1
+        fitting = [i for i in covering if self.tiers[i][0] <= wanted]
+        return fitting[-1] if fitting else covering[0]
+
+    def query(self, device_name, start, end, points=300):
+        """Return (width, [(time, min, max, mean, count, last), ...]) for one device
+
+        The tier is chosen by pick_tier. Its buckets are merged further when
+        it is still finer than the window needs, so at most about points
+        rows come back; width is the seconds each row covers, at least the
+        tier's resolution.
+        """
+        tier = self.pick_tier(start, end, points)
+        resolution = self.tiers[tier][0]
+        width = max(resolution, (end - start) / max(1, points))
+        rows = []
+        with self.lock:
+            rings = self.rings.get(device_name)
+            if rings is None:
+                return width, rows
+            column = None
+            for row in rings[tier].rows(start, end):
+                index = int((row[0] - start) // width)
+                if index != column:
+                    column = index
+                    rows.append(list(row))
+                    continue
+                merged = rows[-1]
+                merged[1] = min(merged[1], row[1])
+                merged[2] = max(merged[2], row[2])
+                merged[3] += row[3]
+                merged[4] += row[4]
+                merged[5] = row[5]
+        return width, [(t, low, high, total / count, count, last) for t, low, high, total, count, last in rows]
+
+    def minmax_points(self, device_name, start, end, columns):
+        """Chart points over start..end: each bucket's min and max, like decimate_minmax
+
+        The work depends on columns, not on how many readings the window
+        held, so charts of long windows use this instead of raw samples.
+        """
+        points = []
+        for timestamp, low, high, _, _, _ in self.query(device_name, start, end, columns)[1]:
+            timestamp = max(timestamp, start)  # The first bucket may begin before the window
+            points.append((timestamp, low))
+            if high != low:
+                points.append((timestamp, high))
+        return points
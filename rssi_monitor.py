@@ -1,77 +1,368 @@
 import threading
 import socket
-import tkinter as tk
-from tkinter import ttk
 import time
 import sys
-import importlib
-from http.server import HTTPServer, BaseHTTPRequestHandler
-import json
-import urllib.parse
-import random
-import math
-
-# Try to import Flask, but continue if not available
-try:
-    from web_server import start_web_server
-    has_flask = True
-    print("[INFO] Flask found - web interface will be enabled")
-except ImportError:
-    has_flask = False
+
+import calibration
+from device_registry import ColumnarDeviceRegistry, DeviceRegistry
+from monitor_core import ChangeFeed
+from netinfo import get_local_ip, log_network_interfaces, start_discovery
+from protocol import (LineStream, OneShotMessage, is_binary_hello, is_federation_hello, is_stream_hello,
+                      STREAM_IDLE_TIMEOUT)
+from rollups import DEFAULT_TIERS, RollupHistory
+from signal_filter import SignalFilter
+from signal_history import SignalHistory, decimate_minmax
+from trilateration import ROUTER, PositionSolver, parse_sensor
+
+# Heavy or optional modules (asyncio, http.server, tkinter, Flask) are only
+# imported by the code paths that use them, which keeps startup fast.
+# Names that used to live here are still importable from this module.
+_MOVED = {
+    "RSSIMonitorUI": "monitor_ui",
+    "SimpleHTTPRequestHandler": "http_api",
+    "start_http_server": "http_api",
+}
+
+def __getattr__(name):
+    if name in _MOVED:
+        return getattr(__import__(_MOVED[name]), name)
+    if name == "has_flask":
+        # Still a bool as before, only worked out on first use
+        globals()["has_flask"] = flask_available()
+        return globals()["has_flask"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def flask_available():
+    """Return True if the optional Flask web_server module is available (without importing it)"""
+    import importlib.util
+    return importlib.util.find_spec("web_server") is not None
 
 class RSSIServer:
-    def __init__(self, host='0.0.0.0', port=5001):  # Socket server on port 5001
-        # Dictionary to store device data: {device_name: {"rssi": value, "last_seen": timestamp}}
-        self.devices = {}
-        self.lock = threading.Lock()  # For thread-safe updates
+    def __init__(self, host='0.0.0.0', port=5001, backlog=128, verbose=True, shards=16,
+                 history_window=300, store=None, ingest=None,
+                 rollup_tiers=DEFAULT_TIERS, signal_filter=None, sensors=None, reuse_port=False,
+                 table=None, inactive_after=None, evict_after=None, columnar=False):  # Socket server on port 5001
+        # Device data: {device_name: {"rssi": value, "last_seen": timestamp, ...}}
+        # Lock-striped for concurrent writers; each write also updates the
+        # device's smoothed RSSI and online/offline state. Silent devices are
+        # marked inactive after inactive_after seconds and forgotten after
+        # evict_after (see expire). columnar keeps the records in typed arrays
+        self.signal_filter = signal_filter or SignalFilter()
+        registry_type = ColumnarDeviceRegistry if columnar else DeviceRegistry
+        self.registry = registry_type(shards, self.signal_filter, inactive_after, evict_after)
+        # min/max/mean per 1 s, 1 min and 1 h bucket, for windows longer than the raw history
+        self.rollups = RollupHistory(rollup_tiers)
+        # Per-device samples, appended as reports arrive; room for one per second.
+        # Raw samples are only kept as far back as the finest rollup tier goes
+        self.history_window = history_window
+        resolution, kept = self.rollups.tiers[0]
+        raw_window = min(history_window, resolution * kept)
+        self.history = SignalHistory(raw_window, capacity=max(300, int(raw_window)))
+        # Per-sensor readings and the positions solved from them, for the radar
+        self.positions = PositionSolver(sensors)
+        self.verbose = verbose  # Per-connection logging, too chatty under load
+        self.store = store  # Optional ReadingStore keeping every reading on disk
+        if store is not None:
+            self.restore()
+        # Optional IngestQueue: writes are then only queued, and applied on its drain thread
+        self.ingest = ingest
+        # Thread running serve_async; its puts never wait for the queue (see ingest_room)
+        self.loop_thread = None
+        # FederationMerger once accept_federation() is called (aggregator mode)
+        self.federation = None
+        # Optional SharedDeviceTable: in an ingest worker, reports only go there
+        self.table = table
+        # TableFollower merging what ingest workers write, in their parent process
+        self.follower = None
+        if ingest is not None:
+            ingest.add_consumer(self.apply_batch)
+            if store is not None:
+                ingest.add_consumer(self.store_batch)
+        self.server = None
+        self.port = None
+        if port is None:
+            return  # No socket of its own, e.g. the parent of ingest workers
         self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         # Allow port reuse for quick restarts
         self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            # Several worker processes listen on the port; the kernel spreads connections over them
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.server.bind((host, port))
-        self.server.listen(5)
-        print(f"[INFO] Socket server started - listening on {host}:{port}")
+        self.server.listen(backlog)
+        self.port = self.server.getsockname()[1]
+        print(f"[INFO] Socket server started - listening on {host}:{self.port}")
         print(f"[INFO] Waiting for devices to connect with password 'login'")
 
+    def log(self, message):
+        """Print per-connection messages when verbose logging is enabled"""
+        if self.verbose:
+            print(message)
+
+    def process_message(self, data, addr):
+        """Apply one 'password|device_name|rssi' report and return the reply bytes"""
+        # Debug the received data
+        self.log(f"[DEBUG] Received data: {data}")
+
+        # Expect data in format: "password|device_name|rssi", optionally
+        # prefixed with "sensor|<sensor_id>|" by monitor nodes
+        parts = data.split('|')
+        sensor = ROUTER
+        if parts[0] == "sensor" and len(parts) > 2:
+            sensor, parts = parts[1], parts[2:]
+        if parts[0] == "batch":
+            return self.process_batch(parts, addr, sensor)
+        if len(parts) == 3 and parts[0] == "login":
+            device_name, rssi_str = parts[1], parts[2]
+            try:
+                rssi = int(rssi_str)
+                if not self.update_device(device_name, rssi, addr[0], sensor):
+                    return b"ERROR: Device table full"
+                self.log(f"[INFO] Updated device: {device_name} with RSSI: {rssi} dBm")
+                return b"SUCCESS"
+            except ValueError:
+                print(f"[ERROR] Invalid RSSI value: {rssi_str}")
+                return b"ERROR: Invalid RSSI format"
+        else:
+            print(f"[WARN] Authentication failed or invalid data format: {data}")
+            return b"ERROR: Authentication failed"
+
+    def process_batch(self, parts, addr, sensor=ROUTER):
+        """Apply a 'batch|password|name|rssi|name|rssi...' message, return per-item status"""
+        if len(parts) < 2 or parts[1] != "login" or len(parts) % 2:
+            print(f"[WARN] Authentication failed or invalid batch format")
+            return b"ERROR: Authentication failed"
+        statuses = self.update_devices(zip(parts[2::2], parts[3::2]), addr[0], sensor)
+        ok = statuses.count("OK")
+        self.log(f"[INFO] Batch from {addr[0]}: {ok}/{len(statuses)} devices updated")
+        return f"BATCH|{ok}|{len(statuses)}|{'|'.join(statuses)}".encode()
+
+    def restore(self):
+        """Reload each device's last reading, and recent history and rollups, from the store
+
+        The store does not keep IP addresses, so restored devices have an
+        empty ip until they report again. Rollups are rebuilt from the last
+        day of readings; older buckets start empty.
+        """
+        state = self.store.last_state()
+        for device_name, (timestamp, rssi) in state.items():
+            self.registry.update(device_name, rssi, "", timestamp)
+        names = self.store.names
+        history_start = time.time() - self.history.window
+        for device_id, timestamp, rssi in self.store.scan(time.time() - max(self.history.window, 86400)):
+            if timestamp >= history_start:
+                self.history.record(names[device_id], timestamp, rssi)
+            self.rollups.record(names[device_id], timestamp, rssi)
+        print(f"[INFO] Restored {len(state)} devices from {self.store.directory}")
+
+    def update_device(self, device_name, rssi, ip, sensor=ROUTER):
+        """Record one reading for a device, as heard by sensor; False if the shared table had no room
+
+        Readings tagged by a monitor node only feed the position solver; the
+        registry, history and store hold what this server hears itself.
+        """
+        now = time.time()
+        if sensor != ROUTER:
+            self.positions.record_many([(device_name, rssi)], sensor, now)
+            return True
+        if self.table is not None:
+            return not self.table.update_many([(device_name, rssi)], ip, now)
+        self.positions.record_many([(device_name, rssi)], sensor, now)
+        if self.ingest is not None:
+            self.ingest.put([(device_name, rssi)], ip, now, wait=threading.get_ident() != self.loop_thread)
+            return True
+        self.registry.update(device_name, rssi, ip, now)
+        self.history.record(device_name, now, rssi)
+        self.rollups.record(device_name, now, rssi)
+        if self.store is not None:
+            self.store.append(device_name, now, rssi)
+        return True
+
+    def update_devices(self, readings, ip, sensor=ROUTER):
+        """Record many (device_name, rssi) readings, one lock acquisition per shard
+
+        The rssi values may still be strings; they are validated before the
+        lock is taken. Returns one status per reading: "OK", "ERR_NAME",
+        "ERR_RSSI" or "ERR_FULL" (no room in the shared table).
+        """
+        statuses = []
+        valid = []
+        for device_name, rssi in readings:
+            if not device_name:
+                statuses.append("ERR_NAME")
+                continue
+            try:
+                valid.append((device_name, int(rssi)))
+                statuses.append("OK")
+            except ValueError:
+                statuses.append("ERR_RSSI")
+        rejected = self.record_readings(valid, ip, sensor)
+        if rejected:
+            stored = iter(valid)
+            statuses = ["ERR_FULL" if status == "OK" and next(stored)[0] in rejected else status
+                        for status in statuses]
+        return statuses
+
+    def record_readings(self, readings, ip, sensor=ROUTER):
+        """Record validated (device_name, int rssi) readings, as heard by sensor
+
+        Like update_device, sensor-tagged readings only go to the position
+        solver. Returns the names that were not recorded: empty unless the
+        shared table has no room for them.
+        """
+        now = time.time()
+        if sensor != ROUTER:
+            self.positions.record_many(readings, sensor, now)
+            return ()
+        if self.table is not None:
+            return self.table.update_many(readings, ip, now)
+        self.positions.record_many(readings, sensor, now)
+        if self.ingest is not None:
+            self.ingest.put(readings, ip, now, wait=threading.get_ident() != self.loop_thread)
+            return ()
+        self.registry.update_many(readings, ip, now)
+        self.history.record_many(readings, now)
+        self.rollups.record_many(readings, now)
+        if self.store is not None:
+            self.store.append_many(readings, now)
+        return ()
+
+    def merge_readings(self, readings, sensor=ROUTER):
+        """Apply (device_name, rssi, last_seen, ip) readings taken elsewhere, last writer wins
+
+        For readings from other nodes or ingest workers. The ones newer than
+        what the registry holds also go to history, rollups, the store and
+        the position solver. Returns those.
+        """
+        applied = self.registry.merge_many(readings)
+        if not applied:
+            return applied
+        batch = [([(device_name, rssi)], ip, last_seen) for device_name, rssi, last_seen, ip in applied]
+        self.history.record_batch(batch)
+        self.rollups.record_batch(batch)
+        if self.store is not None:
+            self.store.append_batch(batch, exact=True)
+        for device_name, rssi, last_seen, _ in applied:
+            self.positions.record_many([(device_name, rssi)], sensor, last_seen)
+        return applied
+
+    def apply_batch(self, batch):
+        """Ingest queue consumer: write (readings, ip, timestamp) groups to the registry and history"""
+        self.registry.update_batch(batch)
+        self.history.record_batch(batch)
+        self.rollups.record_batch(batch)
+
+    def store_batch(self, batch):
+        """Ingest queue consumer: append (readings, ip, timestamp) groups to the store"""
+        self.store.append_batch(batch)
+
+    def accept_federation(self):
+        """Act as an aggregator: accept registry deltas forwarded by edge servers"""
+        from federation import FederationMerger
+        self.federation = FederationMerger(self)
+        print("[INFO] Accepting forwarded devices from edge servers")
+
     def handle_client(self, conn, addr):
         """Handle individual device connections"""
-        print(f"[INFO] New connection from {addr}")
+        self.log(f"[INFO] New connection from {addr}")
         try:
             # Set a timeout to prevent hanging connections
             conn.settimeout(10)
-            data = conn.recv(1024).decode().strip()
-            
-            # Debug the received data
-            print(f"[DEBUG] Received data: {data}")
-            
-            # Expect data in format: "password|device_name|rssi"
-            parts = data.split('|')
-            if len(parts) == 3 and parts[0] == "login":
-                device_name, rssi_str = parts[1], parts[2]
-                try:
-                    rssi = int(rssi_str)
-                    with self.lock:
-                        # Add connection timestamp for tracking active status
-                        self.devices[device_name] = {
-                            "rssi": rssi,
-                            "last_seen": time.time(),
-                            "ip": addr[0],
-                            "active": True  # Mark as active
-                        }
-                    print(f"[INFO] Updated device: {device_name} with RSSI: {rssi} dBm")
-                    conn.sendall(b"SUCCESS")
-                except ValueError:
-                    print(f"[ERROR] Invalid RSSI value: {rssi_str}")
-                    conn.sendall(b"ERROR: Invalid RSSI format")
+            data = conn.recv(1024)
+            if is_stream_hello(data):
+                self.handle_stream(conn, addr, data)
+            elif is_federation_hello(data):
+                self.handle_federation(conn, addr, data)
+            elif is_binary_hello(data):
+                self.handle_binary(conn, addr, data)
             else:
-                print(f"[WARN] Authentication failed or invalid data format: {data}")
-                conn.sendall(b"ERROR: Authentication failed")
+                message = OneShotMessage(data)
+                while not message.complete:
+                    message.feed(conn.recv(65536))
+                conn.sendall(self.one_shot_reply(message, addr))
+                if message.too_large:
+                    # Read the rest, or closing would reset the connection before the client sees the error
+                    conn.shutdown(socket.SHUT_WR)
+                    while conn.recv(65536):
+                        pass
         except socket.timeout:
             print(f"[WARN] Connection from {addr} timed out")
         except Exception as e:
             print(f"[ERROR] Exception handling client {addr}: {e}")
         finally:
             conn.close()
-            print(f"[INFO] Connection from {addr} closed")
+            self.log(f"[INFO] Connection from {addr} closed")
+
+    def one_shot_reply(self, message, addr):
+        """Apply a complete OneShotMessage and return the reply bytes"""
+        if message.too_large:
+            print(f"[WARN] One-shot batch from {addr} refused: too large")
+            return b"ERROR: Batch too large, send it over a stream connection"
+        return self.process_message(message.text(), addr)
+
+    def handle_stream(self, conn, addr, data):
+        """Serve newline-delimited reports until the client disconnects"""
+        self.log(f"[INFO] Stream session opened by {addr}")
+        stream = LineStream(lambda line: self.process_message(line, addr))
+        conn.settimeout(STREAM_IDLE_TIMEOUT)
+        while data:
+            reply = stream.feed(data)
+            if reply:
+                conn.sendall(reply)
+            data = conn.recv(65536)
+
+    def binary_stream(self, addr):
+        """BinaryStream for a binary session from addr"""
+        from binary_protocol import BinaryStream
+        self.log(f"[INFO] Binary session opened by {addr}")
+        return BinaryStream(lambda readings, sensor: self.stored_count(readings, addr[0], sensor))
+
+    def stored_count(self, readings, ip, sensor=ROUTER):
+        """record_readings, returning how many readings were recorded"""
+        rejected = self.record_readings(readings, ip, sensor)
+        if not rejected:
+            return len(readings)
+        return sum(1 for device_name, _ in readings if device_name not in rejected)
+
+    def handle_binary(self, conn, addr, data):
+        """Serve binary frames, received in place into the session's buffer, until the client disconnects"""
+        stream = self.binary_stream(addr)
+        conn.settimeout(STREAM_IDLE_TIMEOUT)
+        try:
+            reply = stream.feed(data)
+            while True:
+                if reply:
+                    conn.sendall(reply)
+                received = conn.recv_into(stream.free())
+                if not received:
+                    break
+                reply = stream.received(received)
+        except ValueError:
+            if stream.reject is not None:
+                conn.sendall(stream.reject)
+            raise
+
+    def federation_reader(self, addr):
+        """DeltaReader for a federation session, or None if this server is not an aggregator"""
+        if self.federation is None:
+            print(f"[WARN] Federation session from {addr} refused: not running as an aggregator")
+            return None
+        from federation import DeltaReader
+        print(f"[INFO] Federation session opened by {addr}")
+        return DeltaReader(self.federation.merge)
+
+    def handle_federation(self, conn, addr, data):
+        """Merge registry deltas from an edge server until it disconnects"""
+        reader = self.federation_reader(addr)
+        if reader is None:
+            conn.sendall(b"ERROR: Not an aggregator\n")
+            return
+        conn.settimeout(STREAM_IDLE_TIMEOUT)
+        while data:
+            reply = reader.feed(data)
+            if reply:
+                conn.sendall(reply)
+            data = conn.recv(1 << 20)
 
     def start(self):
         """Start the server to accept connections"""
@@ -89,573 +380,231 @@ class RSSIServer:
             except Exception as e:
                 print(f"[ERROR] Exception accepting connection: {e}")
 
-    def get_devices(self):
-        """Return a copy of the current devices dictionary"""
-        with self.lock:
-            # No more stale device removal - keep all devices
-            return self.devices.copy()
-
-class SimpleHTTPRequestHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        """Serve a simple HTML page with a form"""
-        if self.path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(b"""
-            <html>
-            <head>
-                <title>Wi-Fi RSSI Reporter</title>
-                <style>
-                    body { font-family: Arial, sans-serif; padding: 20px; }
-                    .success { color: green; }
-                    .error { color: red; }
-                </style>
-            </head>
-            <body>
-                <h1>Wi-Fi RSSI Reporter</h1>
-                <div id="status"></div>
-                <form id="rssiForm" onsubmit="submitForm(event)">
-                    <label for="device_name">Device Name:</label>
-                    <input type="text" id="device_name" name="device_name" required><br><br>
-                    <label for="password">Password:</label>
-                    <input type="password" id="password" name="password" required><br><br>
-                    <input type="submit" value="Submit">
-                </form>
-
-                <script>
-                function submitForm(event) {
-                    event.preventDefault();
-                    const deviceName = document.getElementById('device_name').value;
-                    const password = document.getElementById('password').value;
-                    const status = document.getElementById('status');
-
-                    // Get client IP address from server
-                    fetch('/submit?' + new URLSearchParams({
-                        device_name: deviceName,
-                        password: password,
-                        client_ip: window.location.hostname
-                    }))
-                    .then(response => response.json())
-                    .then(data => {
-                        if (data.success) {
-                            status.innerHTML = `<p class="success">Successfully connected! RSSI: ${data.rssi} dBm (${data.quality})</p>`;
-                            // Keep updating status
-                            setInterval(() => updateStatus(deviceName), 5000);
-                        } else {
-                            status.innerHTML = `<p class="error">Error: ${data.message}</p>`;
-                        }
-                    })
-                    .catch(error => {
-                        status.innerHTML = `<p class="error">Error: ${error}</p>`;
-                    });
-                }
-
-                function updateStatus(deviceName) {
-                    fetch('/status?' + new URLSearchParams({device_name: deviceName}))
-                    .then(response => response.json())
-                    .then(data => {
-                        const status = document.getElementById('status');
-                        if (data.connected) {
-                            status.innerHTML = `<p class="success">Connected! RSSI: ${data.rssi} dBm (${data.quality})</p>`;
-                        } else {
-                            status.innerHTML = `<p class="error">Device disconnected</p>`;
-                        }
-                    });
-                }
-                </script>
-            </body>
-            </html>
-            """)
-        elif self.path.startswith('/submit'):
-            query = urllib.parse.urlparse(self.path).query
-            params = dict(urllib.parse.parse_qsl(query))
-            device_name = params.get('device_name', '')
-            password = params.get('password', '')
-            client_ip = self.client_address[0]  # Get actual client IP
-            rssi = random.randint(-90, -30)  # Simulate RSSI value
-
-            if password == "login":
-                with rssi_server.lock:
-                    rssi_server.devices[device_name] = {
-                        "rssi": rssi,
-                        "last_seen": time.time(),
-                        "ip": client_ip  # Store client IP
-                    }
-                quality = self.rssi_to_quality(rssi)
-                print(f"[INFO] New device connected - Name: {device_name}, IP: {client_ip}, RSSI: {rssi}")
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({
-                    "success": True,
-                    "rssi": rssi,
-                    "quality": quality
-                }).encode())
-            else:
-                self.send_response(403)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({
-                    "success": False,
-                    "message": "Invalid password"
-                }).encode())
-        elif self.path.startswith('/status'):
-            query = urllib.parse.urlparse(self.path).query
-            params = dict(urllib.parse.parse_qsl(query))
-            device_name = params.get('device_name', '')
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            
-            with rssi_server.lock:
-                device = rssi_server.devices.get(device_name)
-                if device and (time.time() - device["last_seen"]) < 30:
-                    quality = self.rssi_to_quality(device["rssi"])
-                    self.wfile.write(json.dumps({
-                        "connected": True,
-                        "rssi": device["rssi"],
-                        "quality": quality
-                    }).encode())
-                else:
-                    self.wfile.write(json.dumps({
-                        "connected": False
-                    }).encode())
-
-    def rssi_to_quality(self, rssi):
-        """Convert RSSI value to a human-readable quality description"""
-        if rssi >= -50:
-            return "Excellent"
-        elif rssi >= -60:
-            return "Good"
-        elif rssi >= -70:
-            return "Fair"
-        elif rssi >= -80:
-            return "Poor"
-        else:
-            return "Very Poor"
+    def start_async(self, max_connections=1000):
+        """Start the server on a single asyncio event loop instead of a thread per client"""
+        import asyncio
+        asyncio.run(self.serve_async(max_connections))
 
-    def log_message(self, format, *args):
-        """Override to prevent printing to stderr"""
-        return
+    async def serve_async(self, max_connections=1000):
+        """Accept and handle connections on the running event loop
 
-def get_local_ip():
-    """Get the local IP address of this machine"""
-    try:
-        # This is more reliable for getting the correct network IP
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except:
-        print("[WARN] Could not determine network IP, falling back to hostname method")
-        try:
-            return socket.gethostbyname(socket.gethostname())
-        except:
-            print("[ERROR] Could not determine IP address, using localhost")
-            return "127.0.0.1"
-
-def start_http_server(host='0.0.0.0', port=5000, server=None):
-    """Start the simple HTTP server"""
-    global rssi_server
-    rssi_server = server
-    
-    # Print the actual addresses the server will be available on
-    local_ip = get_local_ip()
-    print(f"[INFO] Server will be available at:")
-    print(f"[INFO] Local machine: http://localhost:{port}")
-    print(f"[INFO] Network devices: http://{local_ip}:{port}")
-    
-    try:
-        httpd = HTTPServer((host, port), SimpleHTTPRequestHandler)
-        print(f"[INFO] HTTP server is ready to accept connections")
-        httpd.serve_forever()
-    except Exception as e:
-        print(f"[ERROR] Failed to start HTTP server: {e}")
-        raise
-
-class RSSIMonitorUI:
-    def __init__(self, root, rssi_server):
-        self.root = root
-        self.rssi_server = rssi_server
-        self.setup_ui()
-        
-        # Start the update loop
-        self.update_ui()
-    
-    def setup_ui(self):
-        """Set up the UI components"""
-        self.root.title("Wi-Fi RSSI Monitor")
-        self.root.geometry("1000x600")  # Made wider for the chart
-        self.root.configure(bg='#1a1a1a')
-        
-        # Configure styles
-        style = ttk.Style()
-        style.configure(".", background='#1a1a1a', foreground='#00ff00')
-        style.configure("TNotebook", background='#1a1a1a')
-        style.configure("TNotebook.Tab", background='white', foreground='black')
-        style.configure("DeviceList.Treeview", 
-            background='white', 
-            foreground='black',
-            fieldbackground='white'
-        )
-        style.configure("DeviceList.Treeview.Heading", 
-            background='#f0f0f0',
-            foreground='black'
-        )
-        
-        # Create main container
-        main_frame = ttk.Frame(self.root)
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
-        
-        # Create left frame for tabs
-        left_frame = ttk.Frame(main_frame)
-        left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        # Create notebook (tabbed interface)
-        self.notebook = ttk.Notebook(left_frame)
-        self.notebook.pack(fill=tk.BOTH, expand=True)
-        
-        # Tab 1: Device List
-        devices_tab = ttk.Frame(self.notebook)
-        self.notebook.add(devices_tab, text='Connected Devices')
-        
-        # Setup device list
-        columns = ("device", "ip", "rssi", "distance")
-        self.tree = ttk.Treeview(devices_tab, columns=columns, show="headings", style="DeviceList.Treeview")
-        
-        self.tree.heading("device", text="Device Name")
-        self.tree.heading("ip", text="IP Address")
-        self.tree.heading("rssi", text="RSSI (dBm)")
-        self.tree.heading("distance", text="Est. Distance (m)")
-        
-        self.tree.column("device", width=100)
-        self.tree.column("ip", width=120)
-        self.tree.column("rssi", width=80)
-        self.tree.column("distance", width=100)
-        
-        self.tree.pack(fill=tk.BOTH, expand=True)
-        
-        # Tab 2: History Chart
-        history_tab = ttk.Frame(self.notebook)
-        self.notebook.add(history_tab, text='Signal History')
-        
-        # Setup history chart with dark theme
-        self.history_canvas = tk.Canvas(
-            history_tab,
-            background='black',
-            width=400,
-            height=300
-        )
-        self.history_canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        
-        # Initialize history data structure with more points for longer timeline
-        self.signal_history = {}  # {device_name: [(timestamp, rssi), ...]}
-        self.history_max_points = 300  # 5 minutes at 1 update per second
-        
-        # Create right frame for radar
-        map_frame = ttk.Frame(main_frame)
-        map_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
-        
-        # Setup radar map (right side)
-        self.canvas = tk.Canvas(
-            map_frame, 
-            width=400, 
-            height=400, 
-            bg='#1a1a1a',
-            highlightbackground='#00ff00',
-            highlightthickness=1
-        )
-        self.canvas.pack(padx=10, pady=10)
-        
-        # Draw radar circles
-        center_x, center_y = 200, 200
-        for radius in [45, 90, 135, 180]:  # Represents 1m, 2m, 3m, 4m
-            self.canvas.create_oval(
-                center_x - radius, 
-                center_y - radius,
-                center_x + radius, 
-                center_y + radius,
-                outline='#00ff00',
-                dash=(2, 4)
-            )
-            # Add distance label
-            self.canvas.create_text(
-                center_x, 
-                center_y - radius,
-                text=f"{radius/45}m",
-                fill='#00ff00',
-                font=('Courier', 8)
-            )
-        
-        # Draw crosshairs
-        self.canvas.create_line(200, 0, 200, 400, fill='#00ff00', dash=(2, 4))
-        self.canvas.create_line(0, 200, 400, 200, fill='#00ff00', dash=(2, 4))
-        
-        # Draw router at center with glow effect
-        self.canvas.create_oval(190, 190, 210, 210, fill='#00ff00', outline='#00ff00')
-        self.canvas.create_text(200, 170, text="Router", fill='#00ff00', font=('Courier', 10))
-        
-        # Status bar
-        self.status_var = tk.StringVar(value="Radar Active")
-        self.status_label = ttk.Label(
-            self.root,
-            textvariable=self.status_var,
-            font=("Courier", 10)
-        )
-        self.status_label.pack(side=tk.BOTTOM, fill=tk.X, padx=10)
-
-    def rssi_to_distance(self, rssi):
-        """Convert RSSI to approximate distance in meters"""
-        # Calibrated conversion based on known distances:
-        # -50 dBm ≈ 1 meter
-        # -70 dBm ≈ 3 meters
-        if rssi >= -30:  # Very close
-            return 0.5
-        elif rssi >= -50:  # Around 1 meter
-            return 1.0
-        elif rssi >= -60:  # Around 2 meters
-            return 2.0
-        elif rssi >= -70:  # Around 3 meters
-            return 3.0
-        elif rssi >= -80:  # Around 4 meters
-            return 4.0
-        else:  # Very far
-            return 5.0
-
-    def update_device_positions(self, devices):
-        """Update device positions on the radar"""
-        print("[DEBUG] Updating device positions on radar")
-        self.canvas.delete("device")  # Remove old device markers
-        
-        center_x, center_y = 200, 200
-        
-        for device_name, data in devices.items():
-            rssi = data["rssi"]
-            distance = self.rssi_to_distance(rssi)
-            print(f"[DEBUG] Device: {device_name}, RSSI: {rssi}, Distance: {distance}m")
-            
-            # Convert distance to canvas coordinates (scale: 45 pixels = 1 meter)
-            radius = min(distance * 45, 180)
-            
-            # Calculate position (use device name hash for consistent angle)
-            angle = hash(device_name) % 360
-            x = center_x + radius * math.cos(math.radians(angle))
-            y = center_y + radius * math.sin(math.radians(angle))
-            
-            # Draw device blip with pulsing effect
-            for size in [10, 8, 6]:
-                self.canvas.create_oval(
-                    x-size, y-size, x+size, y+size,
-                    fill='#00ff00',
-                    stipple='gray50',
-                    tags="device"
-                )
-            
-            # Device label
-            self.canvas.create_text(
-                x, y-20,
-                text=f"{device_name}\n{rssi}dBm",
-                fill='#00ff00',
-                font=('Courier', 9),
-                tags="device"
-            )
-            
-            print(f"[DEBUG] Placed {device_name} at ({x}, {y}) on radar")
-
-    def update_history_chart(self):
-        """Update the signal history chart"""
+        At most max_connections clients are handled at once. When the limit is
+        reached the loop stops calling accept(), so new clients queue in the
+        kernel listen backlog instead of in memory (backpressure).
+        """
+        import asyncio
+        print(f"[INFO] Socket server is now accepting connections (asyncio, limit {max_connections})")
+        loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.server.setblocking(False)
+        slots = asyncio.Semaphore(max_connections)
+        tasks = set()  # Keep references so running handlers are not garbage collected
+        while True:
+            await slots.acquire()
+            try:
+                conn, addr = await loop.sock_accept(self.server)
+            except Exception as e:
+                slots.release()
+                print(f"[ERROR] Exception accepting connection: {e}")
+                continue
+            task = loop.create_task(self.handle_client_async(conn, addr))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def handle_client_async(self, conn, addr):
+        """Event-loop version of handle_client"""
+        import asyncio
+        self.log(f"[INFO] New connection from {addr}")
+        loop = asyncio.get_running_loop()
         try:
-            self.history_canvas.delete("all")
-            
-            # Chart dimensions
-            padding = 40
-            width = self.history_canvas.winfo_width() - 2 * padding
-            height = self.history_canvas.winfo_height() - 2 * padding
-            
-            # Draw grid
-            for i in range(0, height + padding, 20):
-                y = padding + i
-                self.history_canvas.create_line(
-                    padding, y,
-                    width + padding, y,
-                    fill='#333333',
-                    dash=(1, 2)
-                )
-            
-            for i in range(0, width + padding, 40):
-                x = padding + i
-                self.history_canvas.create_line(
-                    x, padding,
-                    x, height + padding,
-                    fill='#333333',
-                    dash=(1, 2)
-                )
-            
-            # Draw axes
-            self.history_canvas.create_line(
-                padding, padding,
-                padding, height + padding,
-                fill='#666666',
-                width=2
-            )
-            self.history_canvas.create_line(
-                padding, height + padding,
-                width + padding, height + padding,
-                fill='#666666',
-                width=2
-            )
-            
-            # Draw RSSI scale (-30 to -90 dBm)
-            for rssi in range(-30, -91, -10):
-                y = padding + ((-30 - rssi) / 60.0) * height
-                self.history_canvas.create_line(
-                    padding - 5, y,
-                    padding, y,
-                    fill='#666666'
-                )
-                self.history_canvas.create_text(
-                    padding - 10, y,
-                    text=str(rssi),
-                    fill='#666666',
-                    anchor='e',
-                    font=('Courier', 8)
-                )
-            
-            # Plot data for each device
-            colors = {'#0066ff': 'blue', '#ff3333': 'red', '#00ff00': 'green', '#ff00ff': 'purple', '#ff9900': 'orange'}
-            legend_y = padding
-            
-            for i, (device, history) in enumerate(self.signal_history.items()):
-                if len(history) > 1:
-                    color = list(colors.keys())[i % len(colors)]
-                    points = []
-                    
-                    # Convert timestamps to x-coordinates
-                    newest_time = max(t for t, _ in history)
-                    oldest_time = newest_time - (self.history_max_points * 0.5)  # 5 minutes
-                    
-                    for timestamp, rssi in history:
-                        # Skip points older than our window
-                        if timestamp < oldest_time:
-                            continue
-                        
-                        x = padding + ((timestamp - oldest_time) / (newest_time - oldest_time)) * width
-                        y = padding + ((-30 - rssi) / 60.0) * height
-                        points.extend([x, y])
-                    
-                    if len(points) >= 4:
-                        # Draw line with slight glow effect
-                        for offset in [2, 1, 0]:
-                            self.history_canvas.create_line(
-                                points,
-                                fill=color,
-                                width=3-offset,
-                                smooth=True,
-                                stipple='gray50' if offset > 0 else ''
-                            )
-                    
-                    # Add device label to legend
-                    self.history_canvas.create_text(
-                        width + padding - 10,
-                        legend_y,
-                        text=device,
-                        fill=color,
-                        anchor='e',
-                        font=('Courier', 10)
-                    )
-                    legend_y += 20
-            
-            # Add time labels
-            current_time = time.strftime('%H:%M:%S')
-            self.history_canvas.create_text(
-                width + padding, height + padding + 15,
-                text=current_time,
-                fill='#666666',
-                anchor='e',
-                font=('Courier', 8)
-            )
-            
-            five_min_ago = time.strftime('%H:%M:%S', time.localtime(time.time() - 300))
-            self.history_canvas.create_text(
-                padding, height + padding + 15,
-                text=five_min_ago,
-                fill='#666666',
-                anchor='w',
-                font=('Courier', 8)
-            )
-            
+            conn.setblocking(False)
+            # Same 10 second limit as the threaded handler
+            data = await asyncio.wait_for(loop.sock_recv(conn, 1024), timeout=10)
+            if is_stream_hello(data):
+                await self.handle_stream_async(conn, addr, data)
+            elif is_federation_hello(data):
+                await self.handle_federation_async(conn, addr, data)
+            elif is_binary_hello(data):
+                await self.handle_binary_async(conn, addr, data)
+            else:
+                message = OneShotMessage(data)
+                while not message.complete:
+                    message.feed(await asyncio.wait_for(loop.sock_recv(conn, 65536), timeout=10))
+                reply = self.one_shot_reply(message, addr)
+                await self.ingest_room()
+                await loop.sock_sendall(conn, reply)
+                if message.too_large:
+                    conn.shutdown(socket.SHUT_WR)
+                    while await asyncio.wait_for(loop.sock_recv(conn, 65536), timeout=10):
+                        pass
+        except asyncio.TimeoutError:
+            print(f"[WARN] Connection from {addr} timed out")
         except Exception as e:
-            print(f"[ERROR] History chart update error: {e}")
+            print(f"[ERROR] Exception handling client {addr}: {e}")
+        finally:
+            conn.close()
+            self.log(f"[INFO] Connection from {addr} closed")
+
+    async def ingest_room(self):
+        """Wait for the ingest queue to have room, if it is "block" and full
+
+        Puts from the event loop do not wait themselves, which would stall
+        every connection. Handlers await this before reading more from
+        their client instead, so only the clients sending are held back.
+        """
+        if self.ingest is not None:
+            await self.ingest.room()
 
-    def update_ui(self):
-        """Update the UI with current device information"""
+    async def handle_stream_async(self, conn, addr, data):
+        """Event-loop version of handle_stream"""
+        import asyncio
+        self.log(f"[INFO] Stream session opened by {addr}")
+        loop = asyncio.get_running_loop()
+        stream = LineStream(lambda line: self.process_message(line, addr))
+        while data:
+            reply = stream.feed(data)
+            await self.ingest_room()
+            if reply:
+                await loop.sock_sendall(conn, reply)
+            data = await asyncio.wait_for(loop.sock_recv(conn, 65536), timeout=STREAM_IDLE_TIMEOUT)
+
+    async def handle_federation_async(self, conn, addr, data):
+        """Event-loop version of handle_federation"""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        reader = self.federation_reader(addr)
+        if reader is None:
+            await loop.sock_sendall(conn, b"ERROR: Not an aggregator\n")
+            return
+        while data:
+            reply = reader.feed(data)
+            if reply:
+                await loop.sock_sendall(conn, reply)
+            data = await asyncio.wait_for(loop.sock_recv(conn, 1 << 20), timeout=STREAM_IDLE_TIMEOUT)
+
+    async def handle_binary_async(self, conn, addr, data):
+        """Event-loop version of handle_binary"""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        stream = self.binary_stream(addr)
         try:
-            devices = self.rssi_server.get_devices()
-            current_time = time.time()
-            
-            # Update device list and history
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-            
-            for device_name, data in devices.items():
-                rssi = data["rssi"]
-                ip = data.get("ip", "Unknown")
-                distance = self.rssi_to_distance(rssi)
-                
-                # Update device list
-                self.tree.insert(
-                    "", 
-                    "end",
-                    values=(device_name, ip, f"{rssi} dBm", f"{distance}m")
-                )
-                
-                # Update signal history
-                if device_name not in self.signal_history:
-                    self.signal_history[device_name] = []
-                
-                self.signal_history[device_name].append((current_time, rssi))
-                
-                # Keep history within time window (5 minutes)
-                cutoff_time = current_time - 300  # 5 minutes ago
-                self.signal_history[device_name] = [
-                    (t, r) for t, r in self.signal_history[device_name]
-                    if t >= cutoff_time
-                ]
-            
-            # Update visualizations
-            self.update_device_positions(devices)
-            self.update_history_chart()
-            
-            # Update status bar
-            self.status_var.set(
-                f"Connected Devices: {len(devices)} | "
-                f"Last Updated: {time.strftime('%H:%M:%S')}"
-            )
-            
-        except Exception as e:
-            print(f"[ERROR] UI update error: {e}")
-            self.status_var.set("Error updating UI")
-        
-        # Schedule next update
-        self.root.after(1000, self.update_ui)  # Update every second
+            reply = stream.feed(data)
+            while True:
+                if reply:
+                    await loop.sock_sendall(conn, reply)
+                received = await asyncio.wait_for(loop.sock_recv_into(conn, stream.free()),
+                                                  timeout=STREAM_IDLE_TIMEOUT)
+                if not received:
+                    break
+                reply = stream.received(received)
+                await self.ingest_room()
+        except ValueError:
+            if stream.reject is not None:
+                await loop.sock_sendall(conn, stream.reject)
+            raise
+
+    def chart_points(self, device_name, start, end, columns):
+        """Up to two (timestamp, rssi) points per column for charting a device over start..end
+
+        From the raw samples while they reach back to start, otherwise from
+        the rollups, so the cost never grows with the readings in the window.
+        """
+        if end - start > self.history.window:
+            return self.rollups.minmax_points(device_name, start, end, columns)
+        samples = self.history.get(device_name)
+        if samples is None:
+            return []
+        return decimate_minmax(samples.view(since=start), start, end, columns)
 
-def main():
+    def connected(self, record, now=None):
+        """Whether a device has reported within the filter's offline_after seconds
+
+        This is about the device still reporting, not about its presence: a
+        device heard below online_rssi is present "offline" but connected.
+        """
+        offline_after = self.signal_filter.offline_after
+        if not offline_after:
+            return True
+        return (time.time() if now is None else now) - record.last_seen < offline_after
+
+    def get_devices(self):
+        """Return an immutable snapshot of the current devices dictionary"""
+        return self.registry.snapshot()
+
+    def expire(self):
+        """Mark silent devices offline or inactive and evict long-gone ones; returns (offline, inactive, evicted)
+
+        Evicted devices are dropped from history, rollups and the position
+        solver too. Their removal reaches subscribers through the change
+        log like any other.
+        """
+        offline, inactive, evicted = self.registry.expire()
+        for device_name in evicted:
+            self.history.remove(device_name)
+            self.rollups.remove(device_name)
+            self.positions.remove(device_name)
+        if self.registry.evict_after is not None:
+            # Devices only monitor nodes hear never reach the registry
+            self.positions.prune(time.time() - self.registry.evict_after)
+        if evicted:
+            if self.federation is not None:
+                self.federation.forget(evicted)
+            if self.follower is not None:
+                self.follower.forget(evicted, time.time() - self.registry.evict_after)
+            print(f"[INFO] Evicted {len(evicted)} devices silent for {self.registry.evict_after:g}s")
+        return offline, inactive, evicted
+
+    def get_devices_since(self, version):
+        """Return (version, changed, removed) for device writes after version"""
+        return self.registry.changes_since(version)
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until a device write after version (or timeout); returns the current version"""
+        return self.registry.wait_for_change(version, timeout)
+
+    @property
+    def version(self):
+        """Registry version, bumped on every device write"""
+        return self.registry.version
+
+    @property
+    def devices(self):
+        """Read-only view kept for callers of the old devices attribute"""
+        return self.registry.snapshot()
+
+def run_worker(index, host, port, table_name, locks, ingest_mode="threaded", max_connections=1000):
+    """Ingest worker process: serve the shared SO_REUSEPORT port, writing reports to the shared table"""
+    from shared_table import SharedDeviceTable
+    table = SharedDeviceTable(table_name, locks=locks)
+    server = RSSIServer(host=host, port=port, verbose=False, reuse_port=True, table=table)
+    print(f"[INFO] Ingest worker {index} running")
+    try:
+        if ingest_mode == "async":
+            server.start_async(max_connections)
+        else:
+            server.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        table.close()
+
+def main(ingest_mode="threaded", max_connections=1000, history_window=300, headless=False,
+         http_mode="pooled", http_workers=32, data_dir=None, fsync_interval=1.0,
+         queue_options=None, calibration_options=None, filter_options=None, sensors=None,
+         aggregate=False, forward_to=None, node_id=None, workers=0, table_slots=65536,
+         inactive_after=300.0, evict_after=3600.0, columnar=False):
     """Main function to start the entire system"""
-    local_ip = get_local_ip()
-    print("\n=== Network Configuration ===")
-    print(f"[INFO] Local IP address: {local_ip}")
-    
-    # Print all network interfaces
-    print("\n[DEBUG] Available Network Interfaces:")
-    for iface in socket.if_nameindex():
-        try:
-            addr = socket.gethostbyname(socket.gethostname())
-            print(f"[DEBUG] Interface {iface[1]}: {addr}")
-        except:
-            print(f"[DEBUG] Interface {iface[1]}: Unable to get address")
+    if workers and (aggregate or sensors):
+        # Worker processes only share device readings: federation sessions
+        # would land on workers without a merger, and sensor tags are lost
+        raise ValueError("--workers cannot be combined with --aggregate or --sensor")
+    # Network discovery can block for seconds on air-gapped hosts, so it runs
+    # in the background while the servers start
+    start_discovery()
+    threading.Thread(target=log_network_interfaces, daemon=True).start()
+    if flask_available():
+        print("[INFO] Flask found - web interface will be enabled")
     
     print("\n=== Starting Servers ===")
     
@@ -663,53 +612,191 @@ def main():
     socket_port = 5001  # Use a different port for the socket server
     web_port = 5000     # Use the standard port for web
     
-    rssi_server = RSSIServer(port=socket_port)
+    if calibration_options:
+        calibration.configure(**calibration_options)
+        print(f"[INFO] Distance calibration: {calibration_options}")
+    
+    store = None
+    if data_dir:
+        from reading_store import ReadingStore
+        store = ReadingStore(data_dir, flush_interval=fsync_interval)
+        store.start()
+        print(f"[INFO] Storing readings in {data_dir} (fsync every {fsync_interval:g}s)")
+    
+    ingest = None
+    if queue_options is not None:
+        from ingest_queue import IngestQueue
+        ingest = IngestQueue(**queue_options)
+        print(f"[INFO] Write-behind ingest queue: {queue_options}")
+    
+    signal_filter = SignalFilter(**(filter_options or {}))
+    print(f"[INFO] Smoothing RSSI with {signal_filter.describe()}, offline after "
+          f"{signal_filter.offline_after:g}s of silence")
+    print(f"[INFO] Silent devices go inactive after {inactive_after:g}s and are evicted after "
+          f"{evict_after:g}s (0 = never)")
+    
+    table = None
+    if workers:
+        # Worker processes own the socket port; this process serves HTTP and the UI
+        from shared_table import SharedDeviceTable
+        table = SharedDeviceTable(slots=table_slots)
+        print(f"[INFO] Shared device table {table.name}: {table.slots} slots")
+    
+    rssi_server = RSSIServer(port=None if workers else socket_port, history_window=history_window, store=store,
+                             ingest=ingest, signal_filter=signal_filter, sensors=sensors,
+                             inactive_after=inactive_after or None, evict_after=evict_after or None,
+                             columnar=columnar)
+    if sensors:
+        print(f"[INFO] Locating devices with {len(sensors)} sensors besides this server: {sensors}")
+    if ingest is not None:
+        ingest.start()
+    if aggregate:
+        rssi_server.accept_federation()
+    if forward_to:
+        from federation import Forwarder
+        host, _, port = forward_to.rpartition(":")
+        Forwarder(rssi_server, host, int(port), node_id or socket.gethostname()).start()
     
     # Start the HTTP server in a separate thread with the same server instance
     print(f"[INFO] Starting web interface on port {web_port}...")
+    from http_api import start_http_server
     web_thread = threading.Thread(
         target=start_http_server,
-        args=('0.0.0.0', web_port, rssi_server),
+        args=('0.0.0.0', web_port, rssi_server, http_mode, http_workers),
         daemon=True
     )
     web_thread.start()
     
-    # Start socket server in a separate thread
-    print(f"[INFO] Starting socket server on port {socket_port}...")
-    server_thread = threading.Thread(target=rssi_server.start)
-    server_thread.daemon = True
-    server_thread.start()
-    
-    # Start the UI with the same server instance
-    print("[INFO] Starting UI...")
-    root = tk.Tk()
-    app = RSSIMonitorUI(root, rssi_server)
-    
-    # Add IP address information to the UI with instructions for web access
-    web_instructions = f"Web Interface: http://{local_ip}:{web_port}"
-    socket_instructions = f"Socket Server: {local_ip}:{socket_port}"
-    
-    info_frame = ttk.Frame(root)
-    info_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=5)
-    
-    ttk.Label(
-        info_frame,
-        text=web_instructions,
-        font=("Arial", 10)
-    ).pack(side=tk.TOP, anchor=tk.W)
+    if workers:
+        import multiprocessing
+        from shared_table import TableFollower
+        print(f"[INFO] Starting {workers} ingest worker processes on port {socket_port} ({ingest_mode} mode)...")
+        context = multiprocessing.get_context("spawn")
+        for index in range(workers):
+            context.Process(
+                target=run_worker,
+                args=(index, '0.0.0.0', socket_port, table.name, table.locks, ingest_mode, max_connections),
+                daemon=True
+            ).start()
+        rssi_server.follower = TableFollower(table, rssi_server)
+        rssi_server.follower.start()
+    else:
+        # Start socket server in a separate thread
+        print(f"[INFO] Starting socket server on port {socket_port} ({ingest_mode} mode)...")
+        if ingest_mode == "async":
+            server_thread = threading.Thread(target=rssi_server.start_async, args=(max_connections,))
+        else:
+            server_thread = threading.Thread(target=rssi_server.start)
+        server_thread.daemon = True
+        server_thread.start()
     
-    ttk.Label(
-        info_frame,
-        text=socket_instructions,
-        font=("Arial", 10)
-    ).pack(side=tk.TOP, anchor=tk.W)
+    # Publish device changes and fleet aggregates; the UI is only a subscriber
+    feed = ChangeFeed(rssi_server, log_interval=10 if headless else None)
     
-    # Start the UI main loop
-    root.mainloop()
+    try:
+        if headless:
+            print("[INFO] Running headless, press Ctrl+C to stop")
+            feed.run()
+            return
+        
+        feed.start()
+        
+        # Tk is only imported when there is a UI to show
+        from monitor_ui import run_ui
+        local_ip = get_local_ip()
+        run_ui(rssi_server, feed, (
+            f"Web Interface: http://{local_ip}:{web_port}",
+            f"Socket Server: {local_ip}:{socket_port}",
+        ))
+    finally:
+        if ingest is not None:
+            ingest.stop()  # Hand what is still queued to the registry and store
+        if store is not None:
+            store.close()  # Write out the last readings before exiting
+        if table is not None:
+            table.close()
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Wi-Fi RSSI monitor server")
+    parser.add_argument("--ingest", choices=["threaded", "async"], default="threaded",
+                        help="socket ingest engine: thread per connection or one asyncio event loop")
+    parser.add_argument("--max-connections", type=int, default=1000,
+                        help="concurrent client limit for the asyncio ingest engine")
+    parser.add_argument("--history-window", type=int, default=300,
+                        help="seconds of signal history kept and charted, e.g. 3600 or 86400")
+    parser.add_argument("--headless", action="store_true",
+                        help="run ingest and the web interface without the Tk window")
+    parser.add_argument("--http", choices=["pooled", "simple"], default="pooled",
+                        help="HTTP server: keep-alive with a worker pool, or one request at a time")
+    parser.add_argument("--http-workers", type=int, default=32,
+                        help="worker threads for the pooled HTTP server")
+    parser.add_argument("--data-dir",
+                        help="keep every reading on disk here and restore devices from it at startup")
+    parser.add_argument("--fsync-interval", type=float, default=1.0,
+                        help="seconds between flushes of stored readings (at most this much is lost in a crash)")
+    parser.add_argument("--write-behind", action="store_true",
+                        help="only queue readings while handling clients; apply them in batches")
+    parser.add_argument("--queue-size", type=int, default=100000,
+                        help="readings the write-behind queue holds before its overflow policy applies")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="readings applied per write-behind batch")
+    parser.add_argument("--flush-interval", type=float, default=0.05,
+                        help="longest a reading waits in the write-behind queue when traffic is light")
+    parser.add_argument("--overflow", choices=["block", "drop", "sample"], default="block",
+                        help="when the queue is full: wait for room, drop the reading, or keep a sample")
+    parser.add_argument("--distance-model", choices=["buckets", "log"], default="buckets",
+                        help="RSSI to distance: fixed table, or log-distance path-loss model")
+    parser.add_argument("--tx-power", type=float, default=-50.0,
+                        help="RSSI measured at 1 m, for the log distance model")
+    parser.add_argument("--path-loss-exponent", type=float, default=4.0,
+                        help="path-loss exponent for the log distance model (2 free space, 3-4 indoors)")
+    parser.add_argument("--smoothing", choices=["ewma", "kalman"], default="ewma",
+                        help="per-device RSSI filter: moving average, or 1-D Kalman filter")
+    parser.add_argument("--alpha", type=float, default=0.3,
+                        help="weight of each new reading in the moving average")
+    parser.add_argument("--online-after", type=int, default=1,
+                        help="consecutive readings before an offline device counts as online")
+    parser.add_argument("--offline-after", type=float, default=30.0,
+                        help="seconds of silence before a device counts as offline")
+    parser.add_argument("--inactive-after", type=float, default=300.0,
+                        help="seconds of silence before a device is marked inactive (0 never)")
+    parser.add_argument("--evict-after", type=float, default=3600.0,
+                        help="seconds of silence before a device is forgotten (0 never)")
+    parser.add_argument("--columnar", action="store_true",
+                        help="keep device records in typed arrays: less memory for very large fleets")
+    parser.add_argument("--sensor", action="append", type=parse_sensor, default=[], metavar="ID=X,Y",
+                        help="position in meters of a monitor node sending 'sensor|ID|...' reports; repeatable")
+    parser.add_argument("--aggregate", action="store_true",
+                        help="accept device deltas forwarded by edge servers on the socket port")
+    parser.add_argument("--forward", metavar="HOST:PORT",
+                        help="forward this server's devices to an aggregator's socket port")
+    parser.add_argument("--node-id",
+                        help="name of this edge server at the aggregator (default: host name)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="ingest in this many processes sharing the socket port (SO_REUSEPORT); "
+                             "not with --aggregate or --sensor")
+    parser.add_argument("--table-slots", type=int, default=65536,
+                        help="devices the shared-memory table used by --workers can hold")
+    args = parser.parse_args()
+    if args.workers and (args.aggregate or args.sensor):
+        parser.error("--workers cannot be combined with --aggregate or --sensor")
+    queue_options = None
+    if args.write_behind:
+        queue_options = dict(max_readings=args.queue_size, batch_size=args.batch_size,
+                             flush_interval=args.flush_interval, overflow=args.overflow)
+    calibration_options = None
+    if args.distance_model != "buckets":
+        calibration_options = dict(distance_model=args.distance_model, tx_power=args.tx_power,
+                                   exponent=args.path_loss_exponent)
+    filter_options = dict(mode=args.smoothing, alpha=args.alpha, online_after=args.online_after,
+                          offline_after=args.offline_after)
     try:
-        main()
+        main(args.ingest, args.max_connections, args.history_window, args.headless,
+             args.http, args.http_workers, args.data_dir, args.fsync_interval, queue_options,
+             calibration_options, filter_options, dict(args.sensor), args.aggregate, args.forward,
+             args.node_id, args.workers, args.table_slots, args.inactive_after, args.evict_after,
+             args.columnar)
     except KeyboardInterrupt:
         print("[INFO] Application shutting down...")
     except Exception as e:
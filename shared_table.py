@@ -0,0 +1,341 @@
+"""Fixed-slot device table in shared memory, written by ingest worker processes
+
+Layout of the shared block:
+
+    header           magic, layout version, slots, stripes (16 bytes)
+    stripe counters  one uint64 per stripe: readings written to it so far
+    rejected         one uint64 per stripe: readings it had no room for
+    used             one uint64 per stripe: slots taken
+    slots            SLOT.size bytes each
+
+A device name hashes (crc32) to one stripe, a contiguous run of slots, and
+is placed by linear probing within it. Removing a device leaves a
+tombstone, so lookups keep probing past it; a new device takes the first
+tombstone on its probe path, so the probe path is the stripe's free list.
+Writers take the stripe's lock (a multiprocessing.Lock shared by all
+workers), so two workers reporting the same device, or claiming the same
+free slot, never interleave. Readers
+take no lock: every slot starts with a sequence number that a writer makes
+odd before changing the slot and even again after, so a reader that sees
+the same even number before and after copying a slot has a consistent
+copy (a seqlock). This relies on stores becoming visible in program order,
+which holds on x86; struct.pack_into writes each field with one memcpy.
+"""
+import socket
+import struct
+import time
+import zlib
+from array import array
+
+from background import BackgroundThread
+from protocol import clamp_rssi
+
+HEADER = struct.Struct("<4sIII")
+MAGIC = b"RSTB"
+LAYOUT = 3
+COUNTER = struct.Struct("<Q")
+SEQ = struct.Struct("<I")
+SEQ_MASK = 0xFFFFFFFF  # Sequence numbers wrap; even and odd still alternate
+# seq, rssi, name length, flags, last_seen, IPv4 as an int, name; padded to 96 bytes
+SLOT = struct.Struct("<IhBBdI64s12x")
+NAME_SIZE = 64
+USED = 1
+TOMBSTONE = 2  # Freed: probing goes on past it, and a new device may take it
+WARN_FILL = 0.9  # Warn once any stripe is this full; devices are rejected when one is
+
+
+class SharedDeviceTable:
+    """Latest reading per device in a multiprocessing.shared_memory block
+
+    Create it in the parent (name=None), then attach in each worker with
+    SharedDeviceTable(table.name, locks=table.locks), passing the locks
+    when the worker process is started. The locks come from the "spawn"
+    context, so workers can be started with it (the parent usually has
+    threads running, which makes fork unsafe). Not resizable: slots is fixed at
+    creation and a stripe that fills up rejects new devices. Slots are
+    freed by remove_many, called for the devices the parent evicts.
+    Rejections are counted in the shared block, so rejected is the total
+    over every process.
+    """
+
+    def __init__(self, name=None, slots=65536, stripes=256, locks=None):
+        # Heavy enough to import only when ingest workers are used
+        import multiprocessing
+        from multiprocessing import shared_memory
+        if name is None:
+            slots = max(stripes, slots // stripes * stripes)
+            size = HEADER.size + 3 * stripes * COUNTER.size + slots * SLOT.size
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+            HEADER.pack_into(self.memory.buf, 0, MAGIC, LAYOUT, slots, stripes)
+            context = multiprocessing.get_context("spawn")
+            self.locks = [context.Lock() for _ in range(stripes)]
+            self.owner = True
+        else:
+            # Spawned workers share the creator's resource tracker, so attaching
+            # registers nothing new and only the creator's unlink() frees the block
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.locks = locks
+            self.owner = False
+        magic, layout, self.slots, self.stripes = HEADER.unpack_from(self.memory.buf, 0)
+        if magic != MAGIC or layout != LAYOUT:
+            raise ValueError(f"Shared memory block {self.memory.name} is not a device table")
+        self.name = self.memory.name
+        self.buf = self.memory.buf
+        self.stripe_slots = self.slots // self.stripes
+        self.counters_at = HEADER.size
+        self.rejected_at = self.counters_at + self.stripes * COUNTER.size
+        self.used_at = self.rejected_at + self.stripes * COUNTER.size
+        self.slots_at = self.used_at + self.stripes * COUNTER.size
+        self.index = {}  # {device_name: slot}, this process's cache of placements
+
+    def _offset(self, slot):
+        return self.slots_at + slot * SLOT.size
+
+    def _find(self, name, stripe):
+        # Caller holds the stripe lock. Returns the slot holding name or the
+        # first free one on its probe path, and whether it is free; None if full.
+        buf = self.buf
+        first = stripe * self.stripe_slots
+        home = zlib.crc32(name) // self.stripes % self.stripe_slots
+        reuse = None
+        for probe in range(self.stripe_slots):
+            slot = first + (home + probe) % self.stripe_slots
+            _, _, length, flags, _, _, stored = SLOT.unpack_from(buf, self._offset(slot))
+            if flags & USED:
+                if stored[:length] == name:
+                    return slot, False
+            elif flags & TOMBSTONE:
+                if reuse is None:
+                    reuse = slot
+            else:
+                return (slot if reuse is None else reuse), True  # Never used: name is not further on
+        return reuse, reuse is not None
+
+    def _holds(self, slot, name):
+        # Caller holds the stripe lock
+        _, _, length, flags, _, _, stored = SLOT.unpack_from(self.buf, self._offset(slot))
+        return flags & USED and stored[:length] == name
+
+    def _write_slot(self, slot, *fields):
+        # Caller holds the stripe lock. Odd while the slot is being written,
+        # even again once it is consistent
+        buf = self.buf
+        offset = self.slots_at + slot * SLOT.size
+        seq = SEQ.unpack_from(buf, offset)[0]
+        SEQ.pack_into(buf, offset, (seq + 1) & SEQ_MASK)
+        SLOT.pack_into(buf, offset, (seq + 1) & SEQ_MASK, *fields)
+        SEQ.pack_into(buf, offset, (seq + 2) & SEQ_MASK)
+
+    def _add(self, at, stripe, amount):
+        # Caller holds the stripe lock
+        at += stripe * COUNTER.size
+        COUNTER.pack_into(self.buf, at, COUNTER.unpack_from(self.buf, at)[0] + amount)
+
+    def update_many(self, readings, ip, now=None):
+        """Write [(device_name, rssi), ...] from one address
+
+        Returns the set of names that could not be stored, because their
+        stripe is full or they are longer than NAME_SIZE bytes; usually empty.
+        """
+        if now is None:
+            now = time.time()
+        try:
+            packed_ip = struct.unpack('!I', socket.inet_aton(ip))[0]
+        except OSError:
+            packed_ip = 0
+        by_stripe = {}
+        for device_name, rssi in readings:
+            name = device_name.encode()
+            by_stripe.setdefault(zlib.crc32(name) % self.stripes, []).append((device_name, name, rssi))
+        rejected = set()
+        for stripe, items in by_stripe.items():
+            with self.locks[stripe]:
+                for device_name, name, rssi in items:
+                    slot = self.index.get(device_name)
+                    if slot is not None and not self._holds(slot, name):
+                        slot = None  # Freed by remove_many, maybe taken by another device since
+                    if slot is None:
+                        slot, free = self._find(name, stripe) if len(name) <= NAME_SIZE else (None, False)
+                        if slot is None:
+                            rejected.add(device_name)
+                            self._add(self.rejected_at, stripe, 1)
+                            continue
+                        if free:
+                            self._add(self.used_at, stripe, 1)
+                        self.index[device_name] = slot
+                    self._write_slot(slot, clamp_rssi(rssi), len(name), USED, now, packed_ip, name)
+                self._add(self.counters_at, stripe, len(items))
+        return rejected
+
+    def remove_many(self, device_names, before=None):
+        """Free the slots of device_names, leaving tombstones; returns the names removed
+
+        With before, a device is only removed if it has not been written
+        since then, so a worker's fresh reading is never thrown away.
+        """
+        by_stripe = {}
+        for device_name in device_names:
+            name = device_name.encode()
+            by_stripe.setdefault(zlib.crc32(name) % self.stripes, []).append((device_name, name))
+        removed = []
+        for stripe, items in by_stripe.items():
+            with self.locks[stripe]:
+                for device_name, name in items:
+                    self.index.pop(device_name, None)
+                    if len(name) > NAME_SIZE:
+                        continue
+                    slot, free = self._find(name, stripe)
+                    if slot is None or free:
+                        continue
+                    last_seen = SLOT.unpack_from(self.buf, self._offset(slot))[4]
+                    if before is not None and last_seen >= before:
+                        continue
+                    self._write_slot(slot, 0, 0, TOMBSTONE, 0.0, 0, b"")
+                    self._add(self.used_at, stripe, -1)
+                    removed.append(device_name)
+        return removed
+
+    def read(self, slot):
+        """Consistent (seq, device_name, rssi, last_seen, ip) of a slot, or None if it is free"""
+        buf = self.buf
+        offset = self._offset(slot)
+        for _ in range(100000):
+            seq, rssi, length, flags, last_seen, packed_ip, name = SLOT.unpack_from(buf, offset)
+            if not seq & 1 and SEQ.unpack_from(buf, offset)[0] == seq:
+                break
+            time.sleep(0)  # A writer is mid-update; let it finish
+        else:
+            raise RuntimeError(f"Slot {slot} stuck mid-write (a worker died while writing it?)")
+        if not flags & USED:
+            return None
+        ip = socket.inet_ntoa(struct.pack('!I', packed_ip)) if packed_ip else ""
+        return seq, name[:length].decode(), rssi, last_seen, ip
+
+    def sequences(self, stripe):
+        """Sequence numbers of one stripe's slots, without copying the slots"""
+        first = stripe * self.stripe_slots
+        return [SEQ.unpack_from(self.buf, self._offset(slot))[0]
+                for slot in range(first, first + self.stripe_slots)]
+
+    def _counters(self, at):
+        counters = array('Q')
+        counters.frombytes(self.buf[at:at + self.stripes * COUNTER.size])
+        return counters
+
+    def stripe_counters(self):
+        """Readings written to each stripe so far"""
+        return self._counters(self.counters_at)
+
+    @property
+    def rejected(self):
+        """Readings no worker had room for, in total"""
+        return sum(self._counters(self.rejected_at))
+
+    @property
+    def used(self):
+        """Slots taken, in total"""
+        return sum(self._counters(self.used_at))
+
+    def fullest_stripe(self):
+        """Share of the slots taken in the fullest stripe, where rejections start"""
+        return max(self._counters(self.used_at)) / self.stripe_slots
+
+    def get(self, device_name):
+        """(device_name, rssi, last_seen, ip) for one device, or None"""
+        name = device_name.encode()
+        stripe = zlib.crc32(name) % self.stripes
+        first = stripe * self.stripe_slots
+        home = zlib.crc32(name) // self.stripes % self.stripe_slots
+        for probe in range(self.stripe_slots):
+            slot = first + (home + probe) % self.stripe_slots
+            flags = SLOT.unpack_from(self.buf, self._offset(slot))[3]
+            if not flags & (USED | TOMBSTONE):
+                return None  # Never used, so the device is not further on
+            reading = self.read(slot)
+            if reading is not None and reading[1] == device_name:
+                return reading[1:]
+        return None
+
+    def close(self):
+        self.buf = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class TableFollower(BackgroundThread):
+    """Copies what ingest workers write into a SharedDeviceTable into an RSSIServer
+
+    Every interval it compares the table's per-stripe counters with the
+    last ones it saw and only walks the stripes that moved, picking the
+    slots whose sequence number changed. The readings are merged with
+    RSSIServer.merge_readings, so the registry, history, rollups, store
+    and everything serving HTTP and the UI see them as usual.
+    """
+
+    def __init__(self, table, rssi_server, interval=0.05, capacity_interval=10.0):
+        self.table = table
+        self.rssi_server = rssi_server
+        self.interval = interval
+        self.capacity_interval = capacity_interval
+        self.rejected = 0  # Table total at the last capacity check
+        self.filling = False
+        self.counters = array('Q', [0]) * table.stripes
+        self.seen = array('I', [0]) * table.slots  # Last sequence number merged per slot
+
+    def poll(self):
+        """Merge every slot changed since the last poll; returns how many"""
+        table = self.table
+        readings = []
+        counters = table.stripe_counters()
+        for stripe in range(table.stripes):
+            if counters[stripe] == self.counters[stripe]:
+                continue
+            settled = True
+            first = stripe * table.stripe_slots
+            for offset, seq in enumerate(table.sequences(stripe)):
+                slot = first + offset
+                if seq == self.seen[slot]:
+                    continue
+                if seq & 1:
+                    settled = False  # Mid-write: look at this stripe again next time
+                    continue
+                reading = table.read(slot)
+                self.seen[slot] = seq if reading is None else reading[0]
+                if reading is not None:
+                    readings.append(reading[1:])
+            if settled:
+                self.counters[stripe] = counters[stripe]
+        if readings:
+            self.rssi_server.merge_readings(readings)
+        return len(readings)
+
+    def forget(self, device_names, before):
+        """Free the table slots of devices the server has evicted, unless written since before"""
+        return self.table.remove_many(device_names, before)
+
+    def check_capacity(self):
+        """Warn when the table is close to full or has rejected readings since the last check"""
+        table = self.table
+        rejected, fill = table.rejected, table.fullest_stripe()
+        usage = f"{table.used}/{table.slots} slots used, fullest stripe {fill:.0%}"
+        if rejected > self.rejected:
+            print(f"[WARN] Shared device table full: {rejected - self.rejected} readings rejected "
+                  f"({usage}); restart with a larger --table-slots")
+        elif fill >= WARN_FILL and not self.filling:
+            print(f"[WARN] Shared device table filling up: {usage}")
+        self.rejected = rejected
+        self.filling = fill >= WARN_FILL
+
+    def run(self):
+        """Poll the table every interval seconds and check its fill now and then"""
+        next_check = time.time() + self.capacity_interval
+        while True:
+            try:
+                self.poll()
+                if time.time() >= next_check:
+                    next_check = time.time() + self.capacity_interval
+                    self.check_capacity()
+            except Exception as e:
+                print(f"[ERROR] Shared table follower error: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,82 @@
+ONLINE = "online"
+OFFLINE = "offline"
+
+
+class SignalFilter:
+    """Smooths each device's RSSI as it is written and tracks whether it is present
+
+    The state lives on the DeviceRecord itself (smoothed, variance, streak,
+    presence), so it is O(1) per device and is updated under the registry
+    shard lock that already guards the record.
+
+    mode "ewma" is an exponentially weighted moving average with weight
+    alpha for each new reading. mode "kalman" is a 1-D Kalman filter with
+    a constant-signal model: the estimate's variance grows by
+    process_noise per second between readings and each reading has
+    variance measurement_noise, so a device that was silent for a while
+    snaps to its new reading while a chatty one is smoothed hard.
+
+    Presence has hysteresis in both level and time. An offline device goes
+    online after online_after consecutive readings, no more than
+    offline_after seconds apart, with the smoothed RSSI at or above
+    online_rssi. An online device goes offline when the smoothed RSSI falls
+    below offline_rssi, or when it has been silent for offline_after
+    seconds (see DeviceRegistry.expire).
+    """
+
+    def __init__(self, mode="ewma", alpha=0.3, process_noise=1.0, measurement_noise=16.0,
+                 online_rssi=-90, offline_rssi=-95, online_after=1, offline_after=30.0):
+        if mode not in ("ewma", "kalman"):
+            raise ValueError("mode must be 'ewma' or 'kalman'")
+        if offline_rssi > online_rssi:
+            raise ValueError("offline_rssi must not be above online_rssi")
+        self.mode = mode
+        self.alpha = alpha
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.online_rssi = online_rssi
+        self.offline_rssi = offline_rssi
+        self.online_after = max(1, online_after)
+        self.offline_after = offline_after
+
+    def first(self, record):
+        """Start the state of a record created from its first reading"""
+        record.smoothed = float(record.rssi)
+        record.variance = self.measurement_noise
+        record.streak = 1
+        record.presence = ONLINE if self.online_after == 1 and record.rssi >= self.online_rssi else OFFLINE
+
+    def step(self, record, rssi, now):
+        """Fold in a new reading; call before the record itself is updated"""
+        elapsed = now - record.last_seen
+        if self.mode == "kalman":
+            variance = record.variance + self.process_noise * max(0.0, elapsed)
+            gain = variance / (variance + self.measurement_noise)
+            smoothed = record.smoothed + gain * (rssi - record.smoothed)
+            record.variance = (1 - gain) * variance
+        else:
+            smoothed = record.smoothed + self.alpha * (rssi - record.smoothed)
+        record.smoothed = smoothed
+        if record.presence == ONLINE:
+            if smoothed < self.offline_rssi:
+                record.presence = OFFLINE
+                record.streak = 0
+        else:
+            # A gap longer than offline_after starts the count again
+            streak = record.streak + 1 if elapsed <= self.offline_after else 1
+            if smoothed < self.online_rssi:
+                streak = 0
+            elif streak >= self.online_after:
+                record.presence = ONLINE
+            record.streak = streak
+
+    def expire(self, record):
+        """Mark a silent record offline"""
+        record.presence = OFFLINE
+        record.streak = 0
+
+    def describe(self):
+        if self.mode == "kalman":
+            return f"kalman (q={self.process_noise:g}/s, r={self.measurement_noise:g})"
+        return f"ewma (alpha={self.alpha:g})"
+
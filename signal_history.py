@@ -0,0 +1,195 @@
+import threading
+from array import array
+
+from protocol import clamp_rssi
+
+
+class RingBuffer:
+    """Fixed-capacity time series of (timestamp, rssi) samples
+
+    Samples live in two preallocated arrays that are written round-robin.
+    Appending is O(1) and never allocates; dropping old samples only moves
+    the head pointer. view() hands out memoryviews over the arrays, so
+    plotting code can read (or numpy.frombuffer) the data without copying.
+    """
+
+    __slots__ = ("capacity", "times", "values", "start", "count")
+
+    def __init__(self, capacity=300):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('h', bytes(2 * capacity))
+        self.start = 0  # Physical index of the oldest sample
+        self.count = 0
+
+    def append(self, timestamp, rssi):
+        """Add a sample, overwriting the oldest one when full"""
+        if self.count:
+            # Keep timestamps sorted even if writer threads race slightly
+            timestamp = max(timestamp, self.times[(self.start + self.count - 1) % self.capacity])
+        if self.count == self.capacity:
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+        else:
+            index = (self.start + self.count) % self.capacity
+            self.count += 1
+        self.times[index] = timestamp
+        self.values[index] = clamp_rssi(rssi)
+
+    def _first_at_or_after(self, cutoff):
+        # Binary search over logical positions; samples are in time order
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[(self.start + mid) % self.capacity] < cutoff:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def trim(self, cutoff):
+        """Drop samples older than cutoff by advancing the head pointer"""
+        dropped = self._first_at_or_after(cutoff)
+        self.start = (self.start + dropped) % self.capacity
+        self.count -= dropped
+
+    def view(self, since=None):
+        """Return [(times, values), ...] memoryview segments, oldest first
+
+        There are two segments when the live window wraps around the end of
+        the arrays. With since, samples older than that time are left out.
+        The views share memory with the buffer, so a concurrent append may
+        change what they show; copy them if that matters.
+        """
+        skip = 0 if since is None else self._first_at_or_after(since)
+        first = (self.start + skip) % self.capacity
+        remaining = self.count - skip
+        times = memoryview(self.times)
+        values = memoryview(self.values)
+        segments = []
+        while remaining > 0:
+            end = min(first + remaining, self.capacity)
+            segments.append((times[first:end], values[first:end]))
+            remaining -= end - first
+            first = 0
+        return segments
+
+    def points(self, since=None):
+        """Yield (timestamp, rssi) pairs, oldest first"""
+        for times, values in self.view(since):
+            yield from zip(times, values)
+
+    def latest(self):
+        """Return the newest (timestamp, rssi), or None if empty"""
+        if not self.count:
+            return None
+        index = (self.start + self.count - 1) % self.capacity
+        return self.times[index], self.values[index]
+
+    def __len__(self):
+        return self.count
+
+
+def decimate_minmax(segments, start, end, columns):
+    """Reduce samples to at most two per pixel column, keeping the extremes
+
+    segments is what RingBuffer.view() returns. The time range start..end is
+    split into columns buckets and each bucket keeps only its lowest and
+    highest reading, in time order, so spikes survive but the number of
+    points no longer depends on how many samples the window holds.
+    Returns a list of (timestamp, rssi) pairs.
+    """
+    points = []
+    if columns < 1 or end <= start:
+        return points
+    scale = columns / (end - start)
+    column = None
+    low = high = None
+    for times, values in segments:
+        for timestamp, rssi in zip(times, values):
+            index = int((timestamp - start) * scale)
+            if index != column:
+                if low is not None:
+                    _add_column(points, low, high)
+                column = index
+                low = high = (timestamp, rssi)
+            elif rssi < low[1]:
+                low = (timestamp, rssi)
+            elif rssi > high[1]:
+                high = (timestamp, rssi)
+    if low is not None:
+        _add_column(points, low, high)
+    return points
+
+
+def _add_column(points, low, high):
+    if low is high:
+        points.append(low)
+    elif low[0] <= high[0]:
+        points.extend((low, high))
+    else:
+        points.extend((high, low))
+
+
+class SignalHistory:
+    """Per-device RSSI history, recorded as reports arrive
+
+    Each device gets a RingBuffer. Samples older than window seconds are
+    trimmed on append, so no periodic sweep over all devices is needed.
+    """
+
+    def __init__(self, window=300, capacity=300):
+        self.window = window
+        self.capacity = capacity
+        self.buffers = {}  # {device_name: RingBuffer}
+        self.lock = threading.Lock()
+        self.version = 0  # Bumped on every change, so readers can skip redraws
+
+    def record(self, device_name, timestamp, rssi):
+        """Append one sample for a device"""
+        with self.lock:
+            buffer = self.buffers.get(device_name)
+            if buffer is None:
+                buffer = self.buffers[device_name] = RingBuffer(self.capacity)
+            buffer.append(timestamp, rssi)
+            buffer.trim(timestamp - self.window)
+            self.version += 1
+
+    def record_many(self, readings, timestamp):
+        """Append [(device_name, rssi), ...] taken at the same time"""
+        cutoff = timestamp - self.window
+        with self.lock:
+            for device_name, rssi in readings:
+                buffer = self.buffers.get(device_name)
+                if buffer is None:
+                    buffer = self.buffers[device_name] = RingBuffer(self.capacity)
+                buffer.append(timestamp, rssi)
+                buffer.trim(cutoff)
+            self.version += 1
+
+    def record_batch(self, batch):
+        """Append samples from [(readings, ip, timestamp), ...] groups under one lock"""
+        with self.lock:
+            for readings, _, timestamp in batch:
+                cutoff = timestamp - self.window
+                for device_name, rssi in readings:
+                    buffer = self.buffers.get(device_name)
+                    if buffer is None:
+                        buffer = self.buffers[device_name] = RingBuffer(self.capacity)
+                    buffer.append(timestamp, rssi)
+                    buffer.trim(cutoff)
+            self.version += 1
+
+    def get(self, device_name):
+        """Return the RingBuffer for a device, or None"""
+        return self.buffers.get(device_name)
+
+    def remove(self, device_name):
+        with self.lock:
+            self.buffers.pop(device_name, None)
+            self.version += 1
+
+    def items(self):
+        """Return a list of (device_name, RingBuffer) pairs"""
+        with self.lock:
+            return list(self.buffers.items())
@@ -0,0 +1,191 @@
+import threading
+
+import pytest
+
+from binary_protocol import (ACK, ACK_BODY, DEFINE, FRAME, HELLO, HELLO_OK, HELLO_REFUSED, HELLO_REPLY,
+                             HELLO_UNSUPPORTED, ID_FORMATS, READING_FORMATS, READINGS, VERSION, BinaryEncoder,
+                             BinaryStream, binary_hello, valid_name)
+from client import BinaryReportStream
+from protocol import BINARY_MAGIC
+from rssi_monitor import RSSIServer
+
+READINGS_SENT = [(f"device-{i}", -40 - i % 60) for i in range(3000)]
+
+
+def session(ack="batch", id_width=2):
+    encoder = BinaryEncoder(id_width)
+    data = binary_hello(ack, id_width)
+    for first in range(0, len(READINGS_SENT), 500):
+        data += encoder.encode(READINGS_SENT[first:first + 500])
+    return data
+
+
+def acks(replies):
+    # Split what the server sent after its hello reply into (ok, total) pairs
+    assert HELLO_REPLY.unpack_from(replies) == (BINARY_MAGIC, VERSION, HELLO_OK)
+    at, found = HELLO_REPLY.size, []
+    while at < len(replies):
+        kind, _, _, length = FRAME.unpack_from(replies, at)
+        assert kind == ACK and length == ACK_BODY.size
+        found.append(ACK_BODY.unpack_from(replies, at + FRAME.size))
+        at += FRAME.size + length
+    return found
+
+
+def collecting_stream():
+    got = []
+    return BinaryStream(lambda readings, sensor: got.extend(readings)), got
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 8, 9, 1000, 65536])
+def test_feed_across_chunk_boundaries(chunk):
+    stream, got = collecting_stream()
+    data = session("each")
+    replies = b"".join(stream.feed(data[i:i + chunk]) for i in range(0, len(data), chunk))
+    assert got == READINGS_SENT
+    assert acks(replies) == [(500, 500)] * 6
+
+
+@pytest.mark.parametrize("chunk", [5, 4096])
+def test_received_in_place(chunk):
+    stream, got = collecting_stream()
+    data = session("batch", id_width=4)
+    replies = []
+    for i in range(0, len(data), chunk):
+        piece = data[i:i + chunk]
+        free = stream.free()
+        free[:len(piece)] = piece  # What sock.recv_into(free) would do
+        replies.append(stream.received(len(piece)))
+    assert got == READINGS_SENT
+    assert sum(total for _, total in acks(b"".join(replies))) == len(READINGS_SENT)
+
+
+def test_ack_counts_what_the_handler_stored():
+    stream = BinaryStream(lambda readings, sensor: len(readings) - 1)
+    replies = stream.feed(binary_hello("each") + BinaryEncoder().encode([("a", -50), ("b", -60)]))
+    assert acks(replies) == [(1, 2)]
+
+
+def test_sensor_id_tags_readings():
+    seen = []
+    stream = BinaryStream(lambda readings, sensor: seen.append((sensor, readings)))
+    stream.feed(binary_hello("none", sensor_id="node-2") + BinaryEncoder().encode([("a", -50)]))
+    assert seen == [("node-2", [("a", -50)])]
+
+
+def test_wrong_password_is_refused():
+    stream, _ = collecting_stream()
+    with pytest.raises(ValueError):
+        stream.feed(binary_hello(password="nope"))
+    assert HELLO_REPLY.unpack(stream.reject) == (BINARY_MAGIC, VERSION, HELLO_REFUSED)
+
+
+def test_bad_id_width_is_refused():
+    stream, _ = collecting_stream()
+    with pytest.raises(ValueError):
+        stream.feed(HELLO.pack(BINARY_MAGIC, VERSION, 0, 3, 5, 0) + b"login")
+    assert HELLO_REPLY.unpack(stream.reject)[2] == HELLO_REFUSED
+
+
+def test_unsupported_version_is_answered_with_ours():
+    stream, _ = collecting_stream()
+    with pytest.raises(ValueError):
+        stream.feed(HELLO.pack(BINARY_MAGIC, VERSION + 1, 0, 2, 5, 0) + b"login")
+    assert HELLO_REPLY.unpack(stream.reject) == (BINARY_MAGIC, VERSION, HELLO_UNSUPPORTED)
+
+
+def test_partial_hello_waits_for_more():
+    stream, _ = collecting_stream()
+    hello = binary_hello("each")
+    assert stream.feed(hello[:HELLO.size + 2]) == b""
+    assert stream.ack is None
+    assert HELLO_REPLY.unpack(stream.feed(hello[HELLO.size + 2:])) == (BINARY_MAGIC, VERSION, HELLO_OK)
+
+
+@pytest.mark.parametrize("body", [
+    b"\x00\x00",  # Id without the name length
+    b"\x00\x00\x09abc",  # Name shorter than its length
+])
+def test_truncated_define_is_rejected(body):
+    stream, _ = collecting_stream()
+    with pytest.raises(ValueError):
+        stream.feed(binary_hello() + FRAME.pack(DEFINE, 0, 1, len(body)) + body)
+
+
+def test_define_with_trailing_bytes_is_rejected():
+    stream, _ = collecting_stream()
+    body = b"\x00\x00\x01a" + b"extra"
+    with pytest.raises(ValueError):
+        stream.feed(binary_hello() + FRAME.pack(DEFINE, 0, 1, len(body)) + body)
+
+
+def test_define_out_of_order_is_rejected():
+    stream, _ = collecting_stream()
+    body = ID_FORMATS[2].pack(5) + b"\x01a"
+    with pytest.raises(ValueError):
+        stream.feed(binary_hello() + FRAME.pack(DEFINE, 0, 1, len(body)) + body)
+
+
+def test_readings_for_undefined_ids_are_dropped():
+    stream, got = collecting_stream()
+    reading = READING_FORMATS[2]
+    body = reading.pack(0, -50) + reading.pack(1, -60) + reading.pack(77, -70)
+    replies = stream.feed(binary_hello("each") + BinaryEncoder().encode([("a", -40)])
+                          + FRAME.pack(READINGS, 0, 3, len(body)) + body)
+    assert got == [("a", -40), ("a", -50)]
+    assert acks(replies) == [(1, 1), (1, 3)]
+
+
+def test_readings_size_mismatch_is_rejected():
+    stream, _ = collecting_stream()
+    with pytest.raises(ValueError):
+        stream.feed(binary_hello() + FRAME.pack(READINGS, 0, 3, 6) + bytes(6))
+
+
+def test_unknown_frame_type_is_rejected():
+    stream, _ = collecting_stream()
+    with pytest.raises(ValueError):
+        stream.feed(binary_hello() + FRAME.pack(9, 0, 0, 0))
+
+
+def test_encoder_refuses_bad_names_without_assigning_ids():
+    encoder = BinaryEncoder()
+    encoder.encode([("a", -40)])
+    for name in ("", "x" * 256, "a|b", "a\nb"):
+        assert not valid_name(name)
+        with pytest.raises(ValueError):
+            encoder.encode([("new", -40), (name, -40)])
+        assert encoder.ids == {"a": 0}
+
+
+def test_encoder_refuses_past_capacity_without_assigning_ids():
+    encoder = BinaryEncoder()
+    encoder.capacity = 2
+    encoder.encode([("a", -40)])
+    with pytest.raises(ValueError):
+        encoder.encode([("b", -40), ("c", -40)])
+    assert encoder.ids == {"a": 0}
+    stream, got = collecting_stream()
+    stream.feed(binary_hello("none") + BinaryEncoder().encode([("a", -40)]) + encoder.encode([("b", -41)]))
+    assert got == [("a", -40), ("b", -41)]
+
+
+def test_rssi_is_clamped_to_a_signed_byte():
+    stream, got = collecting_stream()
+    stream.feed(binary_hello("none") + BinaryEncoder().encode([("a", -200), ("b", 300)]))
+    assert got == [("a", -128), ("b", 127)]
+
+
+def test_client_drops_only_readings_it_cannot_send():
+    server = RSSIServer(host='127.0.0.1', port=0, verbose=False)
+    threading.Thread(target=server.start, daemon=True).start()
+    reporter = BinaryReportStream('127.0.0.1', server.port, ack="each", retries=0)
+    try:
+        sent = reporter.send([("ok-1", -40), ("", -41), ("a|b", -42), ("x" * 300, -43), ("ok-2", "weak"),
+                              ("ok-3", "-51")])
+    finally:
+        reporter.close()
+    assert sent == 2
+    assert server.registry.get("ok-1").rssi == -40
+    assert server.registry.get("ok-3").rssi == -51
+    assert "ok-2" not in server.registry
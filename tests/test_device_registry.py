@@ -0,0 +1,157 @@
+import random
+
+from device_registry import ColumnarDeviceRegistry, DeviceRegistry
+from signal_filter import SignalFilter
+
+NOW = 1000000.0
+
+
+def expiring_registry(**options):
+    return DeviceRegistry(4, SignalFilter(offline_after=30.0), inactive_after=300.0, evict_after=3600.0, **options)
+
+
+def test_silent_device_goes_offline_inactive_then_evicted():
+    registry = expiring_registry()
+    registry.update("quiet", -50, "10.0.0.1", NOW)
+    assert registry.expire(NOW + 29) == (0, 0, [])
+    assert registry.get("quiet").presence == "online"
+    assert registry.expire(NOW + 30) == (1, 0, [])
+    record = registry.get("quiet")
+    assert (record.presence, record.active) == ("offline", True)
+    assert registry.expire(NOW + 300) == (0, 1, [])
+    assert registry.get("quiet").active is False
+    assert registry.expire(NOW + 3600) == (0, 0, ["quiet"])
+    assert "quiet" not in registry
+    assert registry.expire(NOW + 7200) == (0, 0, [])
+
+
+def test_reporting_device_is_not_expired():
+    registry = expiring_registry()
+    for second in range(0, 4000, 10):
+        registry.update("chatty", -50, "10.0.0.1", NOW + second)
+        registry.expire(NOW + second)
+    record = registry.get("chatty")
+    assert (record.presence, record.active) == ("online", True)
+    # One timer per device however often it reports
+    assert sum(len(shard.timers) for shard in registry.shards) == 1
+
+
+def test_one_sweep_applies_every_passed_deadline():
+    registry = expiring_registry()
+    registry.update("a", -50, "10.0.0.1", NOW)
+    registry.update("b", -50, "10.0.0.1", NOW + 3200)  # Silent past both the offline and inactive deadlines
+    offline, inactive, evicted = registry.expire(NOW + 3600)
+    assert (offline, inactive, evicted) == (1, 1, ["a"])
+    assert registry.get("b").presence == "offline" and registry.get("b").active is False
+
+
+def test_expiry_changes_reach_changes_since():
+    registry = expiring_registry()
+    registry.update("a", -50, "10.0.0.1", NOW)
+    registry.update("b", -50, "10.0.0.1", NOW + 20)
+    version, changed, removed = registry.changes_since(0)
+    assert set(changed) == {"a", "b"} and not removed
+    registry.expire(NOW + 30)
+    version, changed, removed = registry.changes_since(version)
+    assert set(changed) == {"a"} and changed["a"].presence == "offline" and not removed
+    registry.update("b", -50, "10.0.0.1", NOW + 3000)
+    registry.expire(NOW + 3600)
+    version, changed, removed = registry.changes_since(version)
+    assert set(changed) == {"b"} and removed == {"a"}
+    assert registry.changes_since(version) == (version, {}, set())
+
+
+def test_device_back_after_eviction_is_a_change_not_a_removal():
+    registry = expiring_registry()
+    registry.update("a", -50, "10.0.0.1", NOW)
+    registry.expire(NOW + 3600)
+    version, _, removed = registry.changes_since(0)
+    assert removed == {"a"}
+    registry.update("a", -45, "10.0.0.1", NOW + 3700)
+    _, changed, removed = registry.changes_since(0)
+    assert set(changed) == {"a"} and not removed
+    _, changed, removed = registry.changes_since(version)
+    assert set(changed) == {"a"} and not removed
+
+
+def test_tombstones_are_bounded():
+    registry = DeviceRegistry(1, max_tombstones=3)
+    for i in range(5):
+        registry.update(f"device-{i}", -50, "10.0.0.1", NOW)
+    start = registry.version
+    removed_at = []
+    for i in range(5):
+        registry.remove(f"device-{i}")
+        removed_at.append(registry.version)
+    assert len(registry.shards[0].removed) == 3
+    # The two oldest tombstones were dropped: their removals can no longer be listed
+    assert registry.tombstone_floor == removed_at[1]
+    _, changed, removed = registry.changes_since(start)
+    assert not changed and removed == {"device-2", "device-3", "device-4"}
+    _, _, removed = registry.changes_since(registry.tombstone_floor)
+    assert removed == {"device-2", "device-3", "device-4"}
+
+
+def test_evictions_are_tombstoned_like_removals():
+    registry = DeviceRegistry(1, evict_after=60.0, max_tombstones=2)
+    for i in range(4):
+        registry.update(f"device-{i}", -50, "10.0.0.1", NOW + i)
+    version = registry.version
+    assert sorted(registry.expire(NOW + 100)[2]) == ["device-0", "device-1", "device-2", "device-3"]
+    assert len(registry) == 0
+    assert registry.tombstone_floor > version
+    assert len(registry.changes_since(version)[2]) == 2
+
+
+def test_registry_without_deadlines_sets_no_timers():
+    registry = DeviceRegistry(4)
+    registry.update("a", -50, "10.0.0.1", NOW)
+    assert registry.expire(NOW + 1e9) == (0, 0, [])
+    assert "a" in registry
+    assert all(not shard.timers for shard in registry.shards)
+
+
+def test_columnar_registry_matches_the_default_one():
+    chance = random.Random(7)
+    registries = [registry_type(4, SignalFilter(mode="kalman", online_after=2, offline_after=30.0),
+                                inactive_after=300.0, evict_after=3600.0)
+                  for registry_type in (DeviceRegistry, ColumnarDeviceRegistry)]
+    versions = [0, 0]
+    for step in range(3000):
+        now = NOW + step * 3
+        name = f"device-{chance.randrange(40)}"
+        rssi = chance.randrange(-100, -30)
+        ip = chance.choice(["10.0.0.7", "192.168.1.200", "", "fe80::1"])
+        merge = chance.random() < 0.1
+        for i, registry in enumerate(registries):
+            if merge:
+                registry.merge_many([(name, rssi, now - 5, ip)])
+            else:
+                registry.update(name, rssi, ip, now)
+            if step % 50 == 0:
+                registry.expire(now)
+            if step % 97 == 0:
+                registry.remove(name)
+            if step % 10 == 0:
+                versions[i], changed, removed = registry.changes_since(versions[i])
+                changed = {device_name: record.as_dict() for device_name, record in changed.items()}
+                if i:
+                    assert (changed, removed) == expected
+                expected = changed, removed
+    dicts, columns = ({device_name: record.as_dict() for device_name, record in registry.items()}
+                      for registry in registries)
+    assert dicts == columns
+    assert registries[0].version == registries[1].version
+
+
+def test_columnar_registry_reuses_slots_and_hands_out_copies():
+    registry = ColumnarDeviceRegistry(1)
+    registry.update("a", -50, "10.0.0.1", NOW)
+    registry.update("b", -60, "10.0.0.2", NOW)
+    record = registry.get("a")
+    registry.update("a", -40, "10.0.0.3", NOW + 1)
+    assert (record.rssi, record.ip) == (-50, "10.0.0.1")
+    registry.remove("a")
+    registry.update("c", -70, "not-an-ip", NOW + 2)
+    assert len(registry.shards[0].columns.rssi) == 2
+    assert registry.get("c").ip == "not-an-ip" and registry.get("b").ip == "10.0.0.2"
@@ -0,0 +1,95 @@
+import json
+
+from event_stream import StreamHub, _Subscriber
+from rssi_monitor import RSSIServer
+
+NOW = 1000000.0
+
+
+class FakeSocket:
+    """Non-blocking socket stand-in that accepts everything unless stalled"""
+
+    def __init__(self):
+        self.received = b""
+        self.stalled = False
+        self.gone = False
+        self.closed = False
+
+    def setblocking(self, flag):
+        pass
+
+    def send(self, data):
+        if self.gone:
+            raise BrokenPipeError
+        if self.stalled:
+            raise BlockingIOError
+        self.received += data
+        return len(data)
+
+    def close(self):
+        self.closed = True
+
+    def events(self):
+        """(event, data) of every complete message received, comments and ids left out"""
+        events = []
+        for message in self.received.decode().split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in message.splitlines() if not line.startswith(":"))
+            if "event" in lines:
+                events.append((lines["event"], json.loads(lines["data"])))
+        return events
+
+
+def hub_with_device(max_events=256):
+    server = RSSIServer(port=None, verbose=False)
+    server.registry.update("a", -50, "10.0.0.1", NOW)
+    return server, StreamHub(server, lambda rssi: "quality", max_events=max_events)
+
+
+def test_subscriber_queue_drops_the_oldest_events():
+    subscriber = _Subscriber(FakeSocket(), None, 3)
+    for i in range(5):
+        subscriber.push(f"event {i}\n\n".encode())
+    assert list(subscriber.events) == [b"event 2\n\n", b"event 3\n\n", b"event 4\n\n"]
+    assert subscriber.dropped == 2
+
+
+def test_slow_subscriber_gets_the_latest_events_without_holding_up_others():
+    server, hub = hub_with_device(max_events=4)
+    slow, fast = FakeSocket(), FakeSocket()
+    assert hub.subscribe(slow, "a") and hub.subscribe(fast)
+    slow.stalled = True
+    for i in range(10):
+        server.registry.update("a", -60 - i, "10.0.0.1", NOW + i)
+        assert hub.publish()
+    assert [data["rssi"] for _, data in fast.events()] == [-50] + [-60 - i for i in range(10)]
+    slow.stalled = False
+    hub.publish()
+    # The first push was already taken off the queue for sending; of the
+    # other nine (a device event and an id marker each) only the last two fit
+    assert [data["rssi"] for _, data in slow.events()] == [-50, -60, -68, -69]
+    assert hub.subscribers[0].dropped == 14
+
+
+def test_subscribers_only_get_their_device_and_its_removal():
+    server, hub = hub_with_device()
+    server.registry.update("b", -70, "10.0.0.2", NOW)
+    one = FakeSocket()
+    hub.subscribe(one, "a")
+    server.registry.update("b", -71, "10.0.0.2", NOW + 1)
+    hub.publish()
+    server.registry.remove("a")
+    hub.publish()
+    events = one.events()
+    assert [(event, data["device_name"]) for event, data in events] == [("device", "a"), ("removed", "a")]
+    assert events[1][1]["version"] == server.version
+
+
+def test_gone_clients_are_dropped():
+    server, hub = hub_with_device()
+    sock = FakeSocket()
+    hub.subscribe(sock)
+    sock.gone = True
+    server.registry.update("a", -40, "10.0.0.1", NOW + 1)
+    hub.publish()
+    assert sock.closed and hub.subscribers == []
+    assert not hub.has_subscribers.is_set()
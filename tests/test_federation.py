@@ -0,0 +1,73 @@
+import pytest
+
+from device_registry import DeviceRecord, DeviceRegistry
+from federation import HEADER, MAX_FRAME, DeltaReader, decode_delta, encode_delta, federation_hello
+from rssi_monitor import RSSIServer
+
+NOW = 1000000.0
+
+
+def delta(version, devices, removed=()):
+    return {"version": version, "devices": [list(device) for device in devices], "removed": list(removed)}
+
+
+def frame(version, devices, removed=()):
+    changed = {name: DeviceRecord(rssi, last_seen, ip) for name, rssi, last_seen, ip in devices}
+    return encode_delta(version, changed, removed)[0]
+
+
+def test_delta_round_trip():
+    registry = DeviceRegistry(4)
+    registry.update("a", -50, "10.0.0.1", NOW)
+    registry.update("b", -60, "10.0.0.2", NOW + 1)
+    registry.remove("a")
+    registry.update("c", -70, "10.0.0.3", NOW + 2)
+    version, changed, removed = registry.changes_since(2)
+    data, _ = encode_delta(version, changed, removed)
+    (length,) = HEADER.unpack_from(data)
+    assert length == len(data) - HEADER.size
+    assert decode_delta(data[HEADER.size:]) == delta(version, [("c", -70, NOW + 2, "10.0.0.3")], ["a"])
+
+
+def test_reader_reassembles_frames_split_anywhere():
+    applied = []
+    reader = DeltaReader(lambda node_id, received: applied.append((node_id, received)))
+    data = (federation_hello("edge-1") + frame(3, [("a", -50, NOW, "10.0.0.1")])
+            + frame(5, [], ["b"]))
+    replies = b"".join(reader.feed(data[i:i + 7]) for i in range(0, len(data), 7))
+    assert replies == b"ACK|3\nACK|5\n"
+    assert applied == [("edge-1", delta(3, [("a", -50, NOW, "10.0.0.1")])), ("edge-1", delta(5, [], ["b"]))]
+
+
+def test_reader_refuses_oversized_frames():
+    reader = DeltaReader(lambda node_id, received: None)
+    with pytest.raises(ValueError):
+        reader.feed(federation_hello("edge-1") + HEADER.pack(MAX_FRAME + 1))
+
+
+def aggregator():
+    server = RSSIServer(port=None, verbose=False)
+    server.accept_federation()
+    return server, server.federation
+
+
+def test_conflicting_readings_last_writer_wins():
+    server, merger = aggregator()
+    merger.merge("edge-1", delta(1, [("phone", -50, NOW + 10, "10.0.1.5")]))
+    merger.merge("edge-2", delta(1, [("phone", -80, NOW + 5, "10.0.2.5")]))
+    device = server.registry.get("phone")
+    assert (device.rssi, device.last_seen, device.ip) == (-50, NOW + 10, "10.0.1.5")
+    assert merger.stale == 1 and merger.origins["phone"] == "edge-1"
+    merger.merge("edge-2", delta(2, [("phone", -70, NOW + 20, "10.0.2.5")]))
+    device = server.registry.get("phone")
+    assert (device.rssi, device.ip) == (-70, "10.0.2.5")
+    assert merger.origins["phone"] == "edge-2" and merger.nodes == {"edge-1": 1, "edge-2": 2}
+
+
+def test_only_the_origin_of_a_reading_can_remove_it():
+    server, merger = aggregator()
+    merger.merge("edge-1", delta(1, [("phone", -50, NOW, "10.0.1.5")]))
+    merger.merge("edge-2", delta(1, [], ["phone"]))
+    assert "phone" in server.registry
+    merger.merge("edge-1", delta(2, [], ["phone"]))
+    assert "phone" not in server.registry and server.history.get("phone") is None
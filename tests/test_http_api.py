@@ -0,0 +1,105 @@
+import gzip
+import http.client
+import json
+import threading
+import time
+from http.server import HTTPServer
+
+import pytest
+
+import http_api
+from rssi_monitor import RSSIServer
+
+
+class Api:
+    """An RSSIServer behind a real HTTP server on a free port"""
+
+    def __init__(self, rssi_server, port):
+        self.rssi_server = rssi_server
+        self.port = port
+
+    def get(self, path, headers=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        try:
+            connection.request('GET', path, headers=headers or {})
+            response = connection.getresponse()
+            return response, response.read()
+        finally:
+            connection.close()
+
+
+@pytest.fixture
+def api(monkeypatch):
+    rssi_server = RSSIServer(port=None, verbose=False)
+    monkeypatch.setattr(http_api, "rssi_server", rssi_server)
+    # Both caches are keyed by registry version, which every test server starts over
+    monkeypatch.setattr(http_api, "response_cache", http_api.ResponseCache())
+    monkeypatch.setattr(http_api, "device_listing", http_api.DeviceListing())
+    httpd = HTTPServer(('127.0.0.1', 0), http_api.KeepAliveHTTPRequestHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield Api(rssi_server, httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_status_of_a_weak_but_reporting_device_is_connected(api):
+    api.rssi_server.registry.update("far", -97, "10.0.0.5")
+    response, body = api.get('/status?device_name=far')
+    status = json.loads(body)
+    assert response.status == 200
+    assert status["connected"] is True and status["presence"] == "offline"
+    assert status["rssi"] == -97
+
+
+def test_status_of_a_silent_device_is_disconnected(api):
+    api.rssi_server.registry.update("gone", -50, "10.0.0.5", time.time() - 31)
+    _, body = api.get('/status?device_name=gone')
+    assert json.loads(body) == {"connected": False}
+    _, body = api.get('/status?device_name=unknown')
+    assert json.loads(body) == {"connected": False}
+
+
+def test_devices_etag_round_trip(api):
+    api.rssi_server.registry.update("a", -50, "10.0.0.1")
+    response, body = api.get('/devices')
+    etag = response.getheader('ETag')
+    assert response.status == 200 and etag == f'"{json.loads(body)["version"]}"'
+    response, body = api.get('/devices', {'If-None-Match': etag})
+    assert response.status == 304 and body == b"" and response.getheader('ETag') == etag
+    api.rssi_server.registry.update("a", -45, "10.0.0.1")
+    response, body = api.get('/devices', {'If-None-Match': etag})
+    assert response.status == 200 and response.getheader('ETag') != etag
+    assert json.loads(body)["devices"]["a"]["rssi"] == -45
+
+
+def test_large_listings_are_gzipped_on_request(api):
+    api.rssi_server.registry.update("only", -50, "10.0.0.1")
+    response, _ = api.get('/devices', {'Accept-Encoding': 'gzip'})
+    assert response.getheader('Content-Encoding') is None  # Too small to be worth it
+    for i in range(50):
+        api.rssi_server.registry.update(f"device-{i:03d}", -50 - i % 40, "10.0.0.1")
+    _, plain = api.get('/devices')
+    response, body = api.get('/devices', {'Accept-Encoding': 'gzip, deflate'})
+    assert response.getheader('Content-Encoding') == 'gzip'
+    assert response.getheader('Vary') == 'Accept-Encoding'
+    assert len(body) < len(plain) and gzip.decompress(body) == plain
+
+
+def test_devices_since_lists_changes_and_removals(api):
+    registry = api.rssi_server.registry
+    for name in ("a", "b", "c"):
+        registry.update(name, -50, "10.0.0.1")
+    _, body = api.get('/devices')
+    version = json.loads(body)["version"]
+    registry.remove("b")
+    registry.update("c", -60, "10.0.0.1")
+    response, body = api.get(f'/devices?since={version}')
+    delta = json.loads(body)
+    assert response.getheader('ETag') == f'"{version}-{delta["version"]}"'
+    assert delta["full"] is False
+    assert set(delta["devices"]) == {"c"} and delta["removed"] == ["b"]
+    # Once the tombstones it needs are gone, the client gets a full listing instead
+    registry.tombstone_floor = registry.version
+    _, body = api.get(f'/devices?since={version}')
+    listing = json.loads(body)
+    assert listing["full"] is True and set(listing["devices"]) == {"a", "c"} and listing["removed"] == []
@@ -0,0 +1,91 @@
+import asyncio
+import socket
+import threading
+import time
+
+from ingest_queue import IngestQueue
+from protocol import format_batch
+from rssi_monitor import RSSIServer
+
+
+def collecting_queue(**options):
+    queue = IngestQueue(**options)
+    received = []
+    queue.add_consumer(lambda batch: received.extend(reading for readings, _, _ in batch for reading in readings))
+    return queue, received
+
+
+def test_drop_discards_groups_that_do_not_fit():
+    queue, received = collecting_queue(max_readings=3, overflow="drop")
+    assert queue.put([("a", -50), ("b", -51)], "10.0.0.1", 1.0)
+    assert not queue.put([("c", -52), ("d", -53)], "10.0.0.1", 2.0)
+    assert queue.put([("e", -54)], "10.0.0.1", 3.0)
+    queue.drain()
+    assert received == [("a", -50), ("b", -51), ("e", -54)]
+    assert queue.metrics()["dropped"] == 2
+
+
+def test_block_waits_for_the_drain_to_make_room():
+    queue, received = collecting_queue(max_readings=2, flush_interval=0.01)
+    queue.put([("a", -50), ("b", -51)], "10.0.0.1", 1.0)
+    producer = threading.Thread(target=queue.put, args=([("c", -52)], "10.0.0.1", 2.0))
+    producer.start()
+    producer.join(0.2)
+    assert producer.is_alive() and queue.depth == 2
+    queue.drain()
+    producer.join(5)
+    assert not producer.is_alive()
+    queue.drain()
+    assert received == [("a", -50), ("b", -51), ("c", -52)]
+    assert queue.metrics()["dropped"] == 0
+
+
+def test_block_without_waiting_takes_the_group_and_room_waits():
+    queue, received = collecting_queue(max_readings=2, flush_interval=0.01)
+    queue.put([("a", -50), ("b", -51)], "10.0.0.1", 1.0)
+    assert queue.put([("c", -52)], "10.0.0.1", 2.0, wait=False)
+    assert queue.depth == 3
+    queue.start()
+    try:
+        asyncio.run(asyncio.wait_for(queue.room(), timeout=5))
+        assert queue.depth < 2
+    finally:
+        queue.stop()
+    assert received == [("a", -50), ("b", -51), ("c", -52)]
+
+
+def test_stop_hands_what_is_queued_to_the_consumers():
+    queue, received = collecting_queue(batch_size=1000, flush_interval=60)
+    queue.start()
+    time.sleep(0.05)  # Let the drain thread settle into its wait
+    for i in range(10):
+        queue.put([(f"device-{i}", -50)], "10.0.0.1", float(i))
+    assert not received
+    queue.stop()
+    assert len(received) == 10
+    assert queue.metrics()["depth"] == 0
+
+
+def test_full_queue_does_not_stall_the_event_loop():
+    queue = IngestQueue(max_readings=2, flush_interval=0.01)  # Not draining until started below
+    server = RSSIServer(host='127.0.0.1', port=0, verbose=False, ingest=queue)
+    threading.Thread(target=lambda: asyncio.run(server.serve_async()), daemon=True).start()
+    queue.put([("queued-1", -60), ("queued-2", -60)], "10.0.0.1", time.time())
+    sender = socket.create_connection(('127.0.0.1', server.port), timeout=10)
+    sender.sendall(format_batch([(f"device-{i}", -50) for i in range(5)]))
+    sender.shutdown(socket.SHUT_WR)
+    deadline = time.time() + 5
+    while queue.depth < 7 and time.time() < deadline:
+        time.sleep(0.01)
+    assert queue.depth == 7
+    # The sender is held back, but other clients are still served
+    with socket.create_connection(('127.0.0.1', server.port), timeout=2) as other:
+        other.sendall(b"federate|login|edge\n")
+        assert other.recv(1024) == b"ERROR: Not an aggregator\n"
+    queue.start()
+    try:
+        assert sender.recv(1024) == b"BATCH|5|5|OK|OK|OK|OK|OK"
+    finally:
+        sender.close()
+        queue.stop()
+    assert len(server.registry) == 7
@@ -0,0 +1,65 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from protocol import MAX_LINE, format_batch
+from rssi_monitor import RSSIServer
+
+
+@pytest.fixture(params=["threaded", "async"])
+def server(request):
+    server = RSSIServer(host='127.0.0.1', port=0, verbose=False)
+    if request.param == "threaded":
+        target = server.start
+    else:
+        target = lambda: asyncio.run(server.serve_async())  # noqa: E731
+    threading.Thread(target=target, daemon=True).start()
+    return server
+
+
+def one_shot(server, data, half_close=False):
+    with socket.create_connection(('127.0.0.1', server.port), timeout=10) as sock:
+        sock.sendall(data)
+        if half_close:
+            sock.shutdown(socket.SHUT_WR)
+        reply = b""
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return reply.decode()
+            reply += chunk
+
+
+def readings(count):
+    return [(f"long-device-name-{i:04d}", -40 - i % 50) for i in range(count)]
+
+
+def test_plain_report_needs_no_newline(server):
+    assert one_shot(server, b"login|laptop|-55") == "SUCCESS"
+    assert server.registry.get("laptop").rssi == -55
+
+
+def test_batch_longer_than_one_read(server):
+    batch = readings(120)
+    data = format_batch(batch) + b"\n"
+    assert len(data) > 1024
+    reply = one_shot(server, data)
+    assert reply.startswith("BATCH|120|120|")
+    assert len(server.registry) == 120
+    assert all(server.registry.get(name).rssi == rssi for name, rssi in batch)
+
+
+def test_batch_ended_by_closing_the_sending_side(server):
+    batch = readings(200)
+    reply = one_shot(server, format_batch(batch, sensor_id="node-2"), half_close=True)
+    assert reply.startswith("BATCH|200|200|")
+
+
+def test_oversized_batch_is_refused(server):
+    data = format_batch(readings(MAX_LINE // 20)) + b"\n"
+    assert len(data) > MAX_LINE
+    reply = one_shot(server, data)
+    assert reply.startswith("ERROR: Batch too large")
+    assert len(server.registry) == 0
@@ -0,0 +1,131 @@
+import os
+import random
+
+from reading_store import DEVICES_FILE, LATENESS_FILE, RECORD, SEGMENT_SUFFIX, ReadingStore
+
+
+def filled_store(directory, segment_records=1 << 20):
+    store = ReadingStore(str(directory), segment_records=segment_records)
+    store.append_many([("a", -40), ("b", -50)], 100.0)
+    store.append("a", 101.0, -41)
+    store.close()
+
+
+def segment_paths(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+
+def test_readings_survive_a_restart(tmp_path):
+    filled_store(tmp_path)
+    store = ReadingStore(str(tmp_path))
+    assert store.query("a") == [(100.0, -40), (101.0, -41)]
+    assert store.last_state() == {"a": (101.0, -41), "b": (100.0, -50)}
+    store.close()
+
+
+def test_torn_record_is_dropped_on_open(tmp_path):
+    filled_store(tmp_path)
+    path = segment_paths(tmp_path)[-1]
+    with open(path, "ab") as f:
+        f.write(RECORD.pack(0, 102.0, -42)[:RECORD.size // 2])  # Crash in the middle of a write
+    store = ReadingStore(str(tmp_path))
+    assert os.path.getsize(path) == 3 * RECORD.size
+    assert store.last_timestamp == 101.0
+    assert store.query("a") == [(100.0, -40), (101.0, -41)]
+    # New records start at a record boundary again
+    store.append("b", 103.0, -53)
+    store.close()
+    store = ReadingStore(str(tmp_path))
+    assert store.query("b") == [(100.0, -50), (103.0, -53)]
+    store.close()
+
+
+def test_segment_holding_only_a_torn_record(tmp_path):
+    filled_store(tmp_path, segment_records=3)
+    store = ReadingStore(str(tmp_path), segment_records=3)
+    store.append("a", 102.0, -42)
+    store.flush()
+    store.close()
+    path = segment_paths(tmp_path)[-1]
+    with open(path, "r+b") as f:
+        f.truncate(RECORD.size - 1)
+    store = ReadingStore(str(tmp_path), segment_records=3)
+    assert os.path.getsize(path) == 0
+    assert store.last_timestamp == 101.0  # From the previous segment
+    assert store.query("a") == [(100.0, -40), (101.0, -41)]
+    store.append("a", 50.0, -43)  # Clock went back: stored in order anyway
+    assert store.query("a") == [(100.0, -40), (101.0, -41), (101.0, -43)]
+    store.close()
+
+
+def test_torn_device_name_is_dropped_on_open(tmp_path):
+    filled_store(tmp_path)
+    path = os.path.join(tmp_path, DEVICES_FILE)
+    with open(path, "ab") as f:
+        f.write(b"half-writ")  # Its readings were never written, names are fsynced first
+    store = ReadingStore(str(tmp_path))
+    assert store.names == ["a", "b"]
+    with open(path, "rb") as f:
+        assert f.read() == b"a\nb\n"
+    store.append("c", 102.0, -60)
+    store.close()
+    store = ReadingStore(str(tmp_path))
+    assert store.names == ["a", "b", "c"]
+    assert store.query("c") == [(102.0, -60)]
+    store.close()
+
+
+def test_device_names_are_escaped(tmp_path):
+    store = ReadingStore(str(tmp_path))
+    store.append("line\nbreak", 100.0, -40)
+    store.close()
+    store = ReadingStore(str(tmp_path))
+    assert store.query("line\nbreak") == [(100.0, -40)]
+    store.close()
+
+
+def test_merged_readings_keep_their_timestamps(tmp_path):
+    store = ReadingStore(str(tmp_path))
+    store.append("local", 100.0, -40)
+    store.append_batch([([("remote", -50)], "10.0.0.2", 90.0)], exact=True)
+    assert [timestamp for _, timestamp, _ in store.scan()] == [90.0, 100.0]
+    store.flush()
+    store.append_batch([([("remote", -51)], "10.0.0.2", 95.0)], exact=True)  # Older than what is on disk
+    store.append("local", 99.0, -41)  # A local race is still moved up
+    assert store.query("remote") == [(90.0, -50), (95.0, -51)]
+    assert store.query("local") == [(100.0, -40), (100.0, -41)]
+    store.close()
+    assert os.path.exists(os.path.join(tmp_path, LATENESS_FILE))
+    store = ReadingStore(str(tmp_path))
+    assert store.last_timestamp == 100.0
+    assert [timestamp for _, timestamp, _ in store.scan(92.0, 100.0)] == [95.0]
+    assert store.last_state() == {"local": (100.0, -41), "remote": (95.0, -51)}
+    store.close()
+
+
+def test_range_scans_find_every_out_of_order_reading(tmp_path):
+    chance = random.Random(3)
+    stored = []
+    store = ReadingStore(str(tmp_path), segment_records=16)
+    now = 1000.0
+    for step in range(400):
+        now += chance.random()
+        timestamp = now - chance.choice([0.0, 0.0, 0.0, chance.random() * 20])
+        device = f"device-{chance.randrange(5)}"
+        store.append_batch([([(device, -50)], "", timestamp)], exact=True)
+        stored.append(timestamp)
+        if step % 7 == 0:
+            store.flush()
+        if step % 150 == 0:
+            store.close()
+            store = ReadingStore(str(tmp_path), segment_records=16)
+    for _ in range(50):
+        start = chance.uniform(990.0, now)
+        end = start + chance.uniform(0.0, 60.0)
+        found = [timestamp for _, timestamp, _ in store.scan(start, end)]
+        assert found == sorted(timestamp for timestamp in stored if start <= timestamp < end)
+    assert [timestamp for _, timestamp, _ in store.scan()] == sorted(stored)
+    store.close()
+    store = ReadingStore(str(tmp_path), segment_records=16)
+    assert store.last_timestamp == max(stored)
+    store.close()
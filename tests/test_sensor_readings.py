@@ -0,0 +1,34 @@
+from rssi_monitor import RSSIServer
+
+ADDR = ("10.0.0.9", 40000)
+
+
+def server_with_sensor():
+    return RSSIServer(port=None, verbose=False, sensors={"hall": (10.0, 0.0)})
+
+
+def test_sensor_reading_does_not_overwrite_the_router_reading():
+    server = server_with_sensor()
+    assert server.process_message("login|phone|-50", ("10.0.0.2", 40000)) == b"SUCCESS"
+    assert server.process_message("sensor|hall|login|phone|-85", ADDR) == b"SUCCESS"
+    device = server.registry.get("phone")
+    assert (device.rssi, device.ip) == (-50, "10.0.0.2")
+    assert [list(values) for _, values in server.history.get("phone").view()] == [[-50]]
+    assert set(server.positions.readings["phone"]) == {"", "hall"}
+
+
+def test_sensor_batch_only_reaches_the_position_solver():
+    server = server_with_sensor()
+    reply = server.process_message("sensor|hall|batch|login|tablet|-70|watch|-60", ADDR)
+    assert reply == b"BATCH|2|2|OK|OK"
+    assert "tablet" not in server.registry and "watch" not in server.registry
+    assert server.history.get("tablet") is None
+    assert set(server.positions.readings) == {"tablet", "watch"}
+
+
+def test_devices_only_sensors_hear_are_pruned():
+    server = server_with_sensor()
+    server.positions.record_many([("faraway", -80)], "hall", 0.0)
+    server.registry.evict_after = 3600.0
+    server.expire()
+    assert "faraway" not in server.positions.readings
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from rssi_monitor import RSSIServer
+from shared_table import SharedDeviceTable, TableFollower
+
+NOW = 1000000.0
+
+
+@pytest.fixture
+def table():
+    table = SharedDeviceTable(slots=4, stripes=1)
+    yield table
+    table.close()
+
+
+def names(count):
+    return [(f"device-{i}", -50 - i) for i in range(count)]
+
+
+def test_removed_slots_are_reused(table):
+    assert table.update_many(names(4), "10.0.0.1", NOW) == set()
+    assert table.update_many([("late", -60)], "10.0.0.1", NOW) == {"late"}
+    assert table.remove_many(["device-1", "unknown"]) == ["device-1"]
+    assert table.used == 3 and table.get("device-1") is None
+    # Lookups probe past the tombstone
+    assert all(table.get(f"device-{i}") is not None for i in (0, 2, 3))
+    assert table.update_many([("late", -60)], "10.0.0.1", NOW) == set()
+    assert table.get("late") == ("late", -60, NOW, "10.0.0.1")
+    assert table.used == 4
+
+
+def test_recent_writes_are_not_removed(table):
+    table.update_many([("old", -50)], "10.0.0.1", NOW)
+    table.update_many([("fresh", -50)], "10.0.0.1", NOW + 100)
+    assert table.remove_many(["old", "fresh"], before=NOW + 50) == ["old"]
+    assert table.get("fresh") is not None
+
+
+def test_workers_do_not_write_through_a_stale_cached_slot(table):
+    worker = SharedDeviceTable(table.name, locks=table.locks)
+    try:
+        worker.update_many(names(4), "10.0.0.1", NOW)
+        table.remove_many(["device-0"])
+        table.update_many([("newcomer", -70)], "10.0.0.2", NOW + 1)
+        # The worker's cache still maps device-0 to the slot newcomer took
+        worker.update_many([("device-0", -40)], "10.0.0.1", NOW + 2)
+        assert table.get("newcomer") == ("newcomer", -70, NOW + 1, "10.0.0.2")
+        assert table.get("device-0") is None  # No room left for it
+        assert table.rejected == 1
+    finally:
+        worker.close()
+
+
+def test_server_eviction_frees_table_slots(table):
+    server = RSSIServer(port=None, verbose=False, evict_after=60.0)
+    server.follower = TableFollower(table, server)
+    now = time.time()
+    table.update_many([("gone", -50)], "10.0.0.1", now - 120)
+    table.update_many([("here", -50)], "10.0.0.1", now)
+    assert server.follower.poll() == 2
+    assert server.expire()[2] == ["gone"]
+    assert table.get("gone") is None and table.used == 1
+    table.update_many([("again", -55)], "10.0.0.1", now)
+    assert server.follower.poll() == 1
+    assert set(server.registry.snapshot()) == {"here", "again"}
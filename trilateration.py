@@ -0,0 +1,183 @@
+import math
+import threading
+import zlib
+
+import calibration
+
+ROUTER = ""  # Sensor id of untagged readings: this server, at the origin
+
+
+class PositionSolver:
+    """Estimates 2-D device positions from the RSSI each sensor hears
+
+    sensors maps sensor ids to fixed (x, y) positions in meters; readings
+    without a sensor tag come from ROUTER at (0, 0). For every device the
+    latest reading per sensor is smoothed (EWMA with weight alpha), and
+    readings more than max_age seconds older than the device's newest are
+    left out of its solution.
+
+    Distances come from calibration.default (the "log" distance model gives
+    continuous ranges and far better fixes than the bucket table). With
+    three or more sensors that are not on one line, the position is the
+    least-squares solution of the circle equations, linearized by
+    subtracting the last sensor's equation. That leaves A p = b where A
+    only depends on which sensors heard the device, so devices are solved
+    in groups sharing a sensor set: the operator (A^T A)^-1 A^T is
+    computed once per set and cached, and applying it to every device in
+    the group is one matrix product (numpy when installed, plain Python
+    otherwise). Two sensors, or collinear ones, give the weighted centroid
+    of the sensors; a single sensor gives a point at the estimated distance
+    on a fixed bearing derived from the device name.
+
+    Solutions are cached; record() marks a device dirty only when its
+    smoothed input actually moved, and solve() only recomputes dirty ones.
+    """
+
+    def __init__(self, sensors=None, alpha=0.3, max_age=30.0):
+        self.sensors = {ROUTER: (0.0, 0.0)}
+        self.sensors.update({sensor_id: (float(x), float(y)) for sensor_id, (x, y) in (sensors or {}).items()})
+        self.alpha = alpha
+        self.max_age = max_age
+        self.readings = {}  # {device_name: {sensor_id: [smoothed rssi, timestamp]}}
+        self.dirty = set()
+        self.positions = {}  # {device_name: (x, y)}
+        self.operators = {}  # {sensor id tuple: (operator rows, constants) or None}
+        self.unknown = set()  # Sensor ids already warned about
+        self.lock = threading.Lock()  # Guards readings and dirty
+        self.solve_lock = threading.Lock()  # One solve at a time, so results land in order
+
+    def record_many(self, readings, sensor_id, timestamp):
+        """Fold in [(device_name, rssi), ...] heard by one sensor"""
+        if sensor_id not in self.sensors:
+            if sensor_id not in self.unknown:
+                self.unknown.add(sensor_id)
+                print(f"[WARN] Readings from unknown sensor '{sensor_id}' are not used for positions")
+            return
+        alpha = self.alpha
+        with self.lock:
+            for device_name, rssi in readings:
+                heard = self.readings.get(device_name)
+                if heard is None:
+                    heard = self.readings[device_name] = {}
+                entry = heard.get(sensor_id)
+                if entry is None:
+                    heard[sensor_id] = [float(rssi), timestamp]
+                    self.dirty.add(device_name)
+                    continue
+                entry[1] = timestamp
+                if rssi != entry[0]:
+                    entry[0] += alpha * (rssi - entry[0])
+                    self.dirty.add(device_name)
+
+    def remove(self, device_name):
+        with self.lock:
+            self.readings.pop(device_name, None)
+            self.dirty.discard(device_name)
+            self.positions.pop(device_name, None)
+
+    def prune(self, before):
+        """Forget devices no sensor has heard since before; returns their names"""
+        with self.lock:
+            gone = [device_name for device_name, heard in self.readings.items()
+                    if max(timestamp for _, timestamp in heard.values()) < before]
+            for device_name in gone:
+                del self.readings[device_name]
+                self.dirty.discard(device_name)
+                self.positions.pop(device_name, None)
+        return gone
+
+    def solve(self):
+        """Recompute the positions of every dirty device; returns how many"""
+        with self.solve_lock:
+            groups = {}  # {sensor id tuple: ([device_name], [rssi row])}
+            with self.lock:
+                dirty, self.dirty = self.dirty, set()
+                for device_name in dirty:
+                    heard = self.readings.get(device_name)
+                    if not heard:
+                        continue
+                    newest = max(timestamp for _, timestamp in heard.values())
+                    sensor_ids = tuple(sorted(sensor_id for sensor_id, (_, timestamp) in heard.items()
+                                              if newest - timestamp <= self.max_age))
+                    names, rows = groups.setdefault(sensor_ids, ([], []))
+                    names.append(device_name)
+                    rows.append([heard[sensor_id][0] for sensor_id in sensor_ids])
+            solved = {}
+            for sensor_ids, (names, rows) in groups.items():
+                solved.update(zip(names, self._solve_group(sensor_ids, names, rows)))
+            with self.lock:
+                # Devices removed while solving stay removed
+                self.positions.update((name, position) for name, position in solved.items()
+                                      if name in self.readings)
+            return len(solved)
+
+    def locate(self, device_names):
+        """Solve what is dirty, then return the (x, y) or None of each device"""
+        self.solve()
+        positions = self.positions
+        return [positions.get(device_name) for device_name in device_names]
+
+    def _operator(self, sensor_ids):
+        if sensor_ids in self.operators:
+            return self.operators[sensor_ids]
+        operator = None
+        if len(sensor_ids) >= 3:
+            points = [self.sensors[sensor_id] for sensor_id in sensor_ids]
+            xn, yn = points[-1]
+            rows = [(2 * (x - xn), 2 * (y - yn)) for x, y in points[:-1]]
+            constants = [x * x - xn * xn + y * y - yn * yn for x, y in points[:-1]]
+            # Normal equations: (A^T A) is 2x2, so invert it directly
+            saa = sum(a * a for a, _ in rows)
+            sab = sum(a * b for a, b in rows)
+            sbb = sum(b * b for _, b in rows)
+            det = saa * sbb - sab * sab
+            if abs(det) > 1e-9 * max(1.0, saa * sbb):
+                operator = (
+                    [(sbb * a - sab * b) / det for a, b in rows],
+                    [(saa * b - sab * a) / det for a, b in rows],
+                ), constants
+        self.operators[sensor_ids] = operator
+        return operator
+
+    def _solve_group(self, sensor_ids, names, rows):
+        count = len(sensor_ids)
+        flat = calibration.default.distances([rssi for row in rows for rssi in row])
+        distances = [flat[i:i + count] for i in range(0, len(flat), count)]
+        points = [self.sensors[sensor_id] for sensor_id in sensor_ids]
+        if count == 1:
+            sx, sy = points[0]
+            positions = []
+            for device_name, (distance,) in zip(names, distances):
+                # Stable across runs, unlike hash()
+                angle = math.radians(zlib.crc32(device_name.encode()) % 360)
+                positions.append((sx + distance * math.cos(angle), sy + distance * math.sin(angle)))
+            return positions
+        operator = self._operator(sensor_ids)
+        if operator is None:
+            return [self._centroid(points, row) for row in distances]
+        (mx, my), constants = operator
+        np = calibration.load_numpy() if len(names) >= calibration.NUMPY_MIN_SIZE else False
+        if np:
+            d = np.asarray(distances) ** 2
+            b = d[:, -1:] - d[:, :-1] + np.asarray(constants)
+            return (b @ np.asarray([mx, my]).T).tolist()
+        positions = []
+        for row in distances:
+            last = row[-1] * row[-1]
+            b = [last - distance * distance + constant for distance, constant in zip(row, constants)]
+            positions.append((sum(m * v for m, v in zip(mx, b)), sum(m * v for m, v in zip(my, b))))
+        return positions
+
+    @staticmethod
+    def _centroid(points, distances):
+        weights = [1 / max(distance, 0.1) ** 2 for distance in distances]
+        total = sum(weights)
+        return (sum(w * x for w, (x, _) in zip(weights, points)) / total,
+                sum(w * y for w, (_, y) in zip(weights, points)) / total)
+
+
+def parse_sensor(text):
+    """Parse a "sensor_id=x,y" command line option into (sensor_id, (x, y))"""
+    sensor_id, _, coordinates = text.partition("=")
+    x, y = coordinates.split(",")
+    return sensor_id, (float(x), float(y))